@@ -0,0 +1,73 @@
+"""
+Times the Todo admin changelist on a large scratch table and checks each page
+against a latency budget:
+
+    python benchmarks/admin.py --todos 1000000 --budget-ms 200
+
+Run against PostgreSQL (DATABASE_URL) at the target size to check the
+planner-estimated counts; on SQLite the paginator counts exactly.
+"""
+import argparse
+import sys
+import time
+
+from common import setup_test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--todos', type=int, default=100000, help='todos to seed')
+    parser.add_argument('--users', type=int, default=100, help='authors the todos are spread over')
+    parser.add_argument('--budget-ms', type=float, default=200, help='slowest acceptable page')
+    parser.add_argument('--repeat', type=int, default=3, help='loads per page; the best is kept')
+    args = parser.parse_args()
+
+    teardown = setup_test_database()
+    try:
+        from django.contrib.auth.models import User
+        from django.db import connection
+        from django.test import Client
+        from django.utils import timezone
+
+        from todos.benchmark import seed
+        from todos.models import Todo
+
+        start = time.perf_counter()
+        users = seed(args.users, args.todos // args.users)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {Todo._meta.db_table}')
+        print(f'Seeded {Todo.objects.count()} todos in {time.perf_counter() - start:.1f}s.')
+
+        User.objects.create_superuser('admin', 'admin@example.com', 'admin_password123')
+        client = Client()
+        client.login(username='admin', password='admin_password123')
+        todo = Todo.objects.values_list('id', flat=True).first()
+        url = '/admin/todos/todo/'
+        pages = {
+            'changelist': url,
+            'page 50': f'{url}?p=50',
+            'year': f'{url}?date__year={timezone.now().year}',
+            'search': f'{url}?q=title+7',
+            'author': f'{url}?q=%40{users[0].username}',
+            'id': f'{url}?q={todo}',
+        }
+
+        over = 0
+        print(f'{"page":<12}{"ms":>10}')
+        for name, path in pages.items():
+            best = float('inf')
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                response = client.get(path)
+                best = min(best, time.perf_counter() - start)
+                assert response.status_code == 200, (path, response.status_code)
+            over += best * 1000 > args.budget_ms
+            print(f'{name:<12}{best * 1000:>10.1f}' + ('  over budget' if best * 1000 > args.budget_ms else ''))
+    finally:
+        teardown()
+    sys.exit(1 if over else 0)
+
+
+if __name__ == '__main__':
+    main()
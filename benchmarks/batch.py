@@ -0,0 +1,54 @@
+"""
+Times the bulk JSON API at /todos/batch/ for a batch of creates and a mixed
+batch of updates and deletes against a scratch database:
+
+    python benchmarks/batch.py --size 1000
+"""
+import argparse
+import json
+import time
+
+from common import setup_test_database
+
+
+def post_batch(client, operations):
+    start = time.perf_counter()
+    response = client.post('/todos/batch/', json.dumps({'operations': operations}),
+                           content_type='application/json')
+    elapsed = time.perf_counter() - start
+    assert response.status_code == 200, response.content
+    return response.json()['results'], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=1000, help='operations per batch')
+    args = parser.parse_args()
+
+    teardown = setup_test_database()
+    try:
+        from django.contrib.auth.models import User
+        from django.test import Client
+
+        User.objects.create_user(username='bench', password='bench_password123')
+        client = Client()
+        client.login(username='bench', password='bench_password123')
+
+        results, elapsed = post_batch(client, [
+            {'op': 'create', 'title': f'title{i}', 'description': 'description'} for i in range(args.size)
+        ])
+        print(f'{args.size} creates:           {elapsed * 1000:.1f} ms')
+
+        ids = [r['id'] for r in results]
+        half = len(ids) // 2
+        _, elapsed = post_batch(client, (
+            [{'op': 'update', 'id': pk, 'title': 'updated'} for pk in ids[:half]]
+            + [{'op': 'delete', 'id': pk} for pk in ids[half:]]
+        ))
+        print(f'{args.size} updates/deletes:   {elapsed * 1000:.1f} ms')
+    finally:
+        teardown()
+
+
+if __name__ == '__main__':
+    main()
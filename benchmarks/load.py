@@ -0,0 +1,117 @@
+"""
+Load-tests the app over HTTP, serving it with sync gunicorn workers (WSGI),
+uvicorn workers under gunicorn (ASGI), or both at the same worker count:
+
+    python benchmarks/load.py --server both --workers 4 --concurrency 32
+
+Each run gets a fresh SQLite database seeded with one user and their todos.
+Logged-in clients then hit the list, detail and create pages in a loop, and
+the script reports requests/sec and latency percentiles.
+"""
+import argparse
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import BASE_DIR
+
+sys.path.insert(0, BASE_DIR)
+from todos.benchmark import BENCH_PASSWORD, log_in, run_load  # noqa: E402
+
+USERNAME, PASSWORD = 'bench', BENCH_PASSWORD
+
+SERVERS = {
+    'wsgi': ['gunicorn', 'todo_project.wsgi'],
+    'asgi': ['gunicorn', 'todo_project.asgi', '--worker-class', 'uvicorn.workers.UvicornWorker'],
+}
+
+SEED = '''
+from django.contrib.auth.models import User
+from todos.models import Todo
+user = User.objects.create_user(username={username!r}, password={password!r})
+todos = []
+for i in range({todos}):
+    todos.append(Todo(author=user, title=f'title{{i}}', description='description'))
+Todo.objects.bulk_create(todos)
+print(Todo.objects.values_list('id', flat=True).first())
+'''
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def prepare_database(env, todos):
+    """Migrates and seeds the database in env, returning the id of one todo."""
+    subprocess.run([sys.executable, 'manage.py', 'migrate', '-v0'], cwd=BASE_DIR, env=env, check=True)
+    output = subprocess.run(
+        [sys.executable, 'manage.py', 'shell', '-c', SEED.format(username=USERNAME, password=PASSWORD, todos=todos)],
+        cwd=BASE_DIR, env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return output.strip().splitlines()[-1]
+
+
+def wait_for(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Server on port {port} did not start.')
+
+
+def bench_server(kind, args):
+    tmp = tempfile.mkdtemp()
+    port = free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=f'sqlite:///{os.path.join(tmp, "db.sqlite3")}',
+        SECRET_KEY=os.environ.get('SECRET_KEY', 'benchmark-only-secret-key'),
+        DEBUG='False',
+    )
+    server = None
+    try:
+        todo_id = prepare_database(env, args.todos)
+        server = subprocess.Popen(
+            SERVERS[kind] + ['--workers', str(args.workers), '--bind', f'127.0.0.1:{port}'],
+            cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        wait_for(port)
+        base_url = f'http://127.0.0.1:{port}'
+        cookie = log_in(base_url, USERNAME)
+        paths = ['/todos/', f'/todos/{todo_id}/', '/todos/new/']
+        return run_load(base_url, paths, cookie, args.concurrency, args.duration)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        shutil.rmtree(tmp)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--server', choices=['wsgi', 'asgi', 'both'], default='both')
+    parser.add_argument('--workers', type=int, default=2, help='server worker processes')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent clients')
+    parser.add_argument('--duration', type=float, default=10, help='seconds of load per server')
+    parser.add_argument('--todos', type=int, default=100, help='todos seeded for the user')
+    args = parser.parse_args()
+
+    kinds = ['wsgi', 'asgi'] if args.server == 'both' else [args.server]
+    print(f'{"server":<8}{"requests":>10}{"errors":>8}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+    for kind in kinds:
+        r = bench_server(kind, args)
+        print(f'{kind:<8}{r["requests"]:>10}{r["errors"]:>8}{r["rps"]:>10.1f}'
+              f'{r["p50_ms"]:>10.1f}{r["p95_ms"]:>10.1f}{r["p99_ms"]:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
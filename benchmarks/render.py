@@ -0,0 +1,62 @@
+"""
+Times rendering the todo list fragment at several card counts, with cards
+included per todo (before) and inlined with pre-reversed links (after):
+
+    python benchmarks/render.py --cards 100 1000 10000
+
+Todos are built in memory, so only template rendering is measured. Run with
+TEMPLATE_CACHE=False to see the cost of the uncached loader as well.
+"""
+import argparse
+import time
+
+from common import setup_test_database
+
+
+def render(template_name, context, request, repeat):
+    from django.template.loader import render_to_string
+
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        render_to_string(template_name, context, request=request)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cards', type=int, nargs='+', default=[100, 1000, 10000], help='cards per render')
+    parser.add_argument('--repeat', type=int, default=5, help='renders per measurement; the best is kept')
+    args = parser.parse_args()
+
+    teardown = setup_test_database()
+    try:
+        from django.contrib.auth.models import User
+        from django.test import RequestFactory
+        from django.utils import timezone
+
+        from todos.models import Todo
+        from todos.views import TodoListView, card_urls
+
+        user = User.objects.create_user(username='bench', password='bench_password123')
+        request = RequestFactory().get('/todos/')
+        request.user = user
+        now = timezone.now()
+
+        print(f'{"cards":>8}{"include ms":>14}{"inline ms":>14}{"speed-up":>10}')
+        for cards in args.cards:
+            todos = [Todo(author=user, title=f'title {i}', description='description', date=now)
+                     for i in range(cards)]
+            context = {'todo_list': todos, 'todo_count': cards, 'next_cursor': None}
+            before = render(TodoListView.items_template_name, dict(context, inline_cards=False),
+                            request, args.repeat)
+            after = render(TodoListView.items_template_name,
+                           dict(context, inline_cards=True, card_urls=card_urls()), request, args.repeat)
+            print(f'{cards:>8}{before * 1000:>14.1f}{after * 1000:>14.1f}{before / after:>9.1f}x')
+    finally:
+        teardown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Measures full-text search latency over one user's todos, seeding them with
+random words from a fixed vocabulary first:
+
+    python benchmarks/search.py --todos 100000
+"""
+import argparse
+import random
+import statistics
+import time
+
+from common import setup_test_database
+
+WORDS = (
+    'buy milk eggs bread call mom dentist appointment renew passport fix bike '
+    'pay rent water plants book flights clean garage email boss review report '
+    'walk dog laundry gym taxes birthday gift cancel subscription update resume'
+).split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--todos', type=int, default=100_000, help='todos seeded for the user')
+    parser.add_argument('--queries', type=int, default=200, help='searches timed')
+    args = parser.parse_args()
+
+    teardown = setup_test_database()
+    try:
+        from django.contrib.auth.models import User
+
+        from todos.models import Todo
+        from todos.search import search_todos
+
+        rng = random.Random(0)
+        user = User.objects.create_user(username='bench')
+        start = time.perf_counter()
+        for offset in range(0, args.todos, 10_000):
+            Todo.objects.bulk_create(
+                Todo(author=user, title=' '.join(rng.sample(WORDS, 3)), description=' '.join(rng.sample(WORDS, 8)))
+                for _ in range(min(10_000, args.todos - offset))
+            )
+        print(f'seeded {args.todos:,} todos in {time.perf_counter() - start:.1f}s')
+
+        timings = []
+        for _ in range(args.queries):
+            query = ' '.join(rng.sample(WORDS, rng.randint(1, 2)))
+            start = time.perf_counter()
+            search_todos(user, query)
+            timings.append(time.perf_counter() - start)
+
+        timings.sort()
+        print(f'{args.queries} searches')
+        print(f'  p50: {statistics.median(timings) * 1000:.1f} ms')
+        print(f'  p95: {timings[int(len(timings) * 0.95)] * 1000:.1f} ms')
+        print(f'  max: {timings[-1] * 1000:.1f} ms')
+    finally:
+        teardown()
+
+
+if __name__ == '__main__':
+    main()
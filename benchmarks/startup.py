@@ -0,0 +1,45 @@
+"""
+Measures how long a fresh worker process takes to import the WSGI application.
+
+Each sample runs in a new interpreter, the way a gunicorn worker boots. Run it
+on two checkouts to compare them, e.g. before and after a settings change:
+
+    python benchmarks/startup.py --runs 20
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = (
+    'import time; start = time.perf_counter(); '
+    'import todo_project.wsgi; '
+    'print(time.perf_counter() - start)'
+)
+
+
+def sample():
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE],
+        cwd=BASE_DIR, check=True, capture_output=True, text=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10, help='number of worker imports to time')
+    args = parser.parse_args()
+
+    timings = sorted(sample() for _ in range(args.runs))
+    print(f'runs:   {args.runs}')
+    print(f'min:    {timings[0] * 1000:.1f} ms')
+    print(f'median: {statistics.median(timings) * 1000:.1f} ms')
+    print(f'max:    {timings[-1] * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Compares Todo insert throughput with random UUIDv4 and time-ordered UUIDv7
+primary keys as the table grows, reporting rows/sec per segment:
+
+    python benchmarks/uuid_inserts.py --rows 1000000
+"""
+import argparse
+import time
+
+from common import setup_test_database
+
+
+def run(version, rows, segment, batch_size):
+    from django.contrib.auth.models import User
+    from django.test.utils import override_settings
+
+    from todos.models import Todo
+
+    Todo.objects.all().delete()
+    user = User.objects.get_or_create(username='bench')[0]
+    print(f'UUIDv{version}')
+    with override_settings(TODO_UUID_VERSION=version):
+        total_start = time.perf_counter()
+        for segment_start in range(0, rows, segment):
+            start = time.perf_counter()
+            for offset in range(segment_start, min(segment_start + segment, rows), batch_size):
+                Todo.objects.bulk_create(
+                    [Todo(author=user, title='title') for _ in range(min(batch_size, rows - offset))]
+                )
+            count = min(segment, rows - segment_start)
+            print(f'  rows {segment_start + count:>10,}: {count / (time.perf_counter() - start):>10,.0f} rows/sec')
+        print(f'  total: {rows / (time.perf_counter() - total_start):,.0f} rows/sec')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000, help='rows inserted per UUID version')
+    parser.add_argument('--segment', type=int, default=100_000, help='rows per reported segment')
+    parser.add_argument('--batch-size', type=int, default=5000, help='rows per transaction')
+    args = parser.parse_args()
+
+    teardown = setup_test_database()
+    try:
+        for version in (4, 7):
+            run(version, args.rows, args.segment, args.batch_size)
+    finally:
+        teardown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Measures how soon a freshly started gunicorn serves requests as fast as it
+will once warm, with the preloaded warm-up in todo_project.gunicorn_conf and
+without it:
+
+    python benchmarks/warmup.py --workers 2 --requests 200
+
+Each run starts the server on a fresh SQLite database, then a logged-in client
+requests the list, detail, create and login pages one after another from the
+moment the process is spawned, each on a new connection so every worker gets
+some. Steady state is the median latency of the last half of the requests,
+and a request is fast when it takes at most --fast-ratio times that. The
+script reports the time from spawn to the first response, and to the first
+fast request that starts a run of --window fast ones, so a lone hiccup in
+steady state does not count as warming up.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from common import BASE_DIR
+from load import USERNAME, free_port, prepare_database
+
+MODES = {
+    'cold': {'GUNICORN_PRELOAD': 'False', 'GUNICORN_WARMUP': 'False'},
+    'warm': {'GUNICORN_PRELOAD': 'True', 'GUNICORN_WARMUP': 'True'},
+}
+
+SESSION = '''
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import Client
+client = Client()
+client.force_login(User.objects.get(username={username!r}))
+print(f'{{settings.SESSION_COOKIE_NAME}}={{client.cookies[settings.SESSION_COOKIE_NAME].value}}')
+'''
+
+
+def log_in(env):
+    """Creates a session for the benchmark user without a request to the server."""
+    output = subprocess.run(
+        [sys.executable, 'manage.py', 'shell', '-c', SESSION.format(username=USERNAME)],
+        cwd=BASE_DIR, env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return output.strip().splitlines()[-1]
+
+
+def fetch(url, cookie):
+    request = urllib.request.Request(url, headers={'Cookie': cookie})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        response.read()
+
+
+def measure(mode, args):
+    """Returns the (seconds since spawn, latency) of each request made."""
+    tmp = tempfile.mkdtemp()
+    port = free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=f'sqlite:///{os.path.join(tmp, "db.sqlite3")}',
+        SECRET_KEY=os.environ.get('SECRET_KEY', 'benchmark-only-secret-key'),
+        DEBUG='False',
+        WEB_CONCURRENCY=str(args.workers),
+        **MODES[mode],
+    )
+    server = None
+    try:
+        todo_id = prepare_database(env, args.todos)
+        cookie = log_in(env)
+        base_url = f'http://127.0.0.1:{port}'
+        paths = ['/todos/', f'/todos/{todo_id}/', '/todos/new/', '/accounts/login/']
+        samples = []
+        spawned = time.perf_counter()
+        server = subprocess.Popen(
+            ['gunicorn', 'todo_project.wsgi', '-c', 'python:todo_project.gunicorn_conf', '--bind', f'127.0.0.1:{port}'],
+            cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        while len(samples) < args.requests:
+            if time.perf_counter() - spawned > 30:
+                raise RuntimeError(f'Server on port {port} did not start.')
+            start = time.perf_counter()
+            try:
+                fetch(base_url + paths[len(samples) % len(paths)], cookie)
+            except (ConnectionError, urllib.error.URLError):
+                if samples:
+                    raise
+                time.sleep(0.005)
+                continue
+            end = time.perf_counter()
+            samples.append((end - spawned, end - start))
+        return samples
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        shutil.rmtree(tmp)
+
+
+def summarize(samples, fast_ratio, window):
+    latencies = [latency for _, latency in samples]
+    steady = statistics.median(latencies[len(latencies) // 2:])
+    fast = [latency <= fast_ratio * steady for latency in latencies]
+    settled = next((i for i in range(len(fast)) if all(fast[i:i + window])), None)
+    return {
+        'first_ms': samples[0][0] * 1000,
+        'first_fast_ms': float('nan') if settled is None else samples[settled][0] * 1000,
+        'slow': fast.count(False),
+        'steady_ms': steady * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mode', choices=['cold', 'warm', 'both'], default='both')
+    parser.add_argument('--workers', type=int, default=2, help='server worker processes')
+    parser.add_argument('--requests', type=int, default=200, help='requests made after spawning the server')
+    parser.add_argument('--fast-ratio', type=float, default=2,
+                        help='slowest fast request, as a multiple of steady state')
+    parser.add_argument('--window', type=int, default=10, help='fast requests in a row that count as warm')
+    parser.add_argument('--todos', type=int, default=100, help='todos seeded for the user')
+    args = parser.parse_args()
+
+    modes = ['cold', 'warm'] if args.mode == 'both' else [args.mode]
+    print(f'{"mode":<8}{"first ms":>10}{"first fast ms":>15}{"slow":>6}{"steady ms":>11}')
+    for mode in modes:
+        r = summarize(measure(mode, args), args.fast_ratio, args.window)
+        print(f'{mode:<8}{r["first_ms"]:>10.1f}{r["first_fast_ms"]:>15.1f}{r["slow"]:>6}{r["steady_ms"]:>11.2f}')
+
+
+if __name__ == '__main__':
+    main()
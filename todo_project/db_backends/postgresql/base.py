@@ -0,0 +1,114 @@
+"""
+PostgreSQL backend adding connection health checks and an optional in-process
+connection pool on top of Django's stock psycopg2 backend.
+
+Enabled from settings when DATABASE_URL points at PostgreSQL. Reads extra
+keys from the database settings dict:
+
+    CONN_HEALTH_CHECKS  Ping a persistent connection before its first use in
+                        each request and reconnect if the server dropped it.
+    POOL_SIZE           When non-zero, check connections out of a per-process
+                        BlockingConnectionPool of at most this many
+                        connections instead of opening a new one each time.
+    POOL_TIMEOUT        Seconds to wait for a connection while all POOL_SIZE
+                        are in use, before failing with PoolError.
+"""
+import os
+import threading
+
+from django.db.backends.postgresql import base
+from django.utils.asyncio import async_unsafe
+from psycopg2 import pool
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class BlockingConnectionPool(pool.ThreadedConnectionPool):
+    """A psycopg2 ThreadedConnectionPool that opens connections on demand and
+    keeps up to maxconn of them open once returned.
+
+    While all maxconn are checked out, getconn() waits up to timeout seconds
+    (None waits forever) for one to be returned, where psycopg2's own pool
+    raises PoolError at once.
+    """
+
+    def __init__(self, maxconn, *args, timeout=None, **kwargs):
+        super().__init__(0, maxconn, *args, **kwargs)
+        # psycopg2 closes a returned connection once it holds minconn idle
+        # ones, so with minconn 0 it would never reuse any
+        self.minconn = maxconn
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(maxconn)
+
+    def getconn(self, key=None):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise pool.PoolError(
+                f'connection pool exhausted: none of its {self.maxconn} connections '
+                f'was returned within {self.timeout} seconds'
+            )
+        try:
+            return super().getconn(key)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn=None, key=None, close=False):
+        super().putconn(conn, key, close)
+        self._slots.release()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+
+    def _get_pool(self, conn_params):
+        # Keyed by pid so forked workers never share a parent's sockets
+        key = (os.getpid(), self.alias)
+        with _pools_lock:
+            if key not in _pools:
+                _pools[key] = BlockingConnectionPool(
+                    self.settings_dict['POOL_SIZE'], timeout=self.settings_dict.get('POOL_TIMEOUT'), **conn_params
+                )
+            return _pools[key]
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        if not self.settings_dict.get('POOL_SIZE'):
+            return super().get_new_connection(conn_params)
+        connection = self._get_pool(conn_params).getconn()
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get('isolation_level', connection.isolation_level)
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        connection_pool = _pools.get((os.getpid(), self.alias))
+        if self.connection is not None and connection_pool is not None:
+            with self.wrap_database_errors:
+                # The pool discards connections left in a broken state
+                return connection_pool.putconn(self.connection)
+        return super()._close()
+
+    @async_unsafe
+    def connect(self):
+        super().connect()
+        # A freshly opened connection needs no ping
+        self.health_check_done = True
+
+    @async_unsafe
+    def ensure_connection(self):
+        if (self.connection is not None and not self.health_check_done and not self.in_atomic_block
+                and self.settings_dict.get('CONN_HEALTH_CHECKS')):
+            self.health_check_done = True
+            if not self.is_usable():
+                self.close()
+        super().ensure_connection()
+
+    def close_if_unusable_or_obsolete(self):
+        # Called at request boundaries; the next request pings before first use
+        self.health_check_done = False
+        super().close_if_unusable_or_obsolete()
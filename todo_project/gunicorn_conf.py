@@ -0,0 +1,91 @@
+"""
+Gunicorn settings, used by the Procfile to serve the ASGI application:
+
+    gunicorn todo_project.asgi -c python:todo_project.gunicorn_conf --worker-class uvicorn.workers.UvicornWorker
+
+The master imports the application and warms it up (see todo_project.warmup)
+before forking, so workers share that memory copy-on-write and serve their
+first requests as fast as later ones. Each worker then opens its own database
+connections. Set GUNICORN_PRELOAD=False for lazy per-worker imports, which
+--reload needs, and GUNICORN_WARMUP=False to skip the warm-up.
+
+Several workers need the cache and the event broker shared between them.
+While either is process-local, the default is a single worker, and asking
+for more runs one with a warning.
+"""
+import gc
+import os
+
+# Imported under another name, since gunicorn reads a module-level "config" as
+# its own setting of that name
+from decouple import config as env
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'todo_project.settings')
+
+
+def process_local_settings():
+    """Returns the settings that keep state within one process, so a write
+    served by one worker would go unseen by the others.
+    """
+    from django.conf import settings
+
+    local = []
+    if settings.CACHES['default']['BACKEND'] == settings.CACHE_BACKENDS['locmem']:
+        local.append('CACHE_BACKEND=locmem keeps the todo list cache and its versions per process')
+    if settings.TODO_EVENTS_BROKER == settings.EVENT_BROKERS['local']:
+        local.append('TODO_EVENTS_BROKER=local delivers events within one process')
+    return local
+
+
+# Cores this process may use, which in a container can be fewer than the host's
+cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+
+# A process per core, plus one to cover a worker blocked or restarting, once
+# the workers can share state. WEB_CONCURRENCY, which Heroku sets from the
+# dyno's memory, overrides it. No threads are set: the Procfile's uvicorn
+# workers serve requests from an event loop and ignore them.
+workers = env('WEB_CONCURRENCY', default=1 if process_local_settings() else cpus + 1, cast=int)
+
+preload_app = env('GUNICORN_PRELOAD', default=True, cast=bool)
+warm = env('GUNICORN_WARMUP', default=True, cast=bool)
+
+
+def on_starting(server):
+    local = process_local_settings()
+    if server.num_workers > 1 and local:
+        server.log.warning(
+            'Running 1 worker instead of %d: several need state they share, but %s. '
+            'Set CACHE_BACKEND=db (after manage.py createcachetable) or file and TODO_EVENTS_BROKER=postgres.',
+            server.num_workers, ' and '.join(local),
+        )
+        server.num_workers = 1
+
+
+def when_ready(server):
+    # Runs in the master after a preloaded application is imported, before
+    # the first fork
+    if not preload_app:
+        return
+    if warm:
+        from todo_project.warmup import warm_up
+
+        server.log.info('Warmed up; compiled %d templates.', warm_up())
+    from django.db import connections
+
+    # Workers must not inherit, and share, the master's database sockets
+    connections.close_all()
+    # Moves everything loaded so far out of the garbage collector's reach, so
+    # collections in the workers never write to, and so copy, those pages
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    if not warm:
+        return
+    from todo_project.warmup import prime_databases, warm_up
+
+    if not preload_app:
+        warm_up()
+    # Only a sync worker serves requests on this thread; gthread and uvicorn
+    # workers serve them on others
+    prime_databases(keep=worker.cfg.worker_class_str == 'sync')
@@ -0,0 +1,220 @@
+import json
+import logging
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+from django.template.base import Template
+from django.utils.functional import SimpleLazyObject
+
+from todos.auth import get_cached_user
+from todos.sharding import ShardMoving, is_sharded
+
+from .routers import _replica_reads
+
+logger = logging.getLogger('todo_project.profiling')
+
+# Profile of the request being handled in the current thread or task
+_profile = ContextVar('request_profile', default=None)
+
+
+def _instrument_templates():
+    """Wraps Template._render to time template rendering for profiled requests.
+
+    Only the outermost render is timed, so {% include %} and {% extends %}
+    are not counted twice.
+    """
+    if getattr(Template._render, 'profiled', False):
+        return
+    render = Template._render
+
+    def profiled_render(self, context):
+        profile = _profile.get()
+        if profile is None or profile['render_depth']:
+            return render(self, context)
+        profile['render_depth'] += 1
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            profile['template_time'] += time.perf_counter() - start
+            profile['render_depth'] -= 1
+
+    profiled_render.profiled = True
+    Template._render = profiled_render
+
+
+# reset_peak() is new in Python 3.9. Before it, clearing the traces is the only
+# way to reset the peak; the baseline taken after it is then zero.
+_reset_peak = getattr(tracemalloc, 'reset_peak', tracemalloc.clear_traces)
+
+
+class RequestProfilingMiddleware:
+    """Records what each request costs and reports it in a Server-Timing header
+    and a structured log line.
+
+    Tracks query count and time on every database connection, template render
+    time, view time and, if REQUEST_PROFILING_MEMORY is set, peak Python
+    allocation. Statements repeated REQUEST_PROFILING_REPEAT_THRESHOLD or more
+    times in one request are logged as likely N+1 queries. Enabled by
+    REQUEST_PROFILING; when off, the middleware removes itself at startup.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.repeat_threshold = settings.REQUEST_PROFILING_REPEAT_THRESHOLD
+        self.trace_memory = settings.REQUEST_PROFILING_MEMORY
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _instrument_templates()
+
+    def __call__(self, request):
+        profile = {
+            'queries': Counter(),
+            'db_time': 0.0,
+            'template_time': 0.0,
+            'render_depth': 0,
+            'view_start': None,
+            'view_end': None,
+        }
+        token = _profile.set(profile)
+        if self.trace_memory:
+            _reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(self._record_query))
+                response = self.get_response(request)
+        finally:
+            _profile.reset(token)
+        end = time.perf_counter()
+
+        view_end = profile['view_end'] or end
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round((end - start) * 1000, 2),
+            'view_ms': round((view_end - profile['view_start']) * 1000, 2) if profile['view_start'] else None,
+            'template_ms': round(profile['template_time'] * 1000, 2),
+            'db_ms': round(profile['db_time'] * 1000, 2),
+            'queries': sum(profile['queries'].values()),
+            'repeated_queries': {
+                sql: count for sql, count in profile['queries'].items() if count >= self.repeat_threshold
+            },
+        }
+        if self.trace_memory:
+            record['peak_alloc_kb'] = round((tracemalloc.get_traced_memory()[1] - baseline) / 1024, 1)
+
+        response['Server-Timing'] = ', '.join(filter(None, [
+            f'db;dur={record["db_ms"]};desc="{record["queries"]} queries"',
+            f'tpl;dur={record["template_ms"]}',
+            f'view;dur={record["view_ms"]}' if record['view_ms'] is not None else None,
+            f'total;dur={record["total_ms"]}',
+        ]))
+        logger.info(json.dumps(record))
+        for sql, count in record['repeated_queries'].items():
+            logger.warning(json.dumps({'path': request.path, 'repeated_query': sql, 'count': count}))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _profile.get()['view_start'] = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # Called as soon as the view returns, before its template is rendered
+        _profile.get()['view_end'] = time.perf_counter()
+        return response
+
+    def _record_query(self, execute, sql, params, many, context):
+        profile = _profile.get()
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if profile is not None:
+                profile['db_time'] += time.perf_counter() - start
+                profile['queries'][sql] += 1
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """Replaces AuthenticationMiddleware, loading request.user lazily through
+    the cache in todos.auth rather than with a query on every request.
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_cached_user(request))
+
+
+class ReplicaRoutingMiddleware:
+    """Lets GET and HEAD requests to views with replica_reads = True read from
+    the replicas in DATABASE_REPLICAS.
+
+    After a successful POST, PUT, PATCH or DELETE the client gets a cookie that
+    pins its reads to the primary for DATABASE_REPLICA_PIN_SECONDS, long enough
+    for the replicas to catch up with its own write. Removes itself at startup
+    when no replica is configured.
+    """
+    cookie_name = 'pin_primary'
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.pin_seconds = settings.DATABASE_REPLICA_PIN_SECONDS
+
+    def __call__(self, request):
+        token = _replica_reads.set(False)
+        try:
+            response = self.get_response(request)
+        finally:
+            _replica_reads.reset(token)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            response.set_cookie(
+                self.cookie_name, '1', max_age=self.pin_seconds, httponly=True, samesite='Lax',
+                secure=request.is_secure(),
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        if (
+            request.method in ('GET', 'HEAD')
+            and getattr(view_class, 'replica_reads', False)
+            and self.cookie_name not in request.COOKIES
+        ):
+            _replica_reads.set(True)
+
+
+class ShardMovingMiddleware:
+    """Answers a write refused because the user's Todos are being moved between
+    shards with 503 Service Unavailable and a Retry-After header. Removes
+    itself at startup when there is only one shard.
+    """
+
+    def __init__(self, get_response):
+        if not is_sharded():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, ShardMoving):
+            response = HttpResponse('Your todos are being moved. Try again shortly.', status=503)
+            response['Retry-After'] = max(settings.TODO_SHARD_CACHE_TIMEOUT, 1)
+            return response
+        return None
@@ -0,0 +1,153 @@
+"""
+The realtime endpoint: streams a user's Todo events from todos.events at
+/todos/events/, as Server-Sent Events to a GET request or as JSON messages
+over a WebSocket.
+
+Django 3.0 runs views synchronously, which would hold a thread for every open
+stream, so the endpoint is a plain ASGI application in front of Django's and
+only the session lookup runs in a thread. An idle stream is a coroutine
+waiting on its queue. Every other request goes to Django unchanged.
+"""
+import asyncio
+import json
+from importlib import import_module
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpRequest
+from django.http.cookie import parse_cookie
+
+from todos.auth import get_cached_user
+from todos.events import TooManyConnections, get_broker
+
+
+def _headers(scope):
+    return {name.decode('latin1'): value.decode('latin1') for name, value in scope['headers']}
+
+
+def authenticate(scope):
+    """Returns the id of the user logged in with the scope's session cookie, or None."""
+    request = HttpRequest()
+    request.COOKIES = parse_cookie(_headers(scope).get('cookie', ''))
+    engine = import_module(settings.SESSION_ENGINE)
+    request.session = engine.SessionStore(request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+    try:
+        user = get_cached_user(request)
+    finally:
+        close_old_connections()
+    return user.pk if user.is_authenticated else None
+
+
+def _same_origin(scope):
+    # Browsers send Origin with every WebSocket handshake; other clients may not
+    headers = _headers(scope)
+    return 'origin' not in headers or urlsplit(headers['origin']).netloc == headers.get('host')
+
+
+async def _next_event(subscription, disconnected, timeout=None):
+    """Returns the subscription's next event, or None on disconnect or timeout."""
+    get = asyncio.ensure_future(subscription.get())
+    done, _ = await asyncio.wait({get, disconnected}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    if get in done:
+        return get.result()
+    get.cancel()
+    return None
+
+
+class EventsApplication:
+    """Serves the realtime endpoint at path and passes every other request on
+    to application.
+
+    Each user may hold TODO_EVENTS_MAX_CONNECTIONS streams per process; more
+    are refused with 429, or WebSocket close code 4429.
+    """
+
+    def __init__(self, application, path='/todos/events/'):
+        self.application = application
+        self.path = path
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == self.path:
+            return await self.event_stream(scope, receive, send)
+        if scope['type'] == 'websocket' and scope['path'] == self.path:
+            return await self.websocket(scope, receive, send)
+        return await self.application(scope, receive, send)
+
+    async def respond(self, send, status, body, headers=()):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'text/plain; charset=utf-8'), *headers],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def event_stream(self, scope, receive, send):
+        if scope['method'] != 'GET':
+            return await self.respond(send, 405, b'Method not allowed.', [(b'allow', b'GET')])
+        user_id = await sync_to_async(authenticate)(scope)
+        if user_id is None:
+            return await self.respond(send, 403, b'Log in to receive events.')
+        broker = get_broker()
+        try:
+            subscription = broker.subscribe(user_id)
+        except TooManyConnections:
+            return await self.respond(send, 429, b'Too many open event streams.', [(b'retry-after', b'60')])
+
+        async def disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        disconnected = asyncio.ensure_future(disconnect())
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [
+                    (b'content-type', b'text/event-stream'),
+                    (b'cache-control', b'no-cache'),
+                    # Stops nginx and similar proxies from buffering the stream
+                    (b'x-accel-buffering', b'no'),
+                ],
+            })
+            await send({'type': 'http.response.body', 'body': b': connected\n\n', 'more_body': True})
+            while not disconnected.done():
+                event = await _next_event(subscription, disconnected, settings.TODO_EVENTS_HEARTBEAT)
+                if disconnected.done():
+                    break
+                # A comment on idle streams keeps proxies from closing them
+                chunk = ': ping\n\n' if event is None else f'event: {event["type"]}\ndata: {json.dumps(event)}\n\n'
+                await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+        finally:
+            disconnected.cancel()
+            broker.unsubscribe(subscription)
+
+    async def websocket(self, scope, receive, send):
+        if (await receive())['type'] != 'websocket.connect':
+            return
+        user_id = await sync_to_async(authenticate)(scope) if _same_origin(scope) else None
+        if user_id is None:
+            return await send({'type': 'websocket.close', 'code': 4403})
+        broker = get_broker()
+        try:
+            subscription = broker.subscribe(user_id)
+        except TooManyConnections:
+            return await send({'type': 'websocket.close', 'code': 4429})
+
+        async def disconnect():
+            # Messages from the client are ignored
+            while (await receive())['type'] != 'websocket.disconnect':
+                pass
+
+        disconnected = asyncio.ensure_future(disconnect())
+        try:
+            await send({'type': 'websocket.accept'})
+            while not disconnected.done():
+                # The server's own pings keep an idle socket alive
+                event = await _next_event(subscription, disconnected)
+                if event is not None:
+                    await send({'type': 'websocket.send', 'text': json.dumps(event)})
+        finally:
+            disconnected.cancel()
+            broker.unsubscribe(subscription)
@@ -0,0 +1,81 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from random import choice
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from todos.sharding import is_sharded, shard_for_author
+
+# Apps whose reads may be served by a replica. Sessions always read from the
+# primary, so a replica lagging behind a login never logs anyone out.
+REPLICA_APPS = {'todos', 'auth'}
+
+# Whether the request being handled in the current thread or task may read
+# from a replica; set by ReplicaRoutingMiddleware for opted-in views.
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Lets queries inside the block read from a replica."""
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ShardRouter:
+    """Sends reads and writes of a sharded model's instance, or of a user's
+    related Todos, to the author's shard. Leaves every other query to the next
+    router; unpinned Todo querysets gather from all shards themselves.
+    """
+    sharded_models = {'todos.todo', 'todos.archivedtodo', 'todos.todotombstone'}
+
+    def _author_id(self, model, hints):
+        if model._meta.label_lower not in self.sharded_models or not is_sharded():
+            return None
+        instance = hints.get('instance')
+        if isinstance(instance, model):
+            return instance.author_id
+        if instance is not None and instance._meta.label_lower == 'auth.user':
+            return instance.pk
+        return None
+
+    def db_for_read(self, model, **hints):
+        author_id = self._author_id(model, hints)
+        return None if author_id is None else shard_for_author(author_id)
+
+    def db_for_write(self, model, **hints):
+        author_id = self._author_id(model, hints)
+        return None if author_id is None else shard_for_author(author_id, write=True)
+
+
+class ReplicaRouter:
+    """Sends reads to a random replica from DATABASE_REPLICAS while replica
+    reads are enabled, and everything else to the primary.
+
+    Reads inside a transaction on the primary stay there, so they see its
+    uncommitted writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        if (
+            settings.DATABASE_REPLICAS
+            and _replica_reads.get()
+            and model._meta.app_label in REPLICA_APPS
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return choice(settings.DATABASE_REPLICAS)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
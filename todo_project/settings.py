@@ -13,8 +13,7 @@ https://docs.djangoproject.com/en/3.0/ref/settings/
 import os
 
 import dj_database_url
-import psycopg2
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -42,28 +41,47 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'crispy_forms',
-    'todos',
+    'todos.apps.TodosConfig',
 ]
 
 MIDDLEWARE = [
+    'todo_project.middleware.RequestProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'todo_project.middleware.CachedAuthenticationMiddleware',
+    'todo_project.middleware.ReplicaRoutingMiddleware',
+    'todo_project.middleware.ShardMovingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-request query, template and view timing; see RequestProfilingMiddleware.
+# Removes itself from the stack at startup unless enabled.
+REQUEST_PROFILING = config('REQUEST_PROFILING', default=False, cast=bool)
+REQUEST_PROFILING_MEMORY = config('REQUEST_PROFILING_MEMORY', default=False, cast=bool)
+REQUEST_PROFILING_REPEAT_THRESHOLD = config('REQUEST_PROFILING_REPEAT_THRESHOLD', default=3, cast=int)
+
 ROOT_URLCONF = 'todo_project.urls'
 
+# Compiled templates are kept in memory by the cached loader. It is on by
+# default outside DEBUG; TEMPLATE_CACHE forces it either way (Django 3.0 does
+# not reload changed templates while it is on).
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if config('TEMPLATE_CACHE', default=not DEBUG, cast=bool):
+    TEMPLATE_LOADERS = [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -84,10 +102,160 @@ DATABASE_URL = config('DATABASE_URL')
 
 DATABASES = dict()
 
-DATABASES['default'] = dj_database_url.config(default=DATABASE_URL)
-
+# Connections are opened lazily on first query. CONN_MAX_AGE keeps them open
+# across requests (seconds, 0 closes after each request).
+DATABASES['default'] = dj_database_url.config(
+    default=DATABASE_URL,
+    conn_max_age=config('CONN_MAX_AGE', default=0, cast=int),
+)
+
+if DATABASES['default']['ENGINE'] in ('django.db.backends.postgresql', 'django.db.backends.postgresql_psycopg2'):
+    DATABASES['default'].update({
+        'ENGINE': 'todo_project.db_backends.postgresql',
+        'CONN_HEALTH_CHECKS': config('CONN_HEALTH_CHECKS', default=False, cast=bool),
+        'POOL_SIZE': config('DB_POOL_SIZE', default=0, cast=int),
+        'POOL_TIMEOUT': config('DB_POOL_TIMEOUT', default=30, cast=float),
+    })
+
+# Read replicas, as comma-separated database URLs. Reads from views marked
+# replica_reads go to a random replica; see todo_project.routers. A client
+# that has just written reads from the primary for DATABASE_REPLICA_PIN_SECONDS
+# so it never sees a list older than its own change.
+DATABASE_REPLICAS = []
+for n, url in enumerate(config('DATABASE_REPLICA_URLS', default='', cast=Csv())):
+    alias = f'replica{n}'
+    # Same engine and connection options as the primary; tests read the
+    # primary's test database through the replica alias.
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        **dj_database_url.parse(url, conn_max_age=DATABASES['default']['CONN_MAX_AGE']),
+        'ENGINE': DATABASES['default']['ENGINE'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_REPLICA_PIN_SECONDS = config('DATABASE_REPLICA_PIN_SECONDS', default=10, cast=int)
+
+# Todo shards, as comma-separated database URLs. The primary is always the
+# first shard; each URL adds a database holding the Todos of the users placed
+# on it. See todos.sharding.
+TODO_SHARDS = ['default']
+for n, url in enumerate(config('DATABASE_SHARD_URLS', default='', cast=Csv()), start=1):
+    alias = f'shard{n}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        **dj_database_url.parse(url, conn_max_age=DATABASES['default']['CONN_MAX_AGE']),
+        'ENGINE': DATABASES['default']['ENGINE'],
+    }
+    TODO_SHARDS.append(alias)
+
+# Seconds each process caches a user's shard; moves wait this long twice
+TODO_SHARD_CACHE_TIMEOUT = config('TODO_SHARD_CACHE_TIMEOUT', default=30, cast=int)
+
+DATABASE_ROUTERS = ['todo_project.routers.ShardRouter', 'todo_project.routers.ReplicaRouter']
+
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+
+# locmem is per process; use the file or db backend to share cached todo lists
+# across workers (db needs `manage.py createcachetable`). The default is file
+# when WEB_CONCURRENCY, which Heroku sets, asks for several workers.
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+}
+
+CACHE_BACKEND = config(
+    'CACHE_BACKEND', default='file' if config('WEB_CONCURRENCY', default=1, cast=int) > 1 else 'locmem'
+)
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': config('CACHE_LOCATION', default='todo_cache'),
+    },
+}
+
+TODO_LIST_CACHE_TIMEOUT = config('TODO_LIST_CACHE_TIMEOUT', default=300, cast=int)
+
+# Render list cards inline with pre-reversed URLs rather than through one
+# {% include %} and three {% url %} tags per card.
+TODO_LIST_INLINE_CARDS = config('TODO_LIST_INLINE_CARDS', default=True, cast=bool)
+
+# Seconds an authenticated user stays cached between requests, 0 to load it
+# from the database every time. Saving the user, e.g. on password change,
+# drops the cached copy, but only from a cache every process shares, so the
+# default is off with locmem.
+AUTH_USER_CACHE_TIMEOUT = config(
+    'AUTH_USER_CACHE_TIMEOUT', default=0 if CACHE_BACKEND == 'locmem' else 60, cast=int
+)
+
+# Sessions
+# https://docs.djangoproject.com/en/3.0/topics/http/sessions/
+
+# db stores every session in django_session. cached_db reads through the cache
+# and signed_cookies keeps the session in the cookie itself, so neither needs
+# a query per request. Purge expired db sessions with `manage.py purge_sessions`.
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_ENGINE = SESSION_ENGINES[config('SESSION_BACKEND', default='db')]
+
+# Realtime Todo events at /todos/events/, served by the ASGI application.
+# local delivers each event to the streams in the process that wrote it, so
+# it only suits a single process; postgres, the default on PostgreSQL, reaches
+# every web worker and the job worker. A dotted path names any other broker
+# class; see todos.events.
+EVENT_BROKERS = {
+    'local': 'todos.events.LocalBroker',
+    'postgres': 'todos.events.PostgresBroker',
+}
+TODO_EVENTS_BROKER = config(
+    'TODO_EVENTS_BROKER',
+    default='postgres' if DATABASES['default']['ENGINE'] == 'todo_project.db_backends.postgresql' else 'local',
+)
+TODO_EVENTS_BROKER = EVENT_BROKERS.get(TODO_EVENTS_BROKER, TODO_EVENTS_BROKER)
+# Open streams per user and process; events queued per stream before it is
+# told to resync instead; seconds between keep-alive comments on idle streams
+TODO_EVENTS_MAX_CONNECTIONS = config('TODO_EVENTS_MAX_CONNECTIONS', default=5, cast=int)
+TODO_EVENTS_QUEUE_SIZE = config('TODO_EVENTS_QUEUE_SIZE', default=100, cast=int)
+TODO_EVENTS_HEARTBEAT = config('TODO_EVENTS_HEARTBEAT', default=30, cast=int)
+
+# Housekeeping tasks the job worker (manage.py run_worker) queues itself, with
+# the seconds between runs; see todos.jobs.schedule
+JOB_SCHEDULE = {
+    'todos.tasks.archive_todos': 24 * 60 * 60,
+    'todos.tasks.purge_sessions': 60 * 60,
+    'todos.tasks.purge_tombstones': 24 * 60 * 60,
+}
+
+# UUID version for new Todo primary keys: 4 (random) or 7 (time-ordered).
+# Existing rows keep their ids, so the two can be mixed freely.
+TODO_UUID_VERSION = config('TODO_UUID_VERSION', default=4, cast=int)
+
+# Logging
+# https://docs.djangoproject.com/en/3.0/topics/logging/
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'todo_project.profiling': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
 
-conn = psycopg2.connect(DATABASE_URL, sslmode='require')
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -127,6 +295,11 @@ USE_TZ = True
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+# collectstatic writes a content-hashed copy of every file plus gzip and, with
+# the brotli package installed, Brotli variants. WhiteNoise serves hashed names
+# with a far-future "immutable" Cache-Control header and picks the variant the
+# client accepts. Run `manage.py build_assets` first to vendor and bundle the
+# CDN assets.
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 LOGIN_REDIRECT_URL = 'todo_list'
 LOGOUT_REDIRECT_URL = 'home'
@@ -0,0 +1,74 @@
+"""
+Start-up work for new server processes, run by the gunicorn hooks in
+todo_project.gunicorn_conf.
+
+Left alone, Django does this work during a worker's first requests: it
+compiles each template the first time it renders, builds the URL resolver's
+lookup tables on the first reverse(), loads the time zone on the first local
+date, and connects to each database. Those requests are then several times
+slower than the ones after them, which shows as a latency spike after every
+deploy or scale-up.
+"""
+import os
+
+from django.conf import settings
+from django.db import connections
+from django.template import engines
+from django.template.utils import get_app_template_dirs
+from django.urls import URLResolver, get_resolver
+from django.utils import timezone
+
+
+def compile_templates():
+    """Compiles every template under the project's templates/ and the apps'
+    templates/ directories, such as crispy_forms' form layouts, and returns
+    how many.
+
+    The cached template loader (TEMPLATE_CACHE) keeps them; without it the
+    compiled templates are thrown away again.
+    """
+    count = 0
+    for engine in engines.all():
+        for directory in [*engine.dirs, *get_app_template_dirs('templates')]:
+            for root, _, files in os.walk(directory):
+                for name in files:
+                    path = os.path.relpath(os.path.join(root, name), directory)
+                    engine.get_template(path.replace(os.sep, '/'))
+                    count += 1
+    return count
+
+
+def prime_url_resolver(resolver=None):
+    """Imports every URLconf and builds each resolver's reverse lookups."""
+    resolver = resolver or get_resolver()
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            prime_url_resolver(pattern)
+    resolver.reverse_dict
+    resolver.namespace_dict
+
+
+def prime_databases(keep=True):
+    """Connects to every database, so no request waits for a connection.
+
+    With keep, the connections stay with the calling thread, which serves the
+    requests of a sync worker and keeps them under CONN_MAX_AGE. Otherwise they
+    are closed again, which hands a pooled connection (DB_POOL_SIZE) back to
+    its pool for any thread to take.
+    """
+    for alias in settings.DATABASES:
+        connection = connections[alias]
+        connection.ensure_connection()
+        if not keep:
+            connection.close()
+
+
+def warm_up():
+    """Does the per-process work that needs no database connection, so it
+    can run before workers fork. Returns the number of templates compiled.
+    """
+    count = compile_templates()
+    prime_url_resolver()
+    # pytz reads its zone list from disk on the first lookup
+    timezone.get_default_timezone()
+    return count
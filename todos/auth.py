@@ -0,0 +1,51 @@
+"""
+A short-lived cache of authenticated users, so a logged-in request costs no
+auth_user query. Entries are keyed by user id and deleted whenever the user
+is saved or deleted, which covers password changes. Each request still checks
+its session's auth hash against the cached user, as django.contrib.auth does.
+
+The deletion only reaches every process through a shared cache. With locmem,
+another worker would keep accepting an old password's sessions until its
+copy expired, so AUTH_USER_CACHE_TIMEOUT defaults to 0 there.
+"""
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+def get_cached_user(request):
+    """Returns the request's user like django.contrib.auth.get_user, from the
+    cache when possible.
+    """
+    timeout = settings.AUTH_USER_CACHE_TIMEOUT
+    try:
+        user_id = auth._get_user_session_key(request)
+        backend_path = request.session[auth.BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+    if not timeout or backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return auth.get_user(request)
+
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = auth.get_user(request)
+        if user.is_authenticated:
+            cache.set(key, user, timeout)
+        return user
+
+    session_hash = request.session.get(auth.HASH_SESSION_KEY)
+    if not (session_hash and constant_time_compare(session_hash, user.get_session_auth_hash())):
+        request.session.flush()
+        return AnonymousUser()
+    return user
@@ -0,0 +1,127 @@
+import uuid
+
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from .cache import bump_list_version
+from .events import RESYNC, publish
+from .models import Todo, TodoTombstone
+from .sharding import shard_for_author
+from .stats import adjust_stats, numbering, removed_deltas
+
+EDITABLE_FIELDS = ('title', 'description')
+
+
+def _parse_id(value):
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+def _validate(todo):
+    try:
+        todo.clean_fields(exclude=('id', 'author', 'date'))
+    except ValidationError as e:
+        return e.message_dict
+    return None
+
+
+def apply_operations(user, operations):
+    """Applies a batch of create, update and delete operations to a user's Todos.
+
+    All writes happen in one transaction on the user's shard with a single
+    bulk_create, a single bulk_update and a single DELETE, whatever the batch
+    size. Deletes leave tombstones, also inserted in one query. Invalid
+    items are skipped and reported; the rest are applied. Returns one result
+    per operation, in order.
+    """
+    results = [None] * len(operations)
+    to_create, to_update, to_delete = [], [], []
+    referenced, seen = {}, set()
+
+    for index, op in enumerate(operations):
+        kind = op.get('op') if isinstance(op, dict) else None
+        if kind == 'create':
+            continue
+        if kind not in ('update', 'delete'):
+            results[index] = {'status': 'error', 'errors': {'op': ['Must be create, update or delete.']}}
+            continue
+        pk = _parse_id(op.get('id'))
+        if pk is None:
+            results[index] = {'status': 'error', 'errors': {'id': ['Must be a valid UUID.']}}
+        elif pk in seen:
+            results[index] = {'status': 'error', 'errors': {'id': ['Appears more than once in the batch.']}}
+        else:
+            referenced[index] = pk
+            seen.add(pk)
+
+    using = shard_for_author(user.pk, write=True)
+    existing = Todo.objects.using(using).filter(author=user, id__in=seen).in_bulk()
+    now = timezone.now()
+
+    for index, op in enumerate(operations):
+        if results[index] is not None:
+            continue
+        if op['op'] == 'create':
+            todo = Todo(author=user, **{f: op.get(f) or '' for f in EDITABLE_FIELDS})
+            errors = _validate(todo)
+            if errors:
+                results[index] = {'status': 'error', 'errors': errors}
+            else:
+                to_create.append(todo)
+                results[index] = {'status': 'created', 'id': str(todo.id)}
+            continue
+
+        todo = existing.get(referenced[index])
+        if todo is None:
+            results[index] = {'status': 'error', 'errors': {'id': ['Not found.']}}
+        elif op['op'] == 'delete':
+            to_delete.append(todo)
+            results[index] = {'status': 'deleted', 'id': str(todo.id)}
+        else:
+            for field in EDITABLE_FIELDS:
+                if field in op:
+                    setattr(todo, field, op[field] or '')
+            todo.date = now
+            errors = _validate(todo)
+            if errors:
+                results[index] = {'status': 'error', 'errors': errors}
+            else:
+                to_update.append(todo)
+                results[index] = {'status': 'updated', 'id': str(todo.id)}
+
+    changed = len(to_create) + len(to_update) + len(to_delete)
+    with numbering(using):
+        # Bulk writes send no model signals, so update the counters and take
+        # change numbers here, before the writes that store them
+        if changed:
+            deltas = removed_deltas((todo.created_at, todo.completed) for todo in to_delete)
+            seq = adjust_stats(
+                user.pk,
+                total=len(to_create) + deltas['total'],
+                uncompleted=len(to_create) + deltas['uncompleted'],
+                created_today=len(to_create) + deltas['created_today'],
+                changes=changed,
+            ) - changed
+            for todo in to_create + to_update + to_delete:
+                seq += 1
+                todo.change_seq = seq
+        if to_create:
+            Todo.objects.using(using).bulk_create(to_create)
+        if to_update:
+            Todo.objects.using(using).bulk_update(to_update, EDITABLE_FIELDS + ('date', 'change_seq'))
+        if to_delete:
+            # A raw DELETE skips the per-row collector and signals
+            Todo.objects.using(using).filter(
+                author=user, id__in=[todo.id for todo in to_delete]
+            )._raw_delete(using)
+            TodoTombstone.objects.using(using).bulk_create(
+                TodoTombstone(todo_id=todo.id, author=user, seq=todo.change_seq) for todo in to_delete
+            )
+
+    # Nor do they invalidate the cached list or notify open streams
+    if changed:
+        bump_list_version(user.pk)
+        publish(user.pk, RESYNC)
+    return results
@@ -0,0 +1,196 @@
+"""
+Building blocks for the bench management command and the scripts under
+benchmarks/: a bulk seeder, a test-client driver that also counts queries, a
+concurrent HTTP load generator, and comparison of saved results.
+
+The HTTP helpers only use the standard library, so scripts can import them
+without configuring Django.
+"""
+import http.client
+import http.cookiejar
+import re
+import statistics
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+BENCH_PASSWORD = 'bench_password123'
+
+# Metrics where a larger value is worse; everything else is better larger
+LOWER_IS_BETTER = ('p50_ms', 'p95_ms', 'p99_ms', 'queries')
+
+
+def seed(users, todos_per_user, batch_size=5000):
+    """Bulk-creates users bench0..benchN, each with todos_per_user Todos.
+
+    Every user shares one precomputed password hash, so seeding costs one
+    hash rather than one per user. Returns the created users.
+    """
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+
+    from .models import Todo
+
+    password = make_password(BENCH_PASSWORD)
+    User.objects.bulk_create(User(username=f'bench{n}', password=password) for n in range(users))
+    created = list(User.objects.filter(username__startswith='bench').order_by('id'))
+
+    batch = []
+    for user in created:
+        for i in range(todos_per_user):
+            batch.append(Todo(author=user, title=f'title {i}', description=f'description {i}'))
+            if len(batch) >= batch_size:
+                Todo.objects.bulk_create(batch)
+                batch = []
+    Todo.objects.bulk_create(batch)
+    return created
+
+
+def summarize(latencies, duration, queries=None, errors=0):
+    """Reduces per-request latencies in seconds to throughput and percentiles."""
+    latencies = sorted(latencies)
+
+    def percentile(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 2)
+
+    result = {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / duration, 1) if duration else 0,
+        'p50_ms': round(statistics.median(latencies) * 1000, 2) if latencies else 0,
+        'p95_ms': percentile(0.95) if latencies else 0,
+        'p99_ms': percentile(0.99) if latencies else 0,
+    }
+    if queries is not None:
+        result['queries'] = round(statistics.mean(queries), 2) if queries else 0
+    return result
+
+
+def drive_client(users, requests):
+    """Times each todo page through Django's test client, cycling through users.
+
+    Returns a summary per scenario, including mean queries per request.
+    Creates, edits and deletes really happen, so run against a scratch database.
+    Each user's share of the requests deletes one of their Todos per request,
+    so raises ValueError unless every user has at least that many.
+    """
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import reverse
+
+    from .models import Todo
+
+    clients = []
+    for user in users:
+        client = Client()
+        client.force_login(user)
+        # Todos to edit and delete, oldest first so the list stays stable
+        todos = list(Todo.objects.filter(author=user).order_by('date', 'id').values_list('id', flat=True))
+        clients.append((client, todos))
+    # Rounded up, since the first users take any remainder
+    needed = -(-requests // len(clients)) if clients else requests
+    if requests and min((len(todos) for _, todos in clients), default=0) < needed:
+        raise ValueError(f'{requests} requests need every user to have {needed} todos.')
+
+    scenarios = {
+        'list': lambda client, todo: client.get(reverse('todo_list')),
+        'detail': lambda client, todo: client.get(reverse('todo_detail', kwargs={'pk': todo})),
+        'create': lambda client, todo: client.post(reverse('todo_new'), {'title': 'title', 'description': ''}),
+        'edit': lambda client, todo: client.post(
+            reverse('todo_edit', kwargs={'pk': todo}), {'title': 'edited', 'description': ''}
+        ),
+        'delete': lambda client, todo: client.post(reverse('todo_delete', kwargs={'pk': todo})),
+    }
+    results = {}
+    for name, request in scenarios.items():
+        latencies, queries, errors = [], [], 0
+        start = time.perf_counter()
+        for n in range(requests):
+            client, todos = clients[n % len(clients)]
+            todo = todos.pop(0) if name == 'delete' else todos[n // len(clients) % len(todos)]
+            with CaptureQueriesContext(connection) as captured:
+                request_start = time.perf_counter()
+                response = request(client, todo)
+                latencies.append(time.perf_counter() - request_start)
+            queries.append(len(captured))
+            errors += response.status_code >= 400
+        results[name] = summarize(latencies, time.perf_counter() - start, queries, errors)
+    return results
+
+
+def log_in(base_url, username, password=BENCH_PASSWORD):
+    """Logs in through the login form and returns the resulting Cookie header."""
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    page = opener.open(f'{base_url}/accounts/login/').read().decode()
+    token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', page).group(1)
+    data = urllib.parse.urlencode({
+        'username': username, 'password': password, 'csrfmiddlewaretoken': token,
+    }).encode()
+    opener.open(urllib.request.Request(f'{base_url}/accounts/login/', data, headers={'Referer': base_url}))
+    return '; '.join(f'{cookie.name}={cookie.value}' for cookie in jar)
+
+
+def run_load(base_url, paths, cookie, concurrency, duration):
+    """Requests paths round-robin from concurrent keep-alive clients for duration
+    seconds, returning a summary of every request made.
+    """
+    host = urllib.parse.urlsplit(base_url).netloc
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(offset):
+        connection = http.client.HTTPConnection(host, timeout=30)
+        local, failed, i = [], 0, offset
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                connection.request('GET', paths[i % len(paths)], headers={'Cookie': cookie})
+                response = connection.getresponse()
+                response.read()
+                failed += response.status >= 400
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                connection.close()
+                connection = http.client.HTTPConnection(host, timeout=30)
+            local.append(time.perf_counter() - start)
+            i += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, duration, errors=errors[0])
+
+
+def compare(baseline, current, threshold):
+    """Compares two saved result sets metric by metric.
+
+    Returns (rows, regressions): a row (section, scenario, metric, baseline,
+    current, change %) for every metric present in both, and the subset that
+    got worse by more than threshold percent.
+    """
+    rows, regressions = [], []
+    for section in ('client', 'http'):
+        for scenario, metrics in current.get(section, {}).items():
+            before = baseline.get(section, {}).get(scenario)
+            if not before:
+                continue
+            for metric in ('rps',) + LOWER_IS_BETTER:
+                if metric not in metrics or metric not in before:
+                    continue
+                old, new = before[metric], metrics[metric]
+                change = (new - old) / old * 100 if old else 0.0
+                row = (section, scenario, metric, old, new, round(change, 1))
+                rows.append(row)
+                worse = change if metric in LOWER_IS_BETTER else -change
+                if worse > threshold:
+                    regressions.append(row)
+    return rows, regressions
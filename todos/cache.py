@@ -0,0 +1,34 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+
+
+def _version_key(user_id):
+    return f'todos:list-version:{user_id}'
+
+
+def get_list_version(user_id):
+    """Returns the current version of a user's Todo list, initialising it if absent.
+
+    Versions start from a nanosecond timestamp so a counter lost to eviction
+    never restarts at a value an older cached list was stored under.
+    """
+    return cache.get_or_set(_version_key(user_id), time.time_ns, None)
+
+
+def bump_list_version(user_id):
+    """Invalidates every cached page of a user's Todo list."""
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.set(_version_key(user_id), time.time_ns(), None)
+
+
+def list_cache_key(user_id, version, query_string):
+    """Returns the cache key of one rendered view of a user's Todo list.
+
+    query_string selects the page or search, and is hashed to keep keys short.
+    """
+    digest = hashlib.md5(query_string.encode()).hexdigest()
+    return f'todos:list:{user_id}:{version}:{digest}'
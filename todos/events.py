@@ -0,0 +1,178 @@
+"""
+Publish/subscribe of changes to a user's Todos, for the realtime endpoint in
+todo_project.realtime.
+
+Saves and deletes publish an event once their transaction commits. Bulk
+writes publish a single "resync" event, telling clients to catch up through
+/todos/sync/. The broker named by TODO_EVENTS_BROKER delivers events:
+
+    LocalBroker     Fans events out to the subscribers in this process only.
+                    Enough when one process serves both writes and streams.
+    PostgresBroker  Sends events through NOTIFY, and has one thread per
+                    process LISTEN and fan them out locally, so a write in any
+                    process reaches every subscriber.
+
+Each subscriber has a bounded queue. One that falls behind has its queue
+replaced by a single resync event rather than growing without limit, so an
+idle or slow connection costs a few objects whatever the write rate.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+RESYNC = {'type': 'resync'}
+
+
+class TooManyConnections(Exception):
+    """Raised when a user already has TODO_EVENTS_MAX_CONNECTIONS streams open in this process."""
+
+
+def todo_event(event_type, todo):
+    """Returns the event for a created, updated or deleted Todo."""
+    event = {'type': event_type, 'id': todo.id, 'seq': todo.change_seq}
+    if event_type != 'deleted':
+        event.update(
+            title=todo.title,
+            description=todo.description,
+            date=todo.date,
+            completed=todo.completed,
+            completed_at=todo.completed_at,
+        )
+    return event
+
+
+class Subscription:
+    """One open stream's queue of events, fed from any thread."""
+
+    def __init__(self, user_id, max_size):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(max_size)
+
+    def put(self, event):
+        # Runs on the subscriber's loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # The client fell behind; what it missed is in /todos/sync/
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class LocalBroker:
+    """Delivers events to subscribers in this process."""
+
+    def __init__(self):
+        self.subscriptions = {}
+        self.lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """Returns a new Subscription for the user's events. Call from the
+        event loop that will read it.
+        """
+        with self.lock:
+            subscriptions = self.subscriptions.setdefault(user_id, set())
+            if len(subscriptions) >= settings.TODO_EVENTS_MAX_CONNECTIONS:
+                raise TooManyConnections(f'User {user_id} has too many open event streams.')
+            subscription = Subscription(user_id, settings.TODO_EVENTS_QUEUE_SIZE)
+            subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self.subscriptions.pop(subscription.user_id, None)
+
+    def publish(self, user_id, event):
+        if user_id in self.subscriptions:
+            # Encoded as for another process, so ids and dates arrive as strings
+            self.deliver(user_id, json.loads(json.dumps(event, cls=DjangoJSONEncoder)))
+
+    def deliver(self, user_id, event):
+        """Hands an event to each of the user's subscribers in this process."""
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # The loop closed under a stream that never unsubscribed
+                self.unsubscribe(subscription)
+
+
+class PostgresBroker(LocalBroker):
+    """Delivers events to subscribers in every process through PostgreSQL
+    NOTIFY on the primary. A payload is limited to 8000 bytes, which a Todo
+    event stays well under.
+    """
+    channel = 'todo_events'
+
+    def __init__(self):
+        super().__init__()
+        self.listener = None
+
+    def subscribe(self, user_id):
+        with self.lock:
+            if self.listener is None:
+                self.listener = threading.Thread(target=self.listen, name='todo-events-listener', daemon=True)
+                self.listener.start()
+        return super().subscribe(user_id)
+
+    def publish(self, user_id, event):
+        payload = json.dumps({'user': user_id, 'event': event}, cls=DjangoJSONEncoder)
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.channel, payload])
+
+    def listen(self):
+        """Receives every process's events on a dedicated connection and fans
+        them out to this process's subscribers. Reconnects on error.
+        """
+        import psycopg2
+
+        database = connections[DEFAULT_DB_ALIAS]
+        while True:
+            connection = None
+            try:
+                # Opened directly, outside any connection pool, since it never returns
+                connection = psycopg2.connect(**database.get_connection_params())
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN {self.channel}')
+                while True:
+                    if select.select([connection], [], [], 60) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        message = json.loads(connection.notifies.pop(0).payload)
+                        self.deliver(message['user'], message['event'])
+            except Exception:
+                logger.exception('Todo event listener failed; reconnecting.')
+                if connection is not None:
+                    connection.close()
+                threading.Event().wait(5)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.TODO_EVENTS_BROKER)()
+
+
+def publish(user_id, event):
+    """Publishes an event to a user's subscribers."""
+    get_broker().publish(user_id, event)
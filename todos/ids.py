@@ -0,0 +1,25 @@
+import os
+import time
+import uuid
+
+from django.conf import settings
+
+
+def uuid7():
+    """Returns a time-ordered UUIDv7 (RFC 9562).
+
+    The top 48 bits hold the Unix time in milliseconds and the rest is random,
+    so ids created close together sort close together and new rows append to
+    the right-hand edge of the primary key index.
+    """
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), 'big')
+    value = value & ~(0xf << 76) | 0x7 << 76  # version 7
+    value = value & ~(0x3 << 62) | 0x2 << 62  # RFC 4122 variant
+    return uuid.UUID(int=value)
+
+
+def generate_todo_id():
+    """Returns the primary key for a new Todo, a UUIDv7 if TODO_UUID_VERSION is 7."""
+    if settings.TODO_UUID_VERSION == 7:
+        return uuid7()
+    return uuid.uuid4()
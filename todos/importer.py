@@ -0,0 +1,149 @@
+import csv
+import gzip
+import io
+import json
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .cache import bump_list_version
+from .events import RESYNC, publish
+from .models import Todo
+from .sharding import group_by_shard
+from .stats import adjust_stats, numbering
+
+# Every NOT NULL column: Django keeps no database defaults, so COPY must
+# write each one
+COPY_COLUMNS = (
+    'id', 'author_id', 'title', 'description', 'date', 'created_at', 'completed', 'completed_at', 'change_seq',
+)
+
+
+def open_source(path):
+    """Opens an import file as text, transparently decompressing .gz files."""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', newline='')
+    return open(path, newline='')
+
+
+def read_records(stream, import_format):
+    """Yields one dict per NDJSON line or CSV row, as written by export_todos.
+
+    A line that is not valid JSON is yielded as None so it can be reported
+    and skipped without losing its position in the input.
+    """
+    if import_format == 'csv':
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield None
+
+
+class TodoBuilder:
+    """Turns import records into validated, unsaved Todos, caching author lookups."""
+
+    def __init__(self, default_author=None):
+        self.default_author = default_author
+        self.author_ids = {}
+
+    def _author_id(self, username):
+        if username not in self.author_ids:
+            self.author_ids[username] = User.objects.filter(username=username).values_list('id', flat=True).first()
+        return self.author_ids[username]
+
+    def build(self, record):
+        """Returns a Todo for record, raising ValidationError if it is invalid."""
+        if not isinstance(record, dict):
+            raise ValidationError('Malformed record.')
+        if self.default_author is not None:
+            author_id = self.default_author.pk
+        else:
+            author_id = self._author_id(record.get('author'))
+            if author_id is None:
+                raise ValidationError({'author': ['Unknown user.']})
+
+        todo = Todo(
+            author_id=author_id,
+            title=record.get('title') or '',
+            description=record.get('description') or '',
+        )
+        if record.get('id'):
+            todo.id = record['id']
+        todo.clean_fields(exclude=('author', 'date'))
+
+        if record.get('date'):
+            try:
+                # None when malformed; ValueError for an impossible date and
+                # TypeError for a value that is not a string
+                todo.date = parse_datetime(record['date'])
+            except (ValueError, TypeError):
+                todo.date = None
+            if todo.date is None:
+                raise ValidationError({'date': ['Enter a valid date/time.']})
+        else:
+            todo.date = timezone.now()
+        return todo
+
+
+def _copy(todos, using):
+    # Stamped here as bulk_create's auto_now_add would, since COPY bypasses it
+    now = timezone.now().isoformat()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for todo in todos:
+        writer.writerow((
+            todo.id.hex, todo.author_id, todo.title, todo.description, todo.date.isoformat(), now,
+            todo.completed, todo.completed_at and todo.completed_at.isoformat(), todo.change_seq,
+        ))
+    buffer.seek(0)
+    columns = ', '.join(COPY_COLUMNS)
+    with connections[using].cursor() as cursor:
+        # COPY has no conflict handling, so stage rows in a temporary table
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE todo_import (LIKE {Todo._meta.db_table}) ON COMMIT DROP'
+        )
+        cursor.copy_expert(f'COPY todo_import ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+        cursor.execute(
+            f'INSERT INTO {Todo._meta.db_table} ({columns}) SELECT {columns} FROM todo_import '
+            f'ON CONFLICT (id) DO NOTHING'
+        )
+
+
+def insert_batch(todos, use_copy=False):
+    """Inserts a batch of Todos in one transaction per shard, via COPY when
+    use_copy is set.
+
+    Rows whose id already exists are skipped, so re-running a batch that was
+    committed just before a crash is harmless. Bulk inserts send no model
+    signals, so the cached lists of every author in the batch are
+    invalidated, their open streams told to resync and change numbers taken
+    here. Skipped rows leave the number actually inserted unknown, so the
+    caller resets the authors' stats with reset_stats() once every batch is
+    in; a stale row would make each later batch recount it to take numbers.
+    Returns the ids of the authors in the batch.
+    """
+    for using, shard_todos in group_by_shard(todos).items():
+        with numbering(using):
+            by_author = {}
+            for todo in shard_todos:
+                by_author.setdefault(todo.author_id, []).append(todo)
+            for author_id, author_todos in by_author.items():
+                last = adjust_stats(author_id, changes=len(author_todos))
+                for seq, todo in enumerate(author_todos, start=last - len(author_todos) + 1):
+                    todo.change_seq = seq
+            if use_copy:
+                _copy(shard_todos, using)
+            else:
+                Todo.objects.using(using).bulk_create(shard_todos, ignore_conflicts=True)
+    author_ids = {todo.author_id for todo in todos}
+    for author_id in author_ids:
+        bump_list_version(author_id)
+        publish(author_id, RESYNC)
+    return author_ids
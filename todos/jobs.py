@@ -0,0 +1,181 @@
+"""
+A small database-backed job queue for work that should not hold up a request.
+
+Tasks are plain functions registered with @task and queued with enqueue(),
+or periodically by the worker through schedule().
+manage.py run_worker claims due jobs and runs them in a thread or process
+pool. A failed job is retried with exponential backoff until max_attempts,
+then left as failed with its traceback. A running job's locked_at is
+refreshed as it runs, so only a job whose worker died goes stale; it is
+requeued as a failed attempt.
+
+Claiming uses SELECT ... FOR UPDATE SKIP LOCKED where the database supports
+it, so workers never wait on each other. Elsewhere (SQLite) a job is claimed
+by a conditional UPDATE, and only the worker whose UPDATE changed the row
+runs it.
+"""
+import importlib
+import json
+import random
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+_tasks = {}
+
+
+def task(func):
+    """Registers func as a task that can be queued by name."""
+    _tasks[f'{func.__module__}.{func.__name__}'] = func
+    return func
+
+
+def get_task(name):
+    if name not in _tasks:
+        # Importing the module registers its tasks
+        importlib.import_module(name.rpartition('.')[0])
+    return _tasks[name]
+
+
+def enqueue(func, *args, delay=0, max_attempts=3, **kwargs):
+    """Queues a call of a registered task, to run after delay seconds. Returns the Job.
+
+    Arguments must be JSON-serializable. Queued inside a transaction, the job
+    only becomes visible to workers once it commits.
+    """
+    name = f'{func.__module__}.{func.__name__}'
+    if _tasks.get(name) is not func:
+        raise ValueError(f'{name} is not a registered task.')
+    return Job.objects.create(
+        task=name,
+        arguments=json.dumps([args, kwargs]),
+        max_attempts=max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def schedule(periodic):
+    """Queues a run of each task in periodic, a map of task name to seconds
+    between runs, that has none queued or running, to start once its
+    interval has passed. Returns the jobs queued.
+
+    Each run so queues the next after it finishes. Checking and queueing are
+    separate queries, so two workers may both queue a run; scheduled tasks
+    must be safe to run twice.
+    """
+    queued = []
+    for name, interval in periodic.items():
+        if not Job.objects.filter(task=name, status__in=[Job.QUEUED, Job.RUNNING]).exists():
+            queued.append(enqueue(get_task(name), delay=interval))
+    return queued
+
+
+def backoff(attempts, base=10, cap=3600):
+    """Returns the seconds to wait before retrying after attempts failures, with jitter."""
+    return min(cap, base * 2 ** (attempts - 1)) * random.uniform(0.5, 1)
+
+
+def requeue_stale(timeout):
+    """Returns jobs left running for over timeout seconds, by a worker that died, to the queue.
+
+    The lost run counts as an attempt, since the job may be what killed the
+    worker; one that has used up max_attempts is failed instead. Returns the
+    number of jobs requeued or failed.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING, locked_at__lt=now - timedelta(seconds=timeout))
+    error = f'Worker stopped responding for over {timeout} seconds.'
+    with transaction.atomic():
+        failed = stale.filter(attempts__gte=F('max_attempts') - 1).update(
+            status=Job.FAILED, attempts=F('attempts') + 1, last_error=error,
+            finished_at=now, locked_at=None, locked_by='',
+        )
+        requeued = stale.update(
+            status=Job.QUEUED, attempts=F('attempts') + 1, last_error=error,
+            run_at=now, locked_at=None, locked_by='',
+        )
+    return failed + requeued
+
+
+@contextmanager
+def heartbeat(job_id, interval):
+    """Refreshes the running job's locked_at every interval seconds, from a
+    thread, so requeue_stale() leaves it alone however long it runs.
+    """
+    stopped = threading.Event()
+
+    def beat():
+        try:
+            while not stopped.wait(interval):
+                try:
+                    Job.objects.filter(pk=job_id, status=Job.RUNNING).update(locked_at=timezone.now())
+                except DatabaseError:
+                    # Try again on the next beat, e.g. while SQLite is locked
+                    pass
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=beat, name=f'job-{job_id}-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def claim(worker, limit):
+    """Marks up to limit due jobs as running by worker and returns them, oldest first."""
+    now = timezone.now()
+    due = Job.objects.filter(status=Job.QUEUED, run_at__lte=now).order_by('run_at')
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            jobs = list(due.select_for_update(skip_locked=True)[:limit])
+            Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                status=Job.RUNNING, locked_at=now, locked_by=worker
+            )
+        return jobs
+    jobs = []
+    for job in due[:limit]:
+        if Job.objects.filter(pk=job.pk, status=Job.QUEUED).update(
+            status=Job.RUNNING, locked_at=now, locked_by=worker
+        ):
+            jobs.append(job)
+    return jobs
+
+
+def run(job_id, heartbeat_interval=60):
+    """Runs a claimed job and records the outcome. Returns the job's new status.
+
+    Keep heartbeat_interval well below the stale timeout given to
+    requeue_stale().
+    """
+    job = Job.objects.get(pk=job_id)
+    job.attempts += 1
+    try:
+        args, kwargs = json.loads(job.arguments)
+        with heartbeat(job_id, heartbeat_interval):
+            get_task(job.task)(*args, **kwargs)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_at = timezone.now() + timedelta(seconds=backoff(job.attempts))
+        else:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+    else:
+        job.status = Job.DONE
+        job.finished_at = timezone.now()
+    job.locked_at, job.locked_by = None, ''
+    job.save(update_fields=[
+        'attempts', 'status', 'run_at', 'last_error', 'finished_at', 'locked_at', 'locked_by',
+    ])
+    return job.status
@@ -0,0 +1,70 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from todos.cache import bump_list_version
+from todos.events import RESYNC, publish
+from todos.models import ArchivedTodo, Todo, TodoShard, TodoTombstone
+from todos.stats import adjust_stats, numbering, removed_deltas
+
+ARCHIVED_FIELDS = ('id', 'author_id', 'title', 'description', 'date', 'completed_at')
+
+
+class Command(BaseCommand):
+    help = 'Moves todos completed more than --days ago into the archive table, in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Archive todos completed at least this many days ago.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Todos moved per transaction.')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        archived = sum(self.archive_shard(using, cutoff, options) for using in settings.TODO_SHARDS)
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} todos completed before {cutoff:%Y-%m-%d %H:%M}.'))
+
+    def archive_shard(self, using, cutoff, options):
+        # Uses the partial completed_at index, which holds completed rows only
+        candidates = Todo.objects.using(using).filter(
+            completed=True, completed_at__lt=cutoff
+        ).order_by('completed_at')
+
+        archived = 0
+        while True:
+            # Users being moved between shards are left for the next run
+            moving = list(TodoShard.objects.filter(moving=True).values_list('user_id', flat=True))
+            with numbering(using):
+                rows = list(
+                    candidates.exclude(author_id__in=moving).select_for_update()
+                    .values(*ARCHIVED_FIELDS, 'created_at')[:options['batch_size']]
+                )
+                if not rows:
+                    break
+                by_author = {}
+                for row in rows:
+                    by_author.setdefault(row['author_id'], []).append(row)
+                # Archived Todos leave tombstones, numbered before they go
+                tombstones = []
+                for author_id, removed in by_author.items():
+                    last = adjust_stats(
+                        author_id, changes=len(removed), **removed_deltas((row['created_at'], True) for row in removed)
+                    )
+                    for seq, row in enumerate(removed, start=last - len(removed) + 1):
+                        tombstones.append(TodoTombstone(todo_id=row['id'], author_id=author_id, seq=seq))
+                ArchivedTodo.objects.using(using).bulk_create(
+                    ArchivedTodo(**{field: row[field] for field in ARCHIVED_FIELDS}) for row in rows
+                )
+                # A raw DELETE skips the per-row collector and signals
+                Todo.objects.using(using).filter(id__in=[row['id'] for row in rows])._raw_delete(using)
+                TodoTombstone.objects.using(using).bulk_create(tombstones)
+            for author_id in by_author:
+                bump_list_version(author_id)
+                publish(author_id, RESYNC)
+            archived += len(rows)
+            self.stdout.write(f'Archived {archived} todos from {using}.')
+            if options['pause']:
+                time.sleep(options['pause'])
+        return archived
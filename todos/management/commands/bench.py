@@ -0,0 +1,158 @@
+import json
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+import urllib.parse
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from todos.benchmark import compare, drive_client, log_in, run_load, seed
+from todos.models import Todo
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def database_url(settings_dict):
+    """Builds a DATABASE_URL for the current (scratch) database."""
+    if connection.vendor == 'sqlite':
+        return f'sqlite:///{settings_dict["NAME"]}'
+    credentials = urllib.parse.quote(settings_dict['USER'] or '')
+    if settings_dict['PASSWORD']:
+        credentials += ':' + urllib.parse.quote(settings_dict['PASSWORD'])
+    host = settings_dict['HOST'] or 'localhost'
+    port = f':{settings_dict["PORT"]}' if settings_dict['PORT'] else ''
+    return f'postgres://{credentials}@{host}{port}/{settings_dict["NAME"]}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the todo pages against a scratch database: seeds users and '
+        'todos, drives every page through the test client and, with --http, '
+        'through a local gunicorn server. Saves JSON results and can compare '
+        'them against an earlier run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Users to seed.')
+        parser.add_argument('--todos', type=int, default=1000, help='Todos to seed per user.')
+        parser.add_argument('--requests', type=int, default=200, help='Test client requests per page.')
+        parser.add_argument('--http', action='store_true', help='Also load-test a local gunicorn server.')
+        parser.add_argument('--workers', type=int, default=2, help='Server worker processes for --http.')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent HTTP clients for --http.')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds of HTTP load for --http.')
+        parser.add_argument('--output', help='Write results as JSON to this file.')
+        parser.add_argument('--compare', help='Compare results against this earlier JSON output.')
+        parser.add_argument('--threshold', type=float, default=10,
+                            help='Percent change in a metric that counts as a regression.')
+
+    def handle(self, *args, **options):
+        if options['requests'] > options['users'] * options['todos']:
+            raise CommandError('--requests cannot exceed --users times --todos.')
+
+        tmp = tempfile.mkdtemp()
+        # A file rather than in-memory SQLite, so a server process can share it
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = (
+            os.path.join(tmp, 'bench.sqlite3') if connection.vendor == 'sqlite'
+            else connection.settings_dict.get('TEST', {}).get('NAME')
+        )
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = self.run_benchmarks(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(tmp)
+
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}.')
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            self.report_comparison(baseline, results, options['threshold'])
+
+    def run_benchmarks(self, options):
+        start = time.perf_counter()
+        users = seed(options['users'], options['todos'])
+        self.stdout.write(
+            f'Seeded {len(users)} users with {Todo.objects.count()} todos '
+            f'in {time.perf_counter() - start:.1f}s.'
+        )
+        results = {
+            'options': {key: options[key] for key in ('users', 'todos', 'requests')},
+            'client': drive_client(users, options['requests']),
+        }
+        if options['http']:
+            results['options'].update({key: options[key] for key in ('workers', 'concurrency', 'duration')})
+            results['http'] = self.run_http(users[0], options)
+        return results
+
+    def run_http(self, user, options):
+        port = free_port()
+        env = dict(os.environ, DATABASE_URL=database_url(connection.settings_dict), DEBUG='False')
+        server = subprocess.Popen(
+            ['gunicorn', 'todo_project.wsgi', '--workers', str(options['workers']), '--bind', f'127.0.0.1:{port}'],
+            cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            base_url = f'http://127.0.0.1:{port}'
+            self.wait_for(port)
+            cookie = log_in(base_url, user.username)
+            todo = Todo.objects.filter(author=user).values_list('id', flat=True).first()
+            pages = {
+                'list': '/todos/',
+                'detail': f'/todos/{todo}/',
+                'edit_form': f'/todos/{todo}/edit/',
+                'new_form': '/todos/new/',
+            }
+            results = {}
+            for name, path in pages.items():
+                results[name] = run_load(base_url, [path], cookie, options['concurrency'], options['duration'])
+            return results
+        finally:
+            server.terminate()
+            server.wait()
+
+    def wait_for(self, port, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise CommandError(f'Server on port {port} did not start.')
+
+    def report(self, results):
+        header = f'{"":<8}{"page":<12}{"requests":>9}{"errors":>8}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+        self.stdout.write(header + f'{"queries":>9}')
+        for section in ('client', 'http'):
+            for page, r in results.get(section, {}).items():
+                self.stdout.write(
+                    f'{section:<8}{page:<12}{r["requests"]:>9}{r["errors"]:>8}{r["rps"]:>9.1f}'
+                    f'{r["p50_ms"]:>9.2f}{r["p95_ms"]:>9.2f}{r["p99_ms"]:>9.2f}'
+                    + (f'{r["queries"]:>9.2f}' if 'queries' in r else '')
+                )
+
+    def report_comparison(self, baseline, results, threshold):
+        rows, regressions = compare(baseline, results, threshold)
+        for section, page, metric, old, new, change in rows:
+            line = f'{section:<8}{page:<12}{metric:<8}{old:>10}{new:>10}{change:>+9.1f}%'
+            self.stdout.write(self.style.ERROR(line) if (section, page, metric, old, new, change) in regressions
+                              else line)
+        if regressions:
+            raise CommandError(f'{len(regressions)} metric(s) regressed by more than {threshold}%.')
+        self.stdout.write(self.style.SUCCESS(f'No regressions beyond {threshold}%.'))
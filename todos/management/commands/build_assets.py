@@ -0,0 +1,51 @@
+import os
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import get_template
+
+from todos.assets import (CRITICAL_CSS, CRITICAL_TEMPLATES, build_bundles,
+                          critical_css, fetch_vendor, used_markup)
+
+
+class Command(BaseCommand):
+    help = (
+        'Vendors the CDN assets, bundles the CSS and JavaScript, and extracts the critical CSS '
+        'that base.html inlines. With --collect, also runs collectstatic, which writes hashed, '
+        'gzip and Brotli copies of every file.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--static-dir', default=settings.STATICFILES_DIRS[0],
+                            help='Source static directory to vendor into and write bundles to.')
+        parser.add_argument('--offline', action='store_true', help='Fail rather than download missing files.')
+        parser.add_argument('--collect', action='store_true', help='Run collectstatic afterwards.')
+
+    def handle(self, *args, **options):
+        static_dir = options['static_dir']
+        try:
+            fetch_vendor(static_dir, options['offline'], log=self.stdout.write)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        bundles = build_bundles(static_dir)
+        classes, elements = set(), set()
+        for name in CRITICAL_TEMPLATES:
+            template_classes, template_elements = used_markup(get_template(name).template.source)
+            classes |= template_classes
+            elements |= template_elements
+        css = ''.join(bundle for path, bundle in bundles.items() if path.endswith('.css'))
+        bundles[CRITICAL_CSS] = critical_css(css, classes, elements) + '\n'
+
+        for path, contents in bundles.items():
+            target = os.path.join(static_dir, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'w', encoding='utf-8') as f:
+                f.write(contents)
+            self.stdout.write(f'Wrote {path} ({len(contents.encode()) / 1024:.1f} KiB).')
+
+        if options['collect']:
+            call_command('collectstatic', interactive=False, verbosity=0)
+            self.stdout.write('Collected static files.')
+        self.stdout.write(self.style.SUCCESS('Assets built.'))
@@ -0,0 +1,42 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from todos.export import FORMATS, gzip_stream, stream_todos
+from todos.models import Todo
+
+
+class Command(BaseCommand):
+    help = 'Streams todos as NDJSON or CSV, optionally gzip-compressed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only export todos belonging to this username.')
+        parser.add_argument('--format', choices=FORMATS, default='ndjson', dest='export_format')
+        parser.add_argument('--gzip', action='store_true', help='Gzip-compress the output.')
+        parser.add_argument('--output', help='File to write to. Defaults to stdout.')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per database round trip.')
+
+    def handle(self, *args, **options):
+        queryset = Todo.objects.all()
+        if options['user']:
+            author = User.objects.filter(username=options['user']).first()
+            queryset = Todo.objects.for_author(author) if author else Todo.objects.none()
+            if not queryset.exists():
+                raise CommandError(f'No todos found for user "{options["user"]}".')
+
+        chunks = stream_todos(queryset, options['export_format'], options['chunk_size'])
+        if options['gzip']:
+            chunks = gzip_stream(chunks)
+        else:
+            chunks = (chunk.encode() for chunk in chunks)
+
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+        finally:
+            if options['output']:
+                output.close()
+            else:
+                output.flush()
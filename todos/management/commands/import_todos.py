@@ -0,0 +1,102 @@
+import os
+import time
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from todos.export import FORMATS
+from todos.importer import TodoBuilder, insert_batch, open_source, read_records
+from todos.jobs import enqueue
+from todos.stats import reset_stats
+from todos.tasks import recount_user_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk-loads todos from an NDJSON or CSV file (optionally .gz) in batched '
+        'transactions, resuming from a checkpoint file if one exists.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, as written by export_todos.')
+        parser.add_argument('--format', choices=FORMATS, dest='import_format',
+                            help='Input format. Guessed from the file extension by default.')
+        parser.add_argument('--user', help='Assign every todo to this username instead of each row\'s author.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows inserted per transaction.')
+        parser.add_argument('--checkpoint', help='Checkpoint file. Defaults to <path>.checkpoint.')
+        parser.add_argument('--no-copy', action='store_true', help='Use bulk_create even on PostgreSQL.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        import_format = options['import_format'] or ('csv' if '.csv' in path else 'ndjson')
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        use_copy = connection.vendor == 'postgresql' and not options['no_copy']
+
+        default_author = None
+        if options['user']:
+            try:
+                default_author = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f'User "{options["user"]}" does not exist.')
+        builder = TodoBuilder(default_author)
+
+        # Records before the checkpoint were committed by an earlier run
+        done = 0
+        if os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                done = int(f.read())
+            self.stdout.write(f'Resuming after record {done}.')
+
+        imported = skipped = 0
+        authors = set()
+        start = time.perf_counter()
+        try:
+            with open_source(path) as stream:
+                records = enumerate(read_records(stream, import_format), start=1)
+                records = islice(records, done, None)
+                while True:
+                    chunk = list(islice(records, options['batch_size']))
+                    if not chunk:
+                        break
+                    batch = []
+                    for number, record in chunk:
+                        try:
+                            batch.append(builder.build(record))
+                        except ValidationError as e:
+                            skipped += 1
+                            self.stderr.write(f'Record {number} skipped: {"; ".join(e.messages)}')
+                    if batch:
+                        authors |= insert_batch(batch, use_copy)
+                    imported += len(batch)
+                    done = chunk[-1][0]
+                    self._save_checkpoint(checkpoint, done)
+
+                    elapsed = time.perf_counter() - start
+                    self.stdout.write(
+                        f'{done} records read, {imported} imported ({imported / elapsed:,.0f} rows/sec)'
+                    )
+        finally:
+            # Once, not per batch, since numbering a later batch would recount a stale row;
+            # also after a failure, so the batches already committed are counted on next read
+            reset_stats(authors)
+
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        # Rebuild the reset stats in the background, not on each author's next page view
+        for author_id in authors:
+            enqueue(recount_user_stats, author_id)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} todos, skipped {skipped}, in {elapsed:.1f}s '
+            f'({imported / elapsed if elapsed else 0:,.0f} rows/sec).'
+        ))
+
+    def _save_checkpoint(self, checkpoint, done):
+        # Written atomically so a crash never leaves a truncated checkpoint
+        tmp = f'{checkpoint}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(str(done))
+        os.replace(tmp, checkpoint)
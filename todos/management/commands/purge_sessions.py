@@ -0,0 +1,41 @@
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+DB_ENGINES = ('django.contrib.sessions.backends.db', 'django.contrib.sessions.backends.cached_db')
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes expired sessions in small batches, like clearsessions without one long DELETE. '
+        'With --every, keeps running and purges on that interval.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Sessions deleted per statement.')
+        parser.add_argument('--every', type=float, help='Seconds between purges; runs once if omitted.')
+
+    def handle(self, *args, **options):
+        while True:
+            purged = self.purge(options['batch_size'])
+            self.stdout.write(f'Purged {purged} expired sessions.')
+            if not options['every']:
+                break
+            time.sleep(options['every'])
+
+    def purge(self, batch_size):
+        if settings.SESSION_ENGINE not in DB_ENGINES:
+            # Cookie sessions have nothing stored; cache sessions expire by themselves
+            import_module(settings.SESSION_ENGINE).SessionStore.clear_expired()
+            return 0
+        purged = 0
+        expired = Session.objects.filter(expire_date__lt=timezone.now())
+        while True:
+            keys = list(expired.values_list('session_key', flat=True)[:batch_size])
+            if not keys:
+                return purged
+            purged += Session.objects.filter(session_key__in=keys)._raw_delete(Session.objects.db)
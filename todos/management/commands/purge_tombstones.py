@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from todos.models import TodoStats, TodoTombstone
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes tombstones of todos deleted more than --days ago, in batches. '
+        'Clients that last synced before a purged tombstone get a full copy instead.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Purge tombstones at least this many days old.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Tombstones deleted per statement.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        purged = sum(self.purge_shard(using, cutoff, options['batch_size']) for using in settings.TODO_SHARDS)
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} tombstones from before {cutoff:%Y-%m-%d %H:%M}.'))
+
+    def purge_shard(self, using, cutoff, batch_size):
+        expired = TodoTombstone.objects.using(using).filter(deleted_at__lt=cutoff).order_by('deleted_at')
+        purged = 0
+        while True:
+            rows = list(expired.values_list('pk', 'author_id', 'seq')[:batch_size])
+            if not rows:
+                return purged
+            floors = {}
+            for _, author_id, seq in rows:
+                floors[author_id] = max(seq, floors.get(author_id, 0))
+            # Raised before the tombstones go, so no cursor can skip past them unseen
+            for author_id, seq in floors.items():
+                TodoStats.objects.filter(user_id=author_id, sync_floor__lt=seq).update(sync_floor=seq)
+            TodoTombstone.objects.using(using).filter(pk__in=[row[0] for row in rows])._raw_delete(using)
+            purged += len(rows)
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from todos.sharding import (home_shard, is_sharded, move_authors,
+                            shard_for_author)
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves users' todos to the shard the hash ring assigns them, or with --to, "
+        'to a given shard. Users keep working while their todos are copied; their '
+        'writes are refused only while they switch over.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='Users to move; all users by default.')
+        parser.add_argument('--to', dest='target', help='Shard to move the users to, instead of their ring shard.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows copied per query.')
+        parser.add_argument('--group-size', type=int, default=100,
+                            help='Users moved together, sharing one wait for cached placements.')
+        parser.add_argument('--settle', type=float,
+                            help='Seconds to wait for cached placements to expire. '
+                                 'Defaults to TODO_SHARD_CACHE_TIMEOUT.')
+        parser.add_argument('--dry-run', action='store_true', help='Only report the users that would move.')
+
+    def handle(self, *args, **options):
+        if not is_sharded():
+            raise CommandError('Only one shard is configured; set DATABASE_SHARD_URLS.')
+        if options['target'] and options['target'] not in settings.TODO_SHARDS:
+            raise CommandError(f'Unknown shard "{options["target"]}". Shards: {", ".join(settings.TODO_SHARDS)}.')
+
+        users = User.objects.order_by('pk')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        moved, group = 0, {}
+        for user_id, username in list(users.values_list('pk', 'username')):
+            source = shard_for_author(user_id)
+            target = options['target'] or home_shard(user_id)
+            if source == target:
+                continue
+            self.stdout.write(f'{username}: {source} -> {target}')
+            group[user_id] = target
+            if len(group) >= options['group_size']:
+                moved += self.move(group, options)
+                group = {}
+        moved += self.move(group, options)
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {moved} users.'))
+
+    def move(self, group, options):
+        if options['dry_run'] or not group:
+            return len(group)
+        return len(move_authors(group, options['batch_size'], options['settle']))
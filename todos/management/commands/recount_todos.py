@@ -0,0 +1,34 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from todos.cache import bump_list_version
+from todos.models import TodoStats
+from todos.stats import recount_stats
+
+COUNTERS = ('total', 'uncompleted', 'created_today')
+
+
+class Command(BaseCommand):
+    help = "Rebuilds users' Todo stats counters from the Todo table, reporting any that had drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='Users to recount; all users by default.')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        recounted = drifted = 0
+        for user in users.iterator():
+            before = TodoStats.objects.filter(user=user).values(*COUNTERS, 'day').first()
+            after = recount_stats(user.pk)
+            recounted += 1
+            if before and any(before[field] != getattr(after, field) for field in COUNTERS + ('day',)):
+                drifted += 1
+                self.stdout.write(f'{user.username}: ' + ', '.join(
+                    f'{field} {before[field]} -> {getattr(after, field)}' for field in COUNTERS
+                ))
+                # The count banner is cached inside the rendered list
+                bump_list_version(user.pk)
+        self.stdout.write(self.style.SUCCESS(f'Recounted {recounted} users, {drifted} had drifted.'))
@@ -0,0 +1,106 @@
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                ThreadPoolExecutor, wait)
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+
+from todos.jobs import claim, requeue_stale, run, schedule
+
+# Seconds between checks that each JOB_SCHEDULE task has a run queued
+SCHEDULE_INTERVAL = 60
+
+
+def execute(job_id, heartbeat_interval):
+    try:
+        return run(job_id, heartbeat_interval)
+    finally:
+        # Pool threads and processes each hold their own connections
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs queued background jobs in a thread or process pool until stopped. '
+        'SIGTERM or SIGINT stops claiming jobs and waits for running ones to finish.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pool', choices=['thread', 'process', 'inline'], default='thread',
+                            help='Run jobs in threads, forked processes or this process, one at a time.')
+        parser.add_argument('--concurrency', type=int, default=4, help='Jobs run at once.')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between polls when idle.')
+        parser.add_argument('--stale-after', type=int, default=3600,
+                            help='Requeue jobs left running this many seconds, by a worker that died. '
+                                 'Running jobs refresh their lock at a quarter of this.')
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is due.')
+        parser.add_argument('--no-schedule', action='store_false', dest='schedule',
+                            help='Do not queue the periodic tasks in JOB_SCHEDULE.')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        previous = {signum: signal.signal(signum, self.stop) for signum in (signal.SIGTERM, signal.SIGINT)}
+
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        heartbeat_interval = options['stale_after'] / 4
+        concurrency = 1 if options['pool'] == 'inline' else options['concurrency']
+        if connection.vendor == 'sqlite' and concurrency > 1:
+            # Concurrent write transactions fail with "database is locked"
+            self.stderr.write('SQLite allows one writer at a time; running one job at a time.')
+            concurrency = 1
+        if options['pool'] == 'process':
+            # Children must not share the parent's open database connections
+            connections.close_all()
+            executor = ProcessPoolExecutor(concurrency, mp_context=multiprocessing.get_context('fork'))
+        elif options['pool'] == 'thread':
+            executor = ThreadPoolExecutor(concurrency)
+        else:
+            executor = None
+
+        self.stdout.write(f'Worker {worker} started with {concurrency} {options["pool"]} slot(s).')
+        finished = {}
+        running = set()
+        next_schedule = 0
+        try:
+            while not self.stopping:
+                if options['schedule'] and time.monotonic() >= next_schedule:
+                    schedule(settings.JOB_SCHEDULE)
+                    next_schedule = time.monotonic() + SCHEDULE_INTERVAL
+                requeue_stale(options['stale_after'])
+                free = concurrency - len(running)
+                jobs = claim(worker, free) if free else []
+                for job in jobs:
+                    if executor is None:
+                        status = run(job.pk, heartbeat_interval)
+                        finished[status] = finished.get(status, 0) + 1
+                    else:
+                        running.add(executor.submit(execute, job.pk, heartbeat_interval))
+                if options['burst'] and not jobs and not running:
+                    break
+                if running:
+                    # Block while every slot is busy; otherwise poll again soon
+                    if len(running) >= concurrency:
+                        timeout = None
+                    else:
+                        timeout = 0 if jobs else options['poll_interval']
+                    done, running = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        finished[future.result()] = finished.get(future.result(), 0) + 1
+                elif not jobs:
+                    time.sleep(options['poll_interval'])
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+        self.stdout.write(f'Worker {worker} stopped: ' + (
+            ', '.join(f'{count} {status}' for status, count in sorted(finished.items())) or 'no jobs run'
+        ) + '.')
+
+    def stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,17 @@
+# Generated by Django 3.0.4 on 2026-10-18 17:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(fields=['author', '-date', '-id'], name='todo_author_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.0.4 on 2026-10-18 17:44
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0002_todo_author_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='todo',
+            name='description',
+            field=models.TextField(blank=True, max_length=200, validators=[django.core.validators.MaxLengthValidator(200)]),
+        ),
+    ]
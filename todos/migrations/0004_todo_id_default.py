@@ -0,0 +1,25 @@
+# Generated by Django 3.0.4 on 2026-10-18 17:44
+
+from django.db import migrations, models
+import todos.ids
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0003_todo_description_max_length'),
+    ]
+
+    operations = [
+        # The default is applied in Python, so only the migration state changes.
+        # Left to AlterField alone, SQLite would rebuild the whole table.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='todo',
+                    name='id',
+                    field=models.UUIDField(default=todos.ids.generate_todo_id, editable=False, primary_key=True, serialize=False),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def install(apps, schema_editor):
+    from todos.search import install_search_index
+    install_search_index(schema_editor.connection, populate=True)
+
+
+def uninstall(apps, schema_editor):
+    from todos.search import uninstall_search_index
+    uninstall_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0004_todo_id_default'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 3.0.4 on 2026-10-18 17:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('todos', '0005_todo_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTodo',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=80)),
+                ('description', models.TextField(blank=True)),
+                ('date', models.DateTimeField()),
+                ('completed_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='todo',
+            name='todo_author_date_id_idx',
+        ),
+        migrations.AddField(
+            model_name='todo',
+            name='completed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='todo',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(condition=models.Q(completed=False), fields=['author', '-date', '-id'], name='todo_active_author_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(condition=models.Q(completed=True), fields=['author', '-completed_at'], name='todo_completed_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(condition=models.Q(completed=True), fields=['completed_at'], name='todo_completed_at_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedtodo',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtodo',
+            index=models.Index(fields=['author', '-completed_at'], name='archived_author_completed_idx'),
+        ),
+    ]
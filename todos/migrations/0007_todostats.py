@@ -0,0 +1,27 @@
+# Generated by Django 3.0.4 on 2026-10-18 17:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('todos', '0006_todo_completed_archivedtodo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TodoStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='todo_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('uncompleted', models.PositiveIntegerField(default=0)),
+                ('created_today', models.PositiveIntegerField(default=0)),
+                ('day', models.DateField()),
+                ('last_activity', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
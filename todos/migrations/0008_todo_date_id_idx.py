@@ -0,0 +1,17 @@
+# Generated by Django 3.0.4 on 2026-10-18 18:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0007_todostats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(fields=['-date', '-id'], name='todo_date_id_idx'),
+        ),
+    ]
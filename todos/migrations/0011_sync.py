@@ -0,0 +1,84 @@
+# Generated by Django 3.0.4 on 2026-10-18 18:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+def number_changes(apps, schema_editor):
+    # Numbers each author's existing Todos in date order, and marks their stats
+    # stale so the change sequence resumes after them on first use
+    using = schema_editor.connection.alias
+    Todo = apps.get_model('todos', 'Todo')
+    TodoStats = apps.get_model('todos', 'TodoStats')
+    author_id, seq, batch = None, 0, []
+    for todo in Todo.objects.using(using).order_by('author_id', 'date', 'id').only('id', 'author_id').iterator():
+        if todo.author_id != author_id:
+            author_id, seq = todo.author_id, 0
+        seq += 1
+        todo.change_seq = seq
+        batch.append(todo)
+        if len(batch) >= 1000:
+            Todo.objects.using(using).bulk_update(batch, ['change_seq'])
+            batch = []
+    Todo.objects.using(using).bulk_update(batch, ['change_seq'])
+    TodoStats.objects.using(using).update(stale=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('todos', '0010_todoshard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TodoTombstone',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('todo_id', models.UUIDField()),
+                ('seq', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='todo',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='todostats',
+            name='change_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='todostats',
+            name='stale',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='todostats',
+            name='sync_floor',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(fields=['author', 'change_seq'], name='todo_author_change_seq_idx'),
+        ),
+        migrations.AddField(
+            model_name='todotombstone',
+            name='author',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='todotombstone',
+            index=models.Index(fields=['author', 'seq'], name='tombstone_author_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='todotombstone',
+            index=models.Index(fields=['deleted_at'], name='tombstone_deleted_at_idx'),
+        ),
+        migrations.RunPython(number_changes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.0.4 on 2026-10-18 19:40
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def copy_dates(apps, schema_editor):
+    # Edits have moved date forward since, but it is the best record there is
+    Todo = apps.get_model('todos', 'Todo')
+    Todo.objects.using(schema_editor.connection.alias).update(created_at=F('date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0011_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='todo',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_dates, migrations.RunPython.noop),
+    ]
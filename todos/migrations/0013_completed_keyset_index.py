@@ -0,0 +1,21 @@
+# Generated by Django 3.0.4 on 2026-10-18 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0012_todo_created_at'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='todo',
+            name='todo_completed_author_idx',
+        ),
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(condition=models.Q(completed=True), fields=['author', '-completed_at', '-id'], name='todo_completed_author_idx'),
+        ),
+    ]
@@ -1,20 +1,194 @@
 import uuid
 
 from django.contrib.auth.models import User
-from django.db import models
+from django.core.validators import MaxLengthValidator
+from django.db import models, router
 from django.urls import reverse
+from django.utils import timezone
+
+from .ids import generate_todo_id
+from .sharding import ShardedQuerySet
 
 
 class Todo(models.Model):
     """Models a single task belonging to a user."""
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    author = models.ForeignKey(User, on_delete=models.CASCADE)
+    id = models.UUIDField(primary_key=True, default=generate_todo_id, editable=False)
+    # Unconstrained, since a shard other than the primary holds no users
+    author = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
     title = models.CharField(max_length=80)
-    description = models.TextField(max_length=200, blank=True)
+    # TextField's max_length is only enforced by forms, so validate it explicitly
+    description = models.TextField(max_length=200, blank=True, validators=[MaxLengthValidator(200)])
+    # Set on creation and again on every edit
     date = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed = models.BooleanField(default=False)
+    completed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Number of the last change from the author's change sequence; see todos.sync
+    change_seq = models.BigIntegerField(default=0, editable=False)
+
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Serves delta sync, which reads a user's Todos changed after a cursor
+            models.Index(fields=['author', 'change_seq'], name='todo_author_change_seq_idx'),
+            # Serves the per-user active list in (-date, -id) keyset order,
+            # holding only uncompleted rows so it stays small as accounts age
+            models.Index(
+                fields=['author', '-date', '-id'], name='todo_active_author_date_idx',
+                condition=models.Q(completed=False),
+            ),
+            # Serves each user's completed list in (-completed_at, -id) keyset
+            # order, and the archival scan
+            models.Index(
+                fields=['author', '-completed_at', '-id'], name='todo_completed_author_idx',
+                condition=models.Q(completed=True),
+            ),
+            models.Index(
+                fields=['completed_at'], name='todo_completed_at_idx',
+                condition=models.Q(completed=True),
+            ),
+            # Serves the admin changelist's ordering and date hierarchy
+            models.Index(fields=['-date', '-id'], name='todo_date_id_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
     def get_absolute_url(self):
         return reverse('todo_detail', kwargs={'pk': self.id})
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The stored completion, which the stats signals compare each save
+        # against; None when the field was deferred
+        instance._stored_completed = instance.__dict__.get('completed')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # The pre_save signal stamps change_seq, so partial saves write it too
+        if kwargs.get('update_fields'):
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'change_seq'}
+        with self._numbering(kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with self._numbering(kwargs.get('using')):
+            return super().delete(*args, **kwargs)
+
+    def _numbering(self, using):
+        from .stats import numbering
+
+        return numbering(using or router.db_for_write(Todo, instance=self), savepoint=False)
+
+    def complete(self):
+        """Marks the Todo completed now, if it is not already."""
+        if not self.completed:
+            self.completed = True
+            self.completed_at = timezone.now()
+            self.save(update_fields=['completed', 'completed_at'])
+
+
+class ArchivedTodo(models.Model):
+    """Models a completed Todo moved out of the active table by archive_todos."""
+    id = models.UUIDField(primary_key=True, editable=False)
+    author = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
+    title = models.CharField(max_length=80)
+    description = models.TextField(blank=True)
+    date = models.DateTimeField()
+    completed_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['author', '-completed_at'], name='archived_author_completed_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class TodoTombstone(models.Model):
+    """Models a deleted or archived Todo, kept so syncing clients learn it is gone."""
+    # Random, so tombstones copied between shards never collide
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    todo_id = models.UUIDField()
+    author = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
+    # Number of the deletion from the author's change sequence
+    seq = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['author', 'seq'], name='tombstone_author_seq_idx'),
+            # Serves manage.py purge_tombstones
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_at_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.todo_id} deleted'
+
+
+class TodoStats(models.Model):
+    """Models a user's denormalized Todo counters, kept current by todos.stats."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='todo_stats')
+    total = models.PositiveIntegerField(default=0)
+    uncompleted = models.PositiveIntegerField(default=0)
+    created_today = models.PositiveIntegerField(default=0)
+    # The local day created_today counts; a later day means it is zero
+    day = models.DateField()
+    last_activity = models.DateTimeField(null=True, blank=True)
+    # Last number taken from the user's change sequence; see todos.sync
+    change_seq = models.BigIntegerField(default=0)
+    # Highest number of a purged tombstone; older sync cursors need a full copy
+    sync_floor = models.BigIntegerField(default=0)
+    # Set when the counters are known to be wrong, so the next read recounts
+    stale = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f'{self.user} stats'
+
+
+class TodoShard(models.Model):
+    """Models the shard holding a user's Todos; see todos.sharding."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='todo_shard')
+    shard = models.CharField(max_length=100)
+    # Set while move_author copies the user's Todos, refusing their writes
+    moving = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f'{self.user} on {self.shard}'
+
+
+class Job(models.Model):
+    """Models a queued call of a background task, run by manage.py run_worker."""
+    QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    task = models.CharField(max_length=200)
+    # JSON-encoded [args, kwargs]
+    arguments = models.TextField(default='[[], {}]')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Serves the worker's claim query over due jobs, and nothing else
+            models.Index(fields=['run_at'], name='job_queued_run_at_idx', condition=models.Q(status='queued')),
+            models.Index(fields=['locked_at'], name='job_running_locked_at_idx', condition=models.Q(status='running')),
+        ]
+
+    def __str__(self):
+        return f'{self.task} ({self.status})'
@@ -0,0 +1,175 @@
+"""
+Full-text search over Todo titles and descriptions.
+
+The search index lives outside the Todo model so list queries never load it:
+
+    PostgreSQL  A weighted tsvector column on todos_todo with a GIN index,
+                maintained by a BEFORE INSERT/UPDATE trigger.
+    SQLite      An FTS5 table holding each Todo's id, author and text,
+                maintained by AFTER INSERT/UPDATE/DELETE triggers.
+
+Because triggers maintain the index, bulk_create, COPY and raw deletes keep
+it in sync too. Other databases fall back to an unindexed icontains scan.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Todo
+
+TABLE = Todo._meta.db_table
+FTS_TABLE = f'{TABLE}_fts'
+COLUMNS = ('id', 'author_id', 'title', 'description', 'date', 'completed', 'completed_at')
+
+POSTGRESQL_VECTOR = (
+    "setweight(to_tsvector('english', coalesce({row}title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce({row}description, '')), 'B')"
+)
+POSTGRESQL_INSTALL = [
+    f'ALTER TABLE {TABLE} ADD COLUMN IF NOT EXISTS search_vector tsvector',
+    f'''
+    CREATE OR REPLACE FUNCTION {TABLE}_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := {POSTGRESQL_VECTOR.format(row='NEW.')};
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    ''',
+    f'DROP TRIGGER IF EXISTS {TABLE}_search_vector ON {TABLE}',
+    f'''
+    CREATE TRIGGER {TABLE}_search_vector BEFORE INSERT OR UPDATE OF title, description ON {TABLE}
+    FOR EACH ROW EXECUTE PROCEDURE {TABLE}_search_vector()
+    ''',
+    f'CREATE INDEX IF NOT EXISTS {TABLE}_search_vector_idx ON {TABLE} USING gin (search_vector)',
+]
+POSTGRESQL_POPULATE = f"UPDATE {TABLE} SET search_vector = {POSTGRESQL_VECTOR.format(row='')}"
+POSTGRESQL_UNINSTALL = [
+    f'DROP TRIGGER IF EXISTS {TABLE}_search_vector ON {TABLE}',
+    f'DROP FUNCTION IF EXISTS {TABLE}_search_vector()',
+    f'ALTER TABLE {TABLE} DROP COLUMN IF EXISTS search_vector',
+]
+
+# todo_id is indexed so the triggers find a row's entry by token lookup
+# rather than a scan; author_id is indexed so a user's search never leaves
+# their own postings.
+SQLITE_DELETE_ENTRY = (
+    f"DELETE FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH 'todo_id:' || old.id AND todo_id = old.id;"
+)
+SQLITE_INSERT_ENTRY = (
+    f'INSERT INTO {FTS_TABLE} (todo_id, author_id, title, description) '
+    f'VALUES (new.id, new.author_id, new.title, new.description);'
+)
+SQLITE_INSTALL = [
+    f'''
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE}
+    USING fts5(todo_id, author_id, title, description, tokenize='porter unicode61')
+    ''',
+    f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON {TABLE} BEGIN {SQLITE_INSERT_ENTRY} END',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF author_id, title, description ON {TABLE}
+    BEGIN {SQLITE_DELETE_ENTRY} {SQLITE_INSERT_ENTRY} END
+    ''',
+    f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON {TABLE} BEGIN {SQLITE_DELETE_ENTRY} END',
+]
+SQLITE_POPULATE = (
+    f'INSERT INTO {FTS_TABLE} (todo_id, author_id, title, description) '
+    f'SELECT id, author_id, title, description FROM {TABLE}'
+)
+SQLITE_UNINSTALL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_update',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_delete',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+INSTALL = {'postgresql': POSTGRESQL_INSTALL, 'sqlite': SQLITE_INSTALL}
+POPULATE = {'postgresql': POSTGRESQL_POPULATE, 'sqlite': SQLITE_POPULATE}
+UNINSTALL = {'postgresql': POSTGRESQL_UNINSTALL, 'sqlite': SQLITE_UNINSTALL}
+
+
+def install_search_index(using=connection, populate=False):
+    """Creates the search index and its triggers if missing.
+
+    Idempotent. Also run after every migrate, since SQLite drops a table's
+    triggers whenever a migration rebuilds it.
+    """
+    with using.cursor() as cursor:
+        for statement in INSTALL.get(using.vendor, []):
+            cursor.execute(statement)
+        if populate and using.vendor in POPULATE:
+            cursor.execute(POPULATE[using.vendor])
+
+
+def uninstall_search_index(using=connection):
+    with using.cursor() as cursor:
+        for statement in UNINSTALL.get(using.vendor, []):
+            cursor.execute(statement)
+
+
+def _terms(query):
+    return re.findall(r'\w+', query)
+
+
+def _quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def search_todos(user, query, page=1, page_size=20):
+    """Returns one page of a user's uncompleted Todos matching query, best match
+    first, and whether another page follows.
+    """
+    terms = _terms(query)
+    if not terms:
+        return [], False
+    limit, offset = page_size + 1, (page - 1) * page_size
+    # The user's shard, or wherever the router sends their reads
+    manager = Todo.objects.db_manager(Todo.objects.for_author(user).db)
+
+    if connection.vendor == 'postgresql':
+        todos = manager.raw(
+            f'SELECT {", ".join(COLUMNS)} FROM {TABLE}, plainto_tsquery(\'english\', %s) query '
+            f'WHERE author_id = %s AND NOT completed AND search_vector @@ query '
+            f'ORDER BY ts_rank(search_vector, query) DESC, date DESC, id DESC LIMIT %s OFFSET %s',
+            [' '.join(terms), user.pk, limit, offset],
+        )
+    elif connection.vendor == 'sqlite':
+        match = f'author_id:{user.pk} AND {{title description}}: ({" ".join(map(_quote, terms))})'
+        todos = manager.raw(
+            f'SELECT {", ".join(f"t.{column}" for column in COLUMNS)} FROM {FTS_TABLE} f '
+            f'JOIN {TABLE} t ON t.id = f.todo_id '
+            f'WHERE {FTS_TABLE} MATCH %s AND NOT t.completed '
+            f'ORDER BY bm25({FTS_TABLE}, 0, 0, 2.0, 1.0), t.date DESC, t.id DESC LIMIT %s OFFSET %s',
+            [match, limit, offset],
+        )
+    else:
+        condition = Q()
+        for term in terms:
+            condition &= Q(title__icontains=term) | Q(description__icontains=term)
+        todos = Todo.objects.for_author(user).filter(
+            condition, completed=False
+        ).order_by('-date', '-id')[offset:offset + limit]
+
+    todos = list(todos)
+    return todos[:page_size], len(todos) > page_size
+
+
+def search_filter(query):
+    """Returns a Q matching Todos of any author whose text matches query, through
+    the search index where there is one. For admin-wide searches.
+    """
+    terms = _terms(query)
+    if not terms:
+        return Q(pk__in=[])
+    if connection.vendor == 'postgresql':
+        return Q(id__in=RawSQL(
+            f"SELECT id FROM {TABLE} WHERE search_vector @@ plainto_tsquery('english', %s)", [' '.join(terms)]
+        ))
+    if connection.vendor == 'sqlite':
+        match = f'{{title description}}: ({" ".join(map(_quote, terms))})'
+        return Q(id__in=RawSQL(f'SELECT todo_id FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match]))
+    condition = Q()
+    for term in terms:
+        condition &= Q(title__icontains=term) | Q(description__icontains=term)
+    return condition
@@ -0,0 +1,423 @@
+"""
+Horizontal sharding of Todo rows by author.
+
+settings.TODO_SHARDS lists the databases holding Todos. The first is always
+the primary, which also holds every other table. A user's Todos, archived
+Todos and tombstones live together on one shard, recorded in the TodoShard
+table:
+
+    placement   New users are placed on the shard a consistent hash ring picks
+                for their id. Users without a TodoShard row, such as everyone
+                from before sharding was enabled, live on the primary.
+    routing     Todo.objects.for_author() and the router in todo_project.routers
+                send author-scoped queries and saves to the author's shard.
+                Every other Todo query is scatter-gathered: run on each shard
+                and merged in the query's ordering.
+    moving      move_author() copies a user's rows to another shard while they
+                keep working, then freezes their writes briefly to catch up and
+                switch over. manage.py rebalance_shards moves every user whose
+                shard differs from the ring's choice, e.g. after adding a shard.
+
+Placements are cached for TODO_SHARD_CACHE_TIMEOUT seconds. With a single
+shard none of this costs a query.
+"""
+import bisect
+import hashlib
+import heapq
+import itertools
+import time
+from functools import cmp_to_key, lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import (DEFAULT_DB_ALIAS, NotSupportedError, connections,
+                       models, transaction)
+from django.db.models.query import (FlatValuesListIterable, ModelIterable,
+                                    ValuesIterable)
+
+from .cache import bump_list_version
+
+
+class ShardMoving(Exception):
+    """Raised on a write to a user whose Todos are being moved between shards."""
+
+
+def is_sharded():
+    return len(settings.TODO_SHARDS) > 1
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(str(value).encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """Maps keys to shards so that adding or removing a shard only moves the
+    keys nearest to its points on the ring, about 1/N of them.
+    """
+
+    def __init__(self, shards, points=100):
+        ring = sorted((_hash(f'{shard}:{n}'), shard) for shard in shards for n in range(points))
+        self.hashes = [point for point, _ in ring]
+        self.shards = [shard for _, shard in ring]
+
+    def shard(self, key):
+        return self.shards[bisect.bisect(self.hashes, _hash(key)) % len(self.hashes)]
+
+
+@lru_cache(maxsize=None)
+def _ring(shards):
+    return HashRing(shards)
+
+
+def home_shard(author_id):
+    """Returns the shard the hash ring assigns to an author."""
+    return _ring(tuple(settings.TODO_SHARDS)).shard(author_id)
+
+
+def _placement_key(author_id):
+    return f'todos:shard:{author_id}'
+
+
+def shard_for_author(author_id, write=False):
+    """Returns the alias of the database holding an author's Todos.
+
+    Raises ShardMoving for a write while the author is being moved.
+    """
+    if not is_sharded():
+        return settings.TODO_SHARDS[0]
+    placement = cache.get(_placement_key(author_id))
+    if placement is None:
+        from .models import TodoShard
+
+        placement = TodoShard.objects.using(DEFAULT_DB_ALIAS).filter(user_id=author_id).values_list(
+            'shard', 'moving'
+        ).first() or (DEFAULT_DB_ALIAS, False)
+        cache.set(_placement_key(author_id), placement, settings.TODO_SHARD_CACHE_TIMEOUT)
+    shard, moving = placement
+    if write and moving:
+        raise ShardMoving(f'Todos of user {author_id} are moving from shard {shard}.')
+    return shard
+
+
+def place_author(author_id, shard, moving=False):
+    """Records an author's shard and drops this process's cached placement."""
+    from .models import TodoShard
+
+    TodoShard.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+        user_id=author_id, defaults={'shard': shard, 'moving': moving}
+    )
+    cache.delete(_placement_key(author_id))
+
+
+def group_by_shard(objs):
+    """Groups objects with an author_id by the shard they are written to."""
+    groups = {}
+    for obj in objs:
+        groups.setdefault(shard_for_author(obj.author_id, write=True), []).append(obj)
+    return groups
+
+
+def _compare(a, b):
+    for x, y, descending in zip(a[0], b[0], a[1]):
+        if x == y:
+            continue
+        # NULLs sort first ascending, as on SQLite
+        if x is None or y is None:
+            result = -1 if x is None else 1
+        else:
+            result = -1 if x < y else 1
+        return -result if descending else result
+    return 0
+
+
+class ShardedQuerySet(models.QuerySet):
+    """A QuerySet over a model with an author, whose rows live on the author's
+    shard.
+
+    Pinned to one database with using() or Todo.objects.for_author(), it is an
+    ordinary QuerySet. Otherwise, when there are several shards, reads run on
+    every shard and are merged in the query's ordering; slices fetch up to the
+    end of the slice from each shard. Aggregates support Count, Sum, Min and
+    Max. Joins cannot cross databases, so select_related() on a shard other
+    than the primary is turned into prefetch_related().
+    """
+
+    def for_author(self, author, write=False):
+        """Returns the author's rows, queried on their shard."""
+        author_id = getattr(author, 'pk', author)
+        queryset = self.filter(author_id=author_id)
+        if is_sharded():
+            queryset = queryset.using(shard_for_author(author_id, write=write))
+        return queryset
+
+    @property
+    def scattered(self):
+        return self._db is None and is_sharded()
+
+    def per_shard(self):
+        """Returns this query pinned to each shard in turn."""
+        if not self.scattered:
+            return [self]
+        querysets = []
+        for alias in settings.TODO_SHARDS:
+            queryset = self.using(alias)
+            if alias != DEFAULT_DB_ALIAS and queryset.query.select_related:
+                related = queryset.query.select_related
+                queryset = queryset.select_related(None).prefetch_related(
+                    *(related if isinstance(related, dict) else [
+                        field.name for field in self.model._meta.concrete_fields if field.is_relation
+                    ])
+                )
+            querysets.append(queryset)
+        return querysets
+
+    def _ordering_key(self):
+        """Returns a function giving a result's sort key, or None if results
+        cannot be merged in order.
+        """
+        if self.query.extra_order_by:
+            return None
+        ordering = self.query.order_by or (self.model._meta.ordering if self.query.default_ordering else ())
+        if not ordering or any(not isinstance(term, str) or term == '?' for term in ordering):
+            return None
+        names = [term.lstrip('-') for term in ordering]
+        names = [self.model._meta.pk.attname if name == 'pk' else name for name in names]
+        descending = [term.startswith('-') for term in ordering]
+
+        if self._iterable_class is ModelIterable:
+            def values(obj):
+                result = []
+                for name in names:
+                    value = obj
+                    for part in name.split('__'):
+                        value = getattr(value, part, None)
+                    result.append(value)
+                return result
+        else:
+            columns = list(self.query.values_select) + list(self.query.annotation_select)
+            if not columns or any(name not in columns for name in names):
+                return None
+            if self._iterable_class is ValuesIterable:
+                def values(row):
+                    return [row[name] for name in names]
+            elif self._iterable_class is FlatValuesListIterable:
+                def values(row):
+                    return [row]
+            else:
+                indexes = [columns.index(name) for name in names]
+
+                def values(row):
+                    return [row[index] for index in indexes]
+
+        return lambda row: cmp_to_key(_compare)((values(row), descending))
+
+    def _merge(self, results):
+        key = self._ordering_key()
+        if key is None:
+            return itertools.chain.from_iterable(results)
+        return heapq.merge(*results, key=key)
+
+    def _fetch_all(self):
+        if self._result_cache is None and self.scattered:
+            low, high = self.query.low_mark, self.query.high_mark
+            results = []
+            for queryset in self.per_shard():
+                if low or high is not None:
+                    queryset.query.clear_limits()
+                    queryset.query.set_limits(0, high)
+                results.append(list(queryset))
+            self._result_cache = list(itertools.islice(self._merge(results), low, high))
+            # Each shard's query ran the prefetches for its own rows
+            self._prefetch_done = True
+        super()._fetch_all()
+
+    def iterator(self, chunk_size=2000):
+        if not self.scattered:
+            return super().iterator(chunk_size)
+        return self._merge([queryset.iterator(chunk_size) for queryset in self.per_shard()])
+
+    def count(self):
+        if self._result_cache is not None or not self.scattered:
+            return super().count()
+        low, high = self.query.low_mark, self.query.high_mark
+        total = 0
+        for queryset in self.per_shard():
+            queryset.query.clear_limits()
+            total += queryset.count()
+        if high is not None:
+            total = min(total, high)
+        return max(total - low, 0)
+
+    def exists(self):
+        if self._result_cache is not None or not self.scattered:
+            return super().exists()
+        return any(queryset.exists() for queryset in self.per_shard())
+
+    def aggregate(self, *args, **kwargs):
+        if not self.scattered:
+            return super().aggregate(*args, **kwargs)
+        if args:
+            raise NotSupportedError('Scatter-gather aggregates need explicit aliases.')
+        combine = {models.Count: sum, models.Sum: sum, models.Min: min, models.Max: max}
+        for expression in kwargs.values():
+            if type(expression) not in combine:
+                raise NotSupportedError(f'{type(expression).__name__} cannot be scatter-gathered.')
+        results = [queryset.aggregate(**kwargs) for queryset in self.per_shard()]
+        combined = {}
+        for name, expression in kwargs.items():
+            values = [result[name] for result in results if result[name] is not None]
+            combined[name] = combine[type(expression)](values) if values else None
+        return combined
+
+    def update(self, **kwargs):
+        if not self.scattered:
+            return super().update(**kwargs)
+        return sum(queryset.update(**kwargs) for queryset in self.per_shard())
+
+    update.alters_data = True
+
+    def delete(self):
+        if not self.scattered:
+            return super().delete()
+        deleted, counts = 0, {}
+        for queryset in self.per_shard():
+            shard_deleted, shard_counts = queryset.delete()
+            deleted += shard_deleted
+            for label, count in shard_counts.items():
+                counts[label] = counts.get(label, 0) + count
+        return deleted, counts
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def create(self, **kwargs):
+        if not self.scattered:
+            return super().create(**kwargs)
+        # Saved through the router, which places it by its author
+        obj = self.model(**kwargs)
+        obj.save(force_insert=True)
+        return obj
+
+    def bulk_create(self, objs, *args, **kwargs):
+        if not self.scattered:
+            return super().bulk_create(objs, *args, **kwargs)
+        objs = list(objs)
+        for alias, group in group_by_shard(objs).items():
+            self.using(alias).bulk_create(group, *args, **kwargs)
+        return objs
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        if not self.scattered:
+            return super().bulk_update(objs, fields, batch_size)
+        for alias, group in group_by_shard(objs).items():
+            self.using(alias).bulk_update(group, fields, batch_size)
+
+
+def _rows(model, author_id, using):
+    fields = [field.attname for field in model._meta.concrete_fields]
+    return model._base_manager.using(using).filter(author_id=author_id).order_by('pk').values(*fields)
+
+
+def _insert(model, rows, using):
+    """Inserts rows as given, keeping auto_now_add values, skipping existing ids."""
+    fields = model._meta.concrete_fields
+    objs = [model(**row) for row in rows]
+    batch_size = connections[using].ops.bulk_batch_size(fields, objs) or len(objs)
+    for start in range(0, len(objs), batch_size):
+        model._base_manager.using(using)._insert(
+            objs[start:start + batch_size], fields=fields, using=using, raw=True, ignore_conflicts=True,
+        )
+
+
+def _copy(model, author_id, source, target, batch_size):
+    last = None
+    while True:
+        rows = _rows(model, author_id, source)
+        if last is not None:
+            rows = rows.filter(pk__gt=last)
+        rows = list(rows[:batch_size])
+        if not rows:
+            return
+        _insert(model, rows, target)
+        last = rows[-1][model._meta.pk.attname]
+
+
+def _sync(model, author_id, source, target):
+    """Makes the author's rows on target match source, row for row."""
+    pk = model._meta.pk.attname
+    expected = {row[pk]: row for row in _rows(model, author_id, source)}
+    actual = {row[pk]: row for row in _rows(model, author_id, target)}
+    stale = [key for key, row in actual.items() if expected.get(key) != row]
+    if stale:
+        model._base_manager.using(target).filter(pk__in=stale)._raw_delete(target)
+    _insert(model, [row for key, row in expected.items() if key not in actual or key in stale], target)
+
+
+def sharded_models():
+    from .models import ArchivedTodo, Todo, TodoTombstone
+
+    return (Todo, ArchivedTodo, TodoTombstone)
+
+
+def move_authors(targets, batch_size=1000, settle=None):
+    """Moves authors' Todos and archived Todos to new shards while they keep
+    using the site. targets maps author ids to target shards.
+
+    Rows are first copied in batches while the authors keep working. Then
+    their writes are refused with ShardMoving while rows changed during the
+    copy are synced, reads switch to the targets and the source rows are
+    deleted. Each switch waits settle seconds, by default
+    TODO_SHARD_CACHE_TIMEOUT, for cached placements in other processes to
+    expire; moving authors together waits once rather than per author.
+    Cross-shard queries may see a moving author's rows twice until the move
+    completes. Returns the ids of the authors moved.
+    """
+    if settle is None:
+        settle = settings.TODO_SHARD_CACHE_TIMEOUT
+    moves = {}
+    for author_id, target in targets.items():
+        source = shard_for_author(author_id)
+        if source != target:
+            moves[author_id] = (source, target)
+    if not moves:
+        return []
+
+    for author_id, (source, target) in moves.items():
+        for model in sharded_models():
+            _copy(model, author_id, source, target, batch_size)
+
+    for author_id, (source, target) in moves.items():
+        place_author(author_id, source, moving=True)
+    time.sleep(settle)
+    switched, error = [], None
+    for author_id, (source, target) in moves.items():
+        try:
+            with transaction.atomic(using=target):
+                for model in sharded_models():
+                    _sync(model, author_id, source, target)
+        except Exception as e:
+            # Left on the source, without its copy on the target
+            for model in sharded_models():
+                model._base_manager.using(target).filter(author_id=author_id)._raw_delete(target)
+            place_author(author_id, source)
+            error = e
+            continue
+        # Still refusing writes, until no process reads the source rows
+        place_author(author_id, target, moving=True)
+        switched.append(author_id)
+    time.sleep(settle)
+
+    for author_id in switched:
+        source, target = moves[author_id]
+        for model in sharded_models():
+            model._base_manager.using(source).filter(author_id=author_id)._raw_delete(source)
+        place_author(author_id, target)
+        bump_list_version(author_id)
+    if error is not None:
+        raise error
+    return switched
+
+
+def move_author(author_id, target, batch_size=1000, settle=None):
+    """Moves one author's Todos to the target shard; see move_authors."""
+    return bool(move_authors({author_id: target}, batch_size, settle))
@@ -0,0 +1,119 @@
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models.signals import (post_delete, post_migrate, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .auth import invalidate_cached_user
+from .cache import bump_list_version
+from .events import publish, todo_event
+from .models import Todo, TodoShard, TodoStats, TodoTombstone
+from .search import FTS_TABLE, install_search_index
+from .sharding import home_shard, is_sharded, shard_for_author, sharded_models
+from .stats import adjust_stats, removed_deltas
+
+
+@receiver([post_save, post_delete], sender=Todo)
+def invalidate_todo_list(sender, instance, **kwargs):
+    bump_list_version(instance.author_id)
+
+
+def stored_completed(instance, using):
+    """Returns whether the database holds the Todo as completed, or None if it holds no such Todo."""
+    stored = getattr(instance, '_stored_completed', None)
+    if stored is None:
+        stored = Todo.objects.using(using).filter(pk=instance.pk).values_list('completed', flat=True).first()
+    return stored
+
+
+@receiver(pre_save, sender=Todo)
+def count_saved_todo(sender, instance, update_fields, using, **kwargs):
+    # Counted before the write, which stores the change number taken here
+    deltas = {}
+    if instance._state.adding:
+        deltas = {'total': 1, 'uncompleted': int(not instance.completed), 'created_today': 1}
+    elif update_fields is None or 'completed' in update_fields:
+        # Any save that writes completed, such as Todo.complete() or the admin form
+        stored = stored_completed(instance, using)
+        if stored is not None:
+            deltas = {'uncompleted': int(stored) - int(instance.completed)}
+    instance.change_seq = adjust_stats(instance.author_id, changes=1, **deltas)
+
+
+@receiver(post_save, sender=Todo)
+def remember_completed(sender, instance, update_fields, **kwargs):
+    if update_fields is None or 'completed' in update_fields:
+        instance._stored_completed = instance.completed
+
+
+@receiver(post_save, sender=Todo)
+def publish_saved_todo(sender, instance, created, using, **kwargs):
+    event = todo_event('created' if created else 'updated', instance)
+    transaction.on_commit(lambda: publish(instance.author_id, event), using=using)
+
+
+@receiver(post_delete, sender=Todo)
+def publish_deleted_todo(sender, instance, using, **kwargs):
+    event = todo_event('deleted', instance)
+    transaction.on_commit(lambda: publish(instance.author_id, event), using=using)
+
+
+@receiver(post_save, sender=User)
+def create_todo_stats(sender, instance, created, raw, **kwargs):
+    # New users start with an empty row, so their first list view needs no recount
+    if created and not raw:
+        TodoStats.objects.create(user=instance, day=timezone.localdate())
+
+
+@receiver(post_save, sender=User)
+def place_new_user(sender, instance, created, raw, **kwargs):
+    if created and not raw and is_sharded():
+        TodoShard.objects.create(user=instance, shard=home_shard(instance.pk))
+
+
+@receiver(pre_delete, sender=User)
+def delete_sharded_todos(sender, instance, **kwargs):
+    # The deletion collector only cascades within the primary
+    if is_sharded():
+        shard = shard_for_author(instance.pk, write=True)
+        if shard != DEFAULT_DB_ALIAS:
+            for model in sharded_models():
+                model._base_manager.using(shard).filter(author_id=instance.pk)._raw_delete(shard)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user(sender, instance, **kwargs):
+    # Covers password changes, which must end other sessions straight away;
+    # other processes only see the deletion through a shared cache
+    invalidate_cached_user(instance.pk)
+
+
+@receiver(pre_delete, sender=Todo)
+def count_deleted_todo(sender, instance, **kwargs):
+    instance.change_seq = adjust_stats(
+        instance.author_id, changes=1, **removed_deltas([(instance.created_at, instance.completed)])
+    )
+
+
+@receiver(post_delete, sender=Todo)
+def record_tombstone(sender, instance, using, **kwargs):
+    TodoTombstone.objects.using(using).create(
+        todo_id=instance.pk, author_id=instance.author_id, seq=instance.change_seq
+    )
+
+
+@receiver(post_delete, sender=User)
+def delete_tombstones(sender, instance, using, **kwargs):
+    # Deleting the user's Todos on the primary has just left a tombstone for each
+    TodoTombstone.objects.using(using).filter(author_id=instance.pk)._raw_delete(using)
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    # SQLite drops triggers along with the old table whenever a migration
+    # rebuilds todos_todo, so recreate them once the index has been installed
+    connection = connections[using]
+    if sender.name == 'todos' and connection.vendor == 'sqlite':
+        if FTS_TABLE in connection.introspection.table_names():
+            install_search_index(connection)
@@ -0,0 +1,146 @@
+"""
+Per-user Todo counters kept in the TodoStats table, so the count banner and
+the stats endpoint read one row instead of counting the user's Todos.
+
+Writes adjust the counters with F() expressions, so concurrent requests never
+lose an increment. Single-object saves and deletes are tracked by signals;
+bulk writes call adjust_stats or recount_stats themselves. Adjusting a
+missing or stale row is a no-op: the row is built from the Todo table on
+first read, and manage.py recount_todos repairs any drift.
+
+The row also holds the user's change sequence, which numbers every write to
+their Todos for todos.sync.
+"""
+from contextlib import contextmanager
+from datetime import datetime, time
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Max, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Todo, TodoStats, TodoTombstone
+
+
+def _start_of_today():
+    return timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+
+
+def count_stats(user_id):
+    """Counts a user's stats from the Todo table.
+
+    created_today counts Todos created today and last_activity is the latest
+    Todo date, which edits move forward, the closest the table itself records.
+    """
+    counts = Todo.objects.for_author(user_id).aggregate(
+        total=Count('id'),
+        uncompleted=Count('id', filter=Q(completed=False)),
+        created_today=Count('id', filter=Q(created_at__gte=_start_of_today())),
+        last_activity=Max('date'),
+    )
+    return dict(counts, day=timezone.localdate())
+
+
+def last_change(user_id):
+    """Returns the highest change number on a user's Todos and tombstones."""
+    todos = Todo.objects.for_author(user_id).aggregate(seq=Max('change_seq'))['seq']
+    tombstones = TodoTombstone.objects.for_author(user_id).aggregate(seq=Max('seq'))['seq']
+    return max(todos or 0, tombstones or 0)
+
+
+def recount_stats(user_id):
+    """Rebuilds a user's stats row from the Todo table and returns it.
+
+    The change sequence never moves back, but is raised past the newest
+    numbered Todo or tombstone in case the row was missing or stale.
+    """
+    defaults = dict(count_stats(user_id), stale=False)
+    change_seq = last_change(user_id)
+    try:
+        with transaction.atomic():
+            stats, created = TodoStats.objects.select_for_update().get_or_create(
+                user_id=user_id, defaults=dict(defaults, change_seq=change_seq),
+            )
+            if not created:
+                for field, value in defaults.items():
+                    setattr(stats, field, value)
+                stats.change_seq = max(stats.change_seq, change_seq)
+                stats.save()
+    except IntegrityError:
+        # Another request created the row first; its counts are as fresh as ours
+        stats = TodoStats.objects.get(user_id=user_id)
+    return stats
+
+
+def adjust_stats(user_id, total=0, uncompleted=0, created_today=0, changes=0):
+    """Applies counter deltas to a user's stats in one UPDATE and records the
+    activity. created_today restarts from zero on a new local day.
+
+    With changes, also takes that many numbers from the user's change
+    sequence and returns the last. Numbering needs the row, so a missing or
+    stale one is first rebuilt from the tables, which must not include the
+    changes yet. Call it inside numbering().
+    """
+    now = timezone.now()
+    today = timezone.localdate(now)
+    stats = TodoStats.objects.filter(user_id=user_id, stale=False)
+    # Clamped, so a missed event fails no CHECK; recount_todos repairs the drift
+    values = dict(
+        total=Greatest(F('total') + total, Value(0)),
+        uncompleted=Greatest(F('uncompleted') + uncompleted, Value(0)),
+        created_today=Case(
+            When(day=today, then=Greatest(F('created_today') + created_today, Value(0))),
+            default=Value(max(created_today, 0)),
+        ),
+        day=today,
+        last_activity=now,
+    )
+    if not changes:
+        stats.update(**values)
+        return None
+    values['change_seq'] = F('change_seq') + changes
+    if not stats.update(**values):
+        recount_stats(user_id)
+        stats.update(**values)
+    return stats.values_list('change_seq', flat=True).get()
+
+
+@contextmanager
+def numbering(using, savepoint=True):
+    """Runs writes to Todos on the shard using that take change numbers.
+
+    They run inside a transaction on the primary, which holds the stats rows
+    the numbers come from locked until the writes commit. Changes so become
+    visible in number order, and a sync cursor never passes one still being
+    written.
+    """
+    with transaction.atomic(savepoint=False), transaction.atomic(using=using, savepoint=savepoint):
+        yield
+
+
+def reset_stats(user_ids):
+    """Marks users' stats stale, so each is recounted on its next read. The
+    rows stay, keeping their change sequences.
+    """
+    TodoStats.objects.filter(user_id__in=user_ids).update(stale=True)
+
+
+def removed_deltas(todos):
+    """Returns the adjust_stats deltas for deleting todos, given as (created_at, completed) pairs."""
+    start = _start_of_today()
+    deltas = {'total': 0, 'uncompleted': 0, 'created_today': 0}
+    for created_at, completed in todos:
+        deltas['total'] -= 1
+        deltas['uncompleted'] -= not completed
+        deltas['created_today'] -= created_at >= start
+    return deltas
+
+
+def get_stats(user_id):
+    """Returns a user's stats row, building it if missing or stale."""
+    stats = TodoStats.objects.filter(user_id=user_id).first()
+    if stats is None or stats.stale:
+        stats = recount_stats(user_id)
+    if stats.day != timezone.localdate():
+        stats.created_today = 0
+    return stats
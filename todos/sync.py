@@ -0,0 +1,64 @@
+"""
+Delta sync for clients that keep their own copy of a user's Todos.
+
+Every write to a user's Todos takes the next number from their change
+sequence, held in their TodoStats row. A saved Todo stores its number in
+change_seq; a deleted or archived one leaves a TodoTombstone holding it. A
+client sends the last number it has seen as its cursor and gets back only
+what was numbered after it, read through the (author, change_seq) and
+(author, seq) indexes. When nothing has changed the cursor equals the
+sequence, and the answer costs the stats row's primary key lookup alone.
+
+manage.py purge_tombstones deletes old tombstones and raises the user's
+sync_floor past them. A client whose cursor is below the floor, or who sends
+none, gets a reset: every live Todo, after which it continues from the new
+cursor like any other.
+"""
+import heapq
+
+from .models import Todo, TodoTombstone
+from .stats import get_stats
+
+FIELDS = ('id', 'title', 'description', 'date', 'completed', 'completed_at', 'change_seq')
+
+
+def changes_since(user, cursor=None, limit=500):
+    """Returns a user's Todo changes after cursor, at most limit of them, as
+
+        {"todos": [...], "deleted": [ids], "cursor": n, "more": bool, "reset": bool}
+
+    Changes come in number order, so passing the returned cursor back picks
+    up where this page ended.
+    """
+    stats = get_stats(user.pk)
+    reset = cursor is None or cursor < stats.sync_floor
+    if not reset and cursor >= stats.change_seq:
+        return {'todos': [], 'deleted': [], 'cursor': cursor, 'more': False, 'reset': False}
+
+    todos = Todo.objects.for_author(user).order_by('change_seq', 'id').values(*FIELDS)
+    if reset:
+        # A reset client drops its copy, so it needs no tombstones
+        changes = [(todo['change_seq'], todo) for todo in todos[:limit + 1]]
+    else:
+        tombstones = TodoTombstone.objects.for_author(user).filter(seq__gt=cursor).order_by('seq')
+        changes = list(heapq.merge(
+            ((todo['change_seq'], todo) for todo in todos.filter(change_seq__gt=cursor)[:limit + 1]),
+            tombstones.values_list('seq', 'todo_id')[:limit + 1],
+            key=lambda change: change[0],
+        ))
+
+    more = len(changes) > limit
+    changes = changes[:limit]
+    if more:
+        cursor = changes[-1][0]
+    else:
+        # Writes hold the stats row until they commit, so everything numbered
+        # up to the sequence read above is visible by now
+        cursor = max([stats.change_seq] + [seq for seq, _ in changes[-1:]])
+    return {
+        'todos': [change for _, change in changes if isinstance(change, dict)],
+        'deleted': [change for _, change in changes if not isinstance(change, dict)],
+        'cursor': cursor,
+        'more': more,
+        'reset': reset,
+    }
@@ -0,0 +1,25 @@
+"""Background tasks, queued with todos.jobs.enqueue and run by manage.py run_worker."""
+from django.core.management import call_command
+
+from .jobs import task
+from .stats import recount_stats
+
+
+@task
+def recount_user_stats(user_id):
+    recount_stats(user_id)
+
+
+@task
+def archive_todos(days=30, batch_size=1000):
+    call_command('archive_todos', days=days, batch_size=batch_size)
+
+
+@task
+def purge_sessions(batch_size=1000):
+    call_command('purge_sessions', batch_size=batch_size)
+
+
+@task
+def purge_tombstones(days=30, batch_size=1000):
+    call_command('purge_tombstones', days=days, batch_size=batch_size)
@@ -0,0 +1,37 @@
+from django import template
+from django.contrib.staticfiles import finders
+from django.utils.safestring import mark_safe
+
+from todos.assets import CRITICAL_CSS
+
+register = template.Library()
+
+
+# The critical CSS once found. Until then every render looks for it again, so
+# running build_assets switches a live process over from the CDNs.
+_critical_css_cache = {}
+
+
+def _read_critical_css():
+    if 'css' not in _critical_css_cache:
+        path = finders.find(CRITICAL_CSS)
+        if path is None:
+            return None
+        with open(path, encoding='utf-8') as f:
+            _critical_css_cache['css'] = f.read().strip()
+    return _critical_css_cache['css']
+
+
+@register.simple_tag
+def bundled_assets():
+    """Returns whether manage.py build_assets has produced the bundles.
+
+    Until it has, base.html falls back to loading from the CDNs.
+    """
+    return _read_critical_css() is not None
+
+
+@register.simple_tag
+def critical_css():
+    """Returns the critical CSS for inlining in a <style> element."""
+    return mark_safe(_read_critical_css() or '')
@@ -1,8 +1,63 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import re
+import runpy
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.test import SimpleTestCase, TestCase
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.http import HttpResponse
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import resolve, reverse
-
-from .models import Todo
+from django.utils import timezone
+from psycopg2 import OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.pool import PoolError
+
+from todo_project import gunicorn_conf
+from todo_project.asgi import application
+from todo_project.db_backends.postgresql.base import BlockingConnectionPool
+from todo_project.db_backends.postgresql.base import \
+    DatabaseWrapper as PostgresDatabaseWrapper
+from todo_project.db_backends.postgresql.base import _pools
+from todo_project.routers import ReplicaRouter, replica_reads
+from todo_project.warmup import warm_up
+
+from .admin import DateHierarchyQuerySet
+from .assets import critical_css, used_markup
+from .benchmark import BENCH_PASSWORD, compare, drive_client, seed
+from .events import RESYNC, TooManyConnections, get_broker
+from .ids import uuid7
+from .importer import COPY_COLUMNS
+from .jobs import claim, enqueue, requeue_stale, task
+from .management.commands.run_worker import execute
+from .models import (ArchivedTodo, Job, Todo, TodoShard, TodoStats,
+                     TodoTombstone)
+from .pagination import EstimatedCountPaginator
+from .sharding import HashRing, home_shard, move_author, place_author
+from .stats import count_stats
+from .sync import changes_since
+from .tasks import recount_user_stats
+from .templatetags.assets import _critical_css_cache
 from .views import *
 
 
@@ -76,10 +131,33 @@ class TodoModelTests(TestCase):
         todo = Todo.objects.get(id=cls.id)
         cls.assertEqual(todo.get_absolute_url(), f'/todos/{cls.id}/')
 
+    def test_todo_ids_are_uuid4_by_default(cls):
+        cls.assertEqual(cls.id.version, 4)
+
+    @override_settings(TODO_UUID_VERSION=7)
+    def test_todo_ids_are_uuid7_when_configured(cls):
+        todo = Todo.objects.create(author=cls.user, title='title')
+        cls.assertEqual(todo.id.version, 7)
+        cls.assertEqual(resolve(todo.get_absolute_url()).kwargs['pk'], todo.id)
+
+
+class UUID7Tests(SimpleTestCase):
+
+    def test_uuid7_version_and_variant(self):
+        value = uuid7()
+        self.assertEqual(value.version, 7)
+        self.assertEqual(value.variant, uuid.RFC_4122)
+
+    def test_uuid7_is_time_ordered(self):
+        first = uuid7()
+        time.sleep(0.002)
+        self.assertLess(first, uuid7())
+
 
 class TodoListViewTests(TestCase):
 
     def setUp(self):
+        cache.clear()
         self.test_user = User.objects.create_user(
             username='test_user',
             password='test_password123'
@@ -142,6 +220,107 @@ class TodoListViewTests(TestCase):
             self.assertContains(response, f'title{i}')
             self.assertContains(response, f'description{i}')
 
+    def test_list_is_paginated_by_cursor(self):
+        for i in range(TodoListView.page_size + 4):
+            Todo.objects.create(author=self.test_user, title=f'title{i}')
+        login = self.client.login(username='test_user', password='test_password123')
+        self.assertTrue(login)
+
+        # Confirm first page is full and links to the next one
+        response = self.client.get(reverse('todo_list'))
+        first_page = response.context['todo_list']
+        self.assertEqual(len(first_page), TodoListView.page_size)
+        self.assertIsNotNone(response.context['next_cursor'])
+        self.assertContains(response, 'You have 25 uncompleted todos.')
+
+        # Confirm second page holds the remainder with no overlap
+        response = self.client.get(reverse('todo_list'), {'cursor': response.context['next_cursor']})
+        second_page = response.context['todo_list']
+        self.assertEqual(len(second_page), 5)
+        self.assertIsNone(response.context['next_cursor'])
+        self.assertFalse({todo.id for todo in first_page} & {todo.id for todo in second_page})
+
+    def test_invalid_cursor_returns_404(self):
+        login = self.client.login(username='test_user', password='test_password123')
+        self.assertTrue(login)
+        response = self.client.get(reverse('todo_list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_list_is_served_from_cache(self):
+        self.client.login(username='test_user', password='test_password123')
+        # Session, user, page and stats
+        with self.assertNumQueries(4):
+            self.client.get(reverse('todo_list'))
+        # Session and user only
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('todo_list'))
+        self.assertContains(response, 'You have 1 uncompleted todo.')
+
+    def test_cache_invalidated_by_todo_changes(self):
+        self.client.login(username='test_user', password='test_password123')
+        self.client.get(reverse('todo_list'))
+
+        self.client.post(reverse('todo_new'), {'title': 'new_title', 'description': ''})
+        response = self.client.get(reverse('todo_list'))
+        self.assertContains(response, 'new_title')
+        self.assertContains(response, 'You have 2 uncompleted todos.')
+
+        self.client.post(reverse('todo_delete', kwargs={'pk': self.test_id}))
+        response = self.client.get(reverse('todo_list'))
+        self.assertNotContains(response, 'description')
+        self.assertContains(response, 'You have 1 uncompleted todo.')
+
+    def test_inline_and_included_cards_link_alike(self):
+        self.client.login(username='test_user', password='test_password123')
+        links = [reverse(name, kwargs={'pk': self.test_id}) for name in ('todo_complete', 'todo_edit', 'todo_delete')]
+        for inline in (True, False):
+            cache.clear()
+            with self.subTest(inline=inline), override_settings(TODO_LIST_INLINE_CARDS=inline):
+                response = self.client.get(reverse('todo_list'))
+                for link in links:
+                    self.assertContains(response, f'"{link}"')
+
+    def test_cached_list_carries_current_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.login(username='test_user', password='test_password123')
+        client.get(reverse('todo_list'))
+        # As after a new login, the CSRF secret changes while the cached list stays valid
+        del client.cookies[settings.CSRF_COOKIE_NAME]
+        response = client.get(reverse('todo_list'))
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', response.content.decode()).group(1)
+        response = client.post(
+            reverse('todo_complete', kwargs={'pk': self.test_id}), {'csrfmiddlewaretoken': token}
+        )
+        self.assertEqual(response.status_code, 302)
+
+    def test_new_csrf_cookie_does_not_revalidate_list(self):
+        client = Client(enforce_csrf_checks=True)
+        client.login(username='test_user', password='test_password123')
+        etag = client.get(reverse('todo_list'))['ETag']
+        # As after logging out and in again
+        client.cookies[settings.CSRF_COOKIE_NAME] = 'b' * 64
+        response = client.get(reverse('todo_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', response.content.decode()).group(1)
+        response = client.post(
+            reverse('todo_complete', kwargs={'pk': self.test_id}), {'csrfmiddlewaretoken': token}
+        )
+        self.assertEqual(response.status_code, 302)
+
+    def test_unchanged_list_returns_304(self):
+        self.client.login(username='test_user', password='test_password123')
+        response = self.client.get(reverse('todo_list'))
+        etag = response['ETag']
+
+        response = self.client.get(reverse('todo_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Confirm ETag changes once the list does
+        Todo.objects.create(author=self.test_user, title='title2')
+        response = self.client.get(reverse('todo_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
 
 class TodoDetailViewTests(TestCase):
 
@@ -176,6 +355,19 @@ class TodoDetailViewTests(TestCase):
         self.assertContains(response, 'description')
         self.assertContains(response, 'Todo Detail')
 
+    def test_unauthorized_user_cannot_view_todo(self):
+        User.objects.create_user(username='unauthorized_user', password='test_password321')
+        login = self.client.login(username='unauthorized_user', password='test_password321')
+        self.assertTrue(login)
+        response = self.client.get(reverse('todo_detail', kwargs={'pk': self.test_id}))
+        self.assertEqual(response.status_code, 403)
+
+    def test_detail_view_query_count(self):
+        self.client.login(username='test_user', password='test_password123')
+        # Session, user and a single author-scoped Todo lookup
+        with self.assertNumQueries(3):
+            self.client.get(reverse('todo_detail', kwargs={'pk': self.test_id}))
+
 
 class TodoUpdateViewTests(TestCase):
 
@@ -239,6 +431,19 @@ class TodoUpdateViewTests(TestCase):
         self.assertContains(response, 'new_title')
         self.assertContains(response, 'new_description')
 
+    def test_update_view_query_count(self):
+        self.client.login(username='test_user', password='test_password123')
+        # Session, user and a single author-scoped Todo lookup
+        with self.assertNumQueries(3):
+            self.client.get(reverse('todo_edit', kwargs={'pk': self.test_id}))
+        # Then the session, user, Todo, the stats update and its change
+        # number, and the UPDATE
+        with self.assertNumQueries(6):
+            self.client.post(
+                reverse('todo_edit', kwargs={'pk': self.test_id}),
+                {'title': 'new_title', 'description': 'new_description'}
+            )
+
 
 class TodoDeleteViewTests(TestCase):
 
@@ -301,6 +506,16 @@ class TodoDeleteViewTests(TestCase):
         self.assertNotContains(response, 'new_description')
         self.assertContains(response, 'You have 0 uncompleted todos.')
 
+    def test_delete_view_query_count(self):
+        self.client.login(username='test_user', password='test_password123')
+        # Session, user and a single author-scoped Todo lookup
+        with self.assertNumQueries(3):
+            self.client.get(reverse('todo_delete', kwargs={'pk': self.test_id}))
+        # Then the session, user, Todo, the stats update and its change number,
+        # the DELETE and the tombstone
+        with self.assertNumQueries(7):
+            self.client.post(reverse('todo_delete', kwargs={'pk': self.test_id}))
+
 
 class TodoCreateViewTests(TestCase):
 
@@ -356,3 +571,1515 @@ class TodoCreateViewTests(TestCase):
         self.assertContains(response, 'new_title')
         self.assertContains(response, 'new_description')
         self.assertContains(response, 'You have 1 uncompleted todo.')
+
+
+class TodoFragmentTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.test_user = User.objects.create_user(
+            username='test_user',
+            password='test_password123'
+        )
+        self.client.login(username='test_user', password='test_password123')
+        self.todo = Todo.objects.create(author=self.test_user, title='title', description='description')
+        self.htmx = {'HTTP_HX_REQUEST': 'true'}
+        self.json = {'HTTP_ACCEPT': 'application/json'}
+
+    def test_create_returns_card_fragment(self):
+        response = self.client.post(reverse('todo_new'), {'title': 'new_title', 'description': ''}, **self.htmx)
+        self.assertEqual(response.status_code, 201)
+        self.assertTemplateUsed(response, 'todo_card_snippet.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertContains(response, 'new_title', status_code=201)
+
+    def test_update_returns_json(self):
+        response = self.client.post(
+            reverse('todo_edit', kwargs={'pk': self.todo.pk}),
+            {'title': 'new_title', 'description': 'new_description'},
+            **self.json,
+        )
+        data = response.json()
+        self.assertEqual((data['id'], data['title'], data['completed']), (str(self.todo.pk), 'new_title', False))
+
+    def test_invalid_form_returns_errors(self):
+        response = self.client.post(reverse('todo_new'), {'title': '', 'description': ''}, **self.json)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('title', response.json()['errors'])
+
+    def test_complete_returns_completed_card(self):
+        response = self.client.post(reverse('todo_complete', kwargs={'pk': self.todo.pk}), **self.htmx)
+        self.assertContains(response, 'Completed')
+        self.assertNotContains(response, reverse('todo_complete', kwargs={'pk': self.todo.pk}))
+
+    def test_delete_returns_204(self):
+        # Session, user, Todo lookup, stats update and change number, DELETE and
+        # tombstone; no list is rendered
+        with self.assertNumQueries(7):
+            response = self.client.post(reverse('todo_delete', kwargs={'pk': self.todo.pk}), **self.htmx)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Todo.objects.exists())
+
+    def test_other_users_todo_is_still_forbidden(self):
+        other_user = User.objects.create_user(username='other_user', password='test_password321')
+        todo = Todo.objects.create(author=other_user, title='not yours')
+        response = self.client.post(reverse('todo_delete', kwargs={'pk': todo.pk}), **self.json)
+        self.assertEqual(response.status_code, 403)
+
+
+class TodoAdminTests(TestCase):
+
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(
+            username='admin_user', email='admin@example.com', password='admin_password123'
+        )
+        self.client.login(username='admin_user', password='admin_password123')
+        self.test_user = User.objects.create_user(username='test_user', password='test_password123')
+        self.todo = Todo.objects.create(author=self.test_user, title='buy milk')
+        Todo.objects.create(author=self.admin_user, title='walk dog')
+        self.url = reverse('admin:todos_todo_changelist')
+
+    def results(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [todo.title for todo in response.context['cl'].result_list]
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.url)
+        Todo.objects.bulk_create(
+            Todo(author=User.objects.create_user(username=f'user{i}'), title=f'title {i}') for i in range(10)
+        )
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(self.url)
+        self.assertEqual(len(many), len(few))
+
+    def test_search_by_words_author_and_id(self):
+        self.assertEqual(self.results(q='milk'), ['buy milk'])
+        self.assertEqual(self.results(q='@admin_user'), ['walk dog'])
+        self.assertEqual(self.results(q=str(self.todo.pk)), ['buy milk'])
+
+    def test_date_hierarchy_matches_distinct_dates(self):
+        old = Todo.objects.create(author=self.test_user, title='old')
+        Todo.objects.filter(pk=old.pk).update(date=timezone.now() - timedelta(days=400))
+        queryset = DateHierarchyQuerySet(Todo)
+        for kind in ('year', 'month', 'day'):
+            self.assertEqual(list(queryset.dates('date', kind)), list(Todo.objects.dates('date', kind)))
+        self.assertEqual(self.results(date__year=timezone.now().year), ['walk dog', 'buy milk'])
+
+    def test_editing_completed_sets_and_clears_completed_at(self):
+        url = reverse('admin:todos_todo_change', args=[self.todo.pk])
+        data = {'author': self.test_user.pk, 'title': 'buy milk', 'description': ''}
+        response = self.client.post(url, {**data, 'completed': 'on'})
+        self.assertEqual(response.status_code, 302)
+        self.todo.refresh_from_db()
+        self.assertTrue(self.todo.completed)
+        self.assertIsNotNone(self.todo.completed_at)
+        self.assertEqual(TodoStats.objects.get(user=self.test_user).uncompleted, 0)
+
+        self.client.post(url, data)
+        self.todo.refresh_from_db()
+        self.assertEqual((self.todo.completed, self.todo.completed_at), (False, None))
+        self.assertEqual(TodoStats.objects.get(user=self.test_user).uncompleted, 1)
+
+    def test_paginator_counts_exactly_without_planner_estimates(self):
+        paginator = EstimatedCountPaginator(Todo.objects.order_by('id'), 1)
+        self.assertEqual(paginator.count, 2)
+
+    @mock.patch('todos.pagination.estimate_count', return_value=500000)
+    def test_paginator_estimates_only_unfiltered_tables(self, estimate_count):
+        todos = Todo.objects.order_by('-date', '-id')
+        self.assertEqual(EstimatedCountPaginator(todos, 1).count, 500000)
+        paginator = EstimatedCountPaginator(todos.filter(title='walk dog'), 1)
+        self.assertEqual(paginator.count, 1)
+        estimate_count.assert_called_once()
+
+
+class TodoBatchViewTests(TestCase):
+
+    def setUp(self):
+        self.test_user = User.objects.create_user(
+            username='test_user',
+            password='test_password123'
+        )
+        self.test_todo = Todo.objects.create(
+            author=self.test_user,
+            title='title',
+            description='description',
+        )
+        self.test_id = self.test_todo.id
+
+    def post_batch(self, operations):
+        return self.client.post(
+            reverse('todo_batch'),
+            json.dumps({'operations': operations}),
+            content_type='application/json'
+        )
+
+    def test_batch_view_resolves(self):
+        view = resolve('/todos/batch/')
+        self.assertEqual(view.func.__name__, TodoBatchView.as_view().__name__)
+
+    def test_forbidden_if_not_logged_in(self):
+        response = self.post_batch([{'op': 'create', 'title': 'new_title'}])
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(Todo.objects.count(), 1)
+
+    def test_malformed_batch_returns_400(self):
+        self.client.login(username='test_user', password='test_password123')
+        response = self.client.post(reverse('todo_batch'), 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse('todo_batch'), '{"operations": {}}', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_applies_operations(self):
+        other_todo = Todo.objects.create(author=self.test_user, title='other_title')
+        self.client.login(username='test_user', password='test_password123')
+        response = self.post_batch([
+            {'op': 'create', 'title': 'new_title', 'description': 'new_description'},
+            {'op': 'update', 'id': str(self.test_id), 'title': 'updated_title'},
+            {'op': 'delete', 'id': str(other_todo.id)},
+        ])
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([r['status'] for r in results], ['created', 'updated', 'deleted'])
+
+        # Confirm table reflects every operation
+        created = Todo.objects.get(id=results[0]['id'])
+        self.assertEqual(created.author, self.test_user)
+        self.assertEqual(created.description, 'new_description')
+        updated = Todo.objects.get(id=self.test_id)
+        self.assertEqual(updated.title, 'updated_title')
+        self.assertEqual(updated.description, 'description')
+        self.assertFalse(Todo.objects.filter(id=other_todo.id).exists())
+
+    def test_batch_reports_invalid_items(self):
+        User.objects.create_user(username='other_user', password='test_password321')
+        self.client.login(username='other_user', password='test_password321')
+        response = self.post_batch([
+            {'op': 'create', 'title': 'x' * 81},
+            {'op': 'create', 'title': 'new_title'},
+            {'op': 'update', 'id': str(self.test_id), 'title': 'stolen'},
+            {'op': 'delete', 'id': 'not-a-uuid'},
+            {'op': 'rename'},
+        ])
+        results = response.json()['results']
+        self.assertEqual(
+            [r['status'] for r in results],
+            ['error', 'created', 'error', 'error', 'error']
+        )
+        self.assertIn('title', results[0]['errors'])
+
+        # Confirm another author's todo is untouched
+        self.assertEqual(Todo.objects.get(id=self.test_id).title, 'title')
+        self.assertEqual(Todo.objects.count(), 2)
+
+    def test_batch_query_count_is_independent_of_size(self):
+        todos = Todo.objects.bulk_create(
+            Todo(author=self.test_user, title=f'title{i}') for i in range(20)
+        )
+        self.client.login(username='test_user', password='test_password123')
+        operations = (
+            [{'op': 'create', 'title': f'new_title{i}'} for i in range(20)]
+            + [{'op': 'update', 'id': str(todo.id), 'title': 'updated'} for todo in todos[:10]]
+            + [{'op': 'delete', 'id': str(todo.id)} for todo in todos[10:]]
+        )
+        # Session, user, lookup, savepoint, stats and change numbers, INSERT,
+        # UPDATE, DELETE, tombstones, release
+        with self.assertNumQueries(11):
+            self.post_batch(operations)
+        self.assertEqual(Todo.objects.filter(author=self.test_user).count(), 31)
+
+
+class TodoExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.test_user = User.objects.create_user(
+            username='test_user',
+            password='test_password123'
+        )
+        for i in range(3):
+            Todo.objects.create(author=cls.test_user, title=f'title{i}', description=f'description{i}')
+        other_user = User.objects.create_user(username='other_user', password='test_password321')
+        Todo.objects.create(author=other_user, title='other_title')
+
+    def export(self, **params):
+        self.client.login(username='test_user', password='test_password123')
+        response = self.client.get(reverse('todo_export'), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_export_view_resolves(self):
+        view = resolve('/todos/export/')
+        self.assertEqual(view.func.__name__, TodoExportView.as_view().__name__)
+
+    def test_redirect_if_not_logged_in(self):
+        response = self.client.get(reverse('todo_export'))
+        self.assertRedirects(response, '/accounts/login/?next=/todos/export/')
+
+    def test_ndjson_export(self):
+        rows = [json.loads(line) for line in self.export().decode().splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['title0', 'title1', 'title2'])
+        self.assertEqual({row['author'] for row in rows}, {'test_user'})
+
+    def test_csv_export(self):
+        rows = list(csv.DictReader(self.export(format='csv').decode().splitlines()))
+        self.assertEqual([row['description'] for row in rows], ['description0', 'description1', 'description2'])
+
+    def test_gzip_export(self):
+        data = gzip.decompress(self.export(format='csv', gzip=1))
+        self.assertEqual(len(data.decode().splitlines()), 4)
+
+    def test_unsupported_format_returns_404(self):
+        self.client.login(username='test_user', password='test_password123')
+        response = self.client.get(reverse('todo_export'), {'format': 'xml'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_export_todos_command(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'todos.ndjson.gz')
+            call_command('export_todos', user='test_user', gzip=True, output=path)
+            with gzip.open(path, 'rt') as f:
+                rows = [json.loads(line) for line in f]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['title'], 'title0')
+
+
+class ImportTodosCommandTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.test_user = User.objects.create_user(
+            username='test_user',
+            password='test_password123'
+        )
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'todos.ndjson')
+
+    def write_records(self, records):
+        with open(self.path, 'w') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+
+    def import_todos(self, **options):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('import_todos', self.path, stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_import_validates_and_inserts_in_batches(self):
+        self.write_records([
+            {'author': 'test_user', 'title': 'title1', 'description': 'description1'},
+            {'author': 'test_user', 'title': 'x' * 81},
+            {'author': 'test_user', 'title': 'title2', 'description': 'x' * 201},
+            {'author': 'unknown_user', 'title': 'title3'},
+            {'author': 'test_user', 'title': 'title4'},
+        ])
+        stdout, stderr = self.import_todos(batch_size=2)
+        self.assertEqual(
+            sorted(Todo.objects.values_list('title', flat=True)),
+            ['title1', 'title4']
+        )
+        self.assertEqual(stderr.count('skipped'), 3)
+        self.assertIn('rows/sec', stdout)
+        self.assertFalse(os.path.exists(self.path + '.checkpoint'))
+        # One stats rebuild queued for the author, whatever the number of batches
+        self.assertEqual(Job.objects.filter(task='todos.tasks.recount_user_stats').count(), 1)
+
+    def test_invalid_dates_are_skipped(self):
+        self.write_records([
+            {'author': 'test_user', 'title': 'malformed', 'date': 'yesterday'},
+            {'author': 'test_user', 'title': 'impossible', 'date': '2026-02-30T10:00:00+00:00'},
+            {'author': 'test_user', 'title': 'number', 'date': 12},
+            {'author': 'test_user', 'title': 'valid', 'date': '2026-02-28T10:00:00+00:00'},
+        ])
+        stdout, stderr = self.import_todos()
+        self.assertEqual(list(Todo.objects.values_list('title', flat=True)), ['valid'])
+        self.assertEqual(stderr.count('Enter a valid date/time.'), 3)
+
+    def test_later_batches_cost_no_more_queries(self):
+        self.write_records([{'author': 'test_user', 'title': f'title{i}'} for i in range(6)])
+        with CaptureQueriesContext(connection) as queries:
+            self.import_todos(batch_size=2)
+        stats_queries = [q['sql'] for q in queries if 'todos_todostats' in q['sql']]
+        # Numbering per batch, and the reset at the end; no recount
+        self.assertEqual(len([sql for sql in stats_queries if sql.startswith('UPDATE')]), 3 + 1)
+        self.assertFalse([sql for sql in queries.captured_queries if 'COUNT(' in sql['sql']])
+        self.assertTrue(TodoStats.objects.get(user=self.test_user).stale)
+
+    def test_import_resumes_from_checkpoint(self):
+        self.write_records([{'title': f'title{i}'} for i in range(5)])
+        with open(self.path + '.checkpoint', 'w') as f:
+            f.write('3')
+        self.import_todos(user='test_user')
+        self.assertEqual(
+            sorted(Todo.objects.values_list('title', flat=True)),
+            ['title3', 'title4']
+        )
+
+    def test_export_import_round_trip(self):
+        for i in range(3):
+            Todo.objects.create(author=self.test_user, title=f'title{i}')
+        self.path += '.csv.gz'
+        call_command('export_todos', format='csv', gzip=True, output=self.path)
+        ids = set(Todo.objects.values_list('id', flat=True))
+        Todo.objects.all().delete()
+
+        self.import_todos()
+        self.assertEqual(set(Todo.objects.values_list('id', flat=True)), ids)
+
+        # Confirm importing the same rows again is a no-op
+        self.import_todos()
+        self.assertEqual(Todo.objects.count(), 3)
+
+    def test_copy_writes_every_required_column(self):
+        required = {field.column for field in Todo._meta.concrete_fields if not field.null}
+        self.assertEqual(required - set(COPY_COLUMNS), set())
+
+    @skipUnless(connection.vendor == 'postgresql', 'COPY needs PostgreSQL')
+    def test_copy_import(self):
+        self.write_records([{'author': 'test_user', 'title': f'title{i}'} for i in range(3)])
+        self.import_todos()
+        self.assertEqual(
+            list(Todo.objects.order_by('title').values_list('title', 'completed', 'completed_at')),
+            [(f'title{i}', False, None) for i in range(3)],
+        )
+        self.assertFalse(Todo.objects.filter(created_at__isnull=True).exists())
+
+
+class TodoSearchTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.test_user = User.objects.create_user(
+            username='test_user',
+            password='test_password123'
+        )
+        self.client.login(username='test_user', password='test_password123')
+
+    def search(self, q, **params):
+        response = self.client.get(reverse('todo_list'), {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def titles(self, response):
+        return [todo.title for todo in response.context['todo_list']]
+
+    def test_search_ranks_title_matches_first(self):
+        Todo.objects.create(author=self.test_user, title='groceries', description='buy milk')
+        Todo.objects.create(author=self.test_user, title='milk the cow', description='farm chores')
+        Todo.objects.create(author=self.test_user, title='laundry', description='fold shirts')
+        response = self.search('milk')
+        self.assertEqual(self.titles(response), ['milk the cow', 'groceries'])
+        self.assertContains(response, 'Results for "milk"')
+
+    def test_search_matches_word_stems(self):
+        Todo.objects.create(author=self.test_user, title='go running')
+        self.assertEqual(self.titles(self.search('run')), ['go running'])
+
+    def test_search_is_scoped_to_author(self):
+        other_user = User.objects.create_user(username='other_user', password='test_password321')
+        Todo.objects.create(author=other_user, title='secret plans')
+        response = self.search('secret')
+        self.assertEqual(self.titles(response), [])
+        self.assertContains(response, 'No todos match')
+
+    def test_search_index_follows_updates_and_deletes(self):
+        todo = Todo.objects.create(author=self.test_user, title='old title')
+        todo.title = 'new title'
+        todo.save()
+        self.assertEqual(self.titles(self.search('old')), [])
+        self.assertEqual(self.titles(self.search('new')), ['new title'])
+        todo.delete()
+        self.assertEqual(self.titles(self.search('new')), [])
+
+    def test_search_index_follows_bulk_writes(self):
+        Todo.objects.bulk_create(Todo(author=self.test_user, title=f'bulk {i}') for i in range(3))
+        self.assertEqual(len(self.titles(self.search('bulk'))), 3)
+
+    def test_search_results_are_paginated(self):
+        for i in range(TodoListView.page_size + 2):
+            Todo.objects.create(author=self.test_user, title=f'task {i}')
+        response = self.search('task')
+        self.assertEqual(len(response.context['todo_list']), TodoListView.page_size)
+        self.assertEqual(response.context['next_page'], 2)
+        response = self.search('task', page=2)
+        self.assertEqual(len(response.context['todo_list']), 2)
+        self.assertIsNone(response.context['next_page'])
+
+    def test_invalid_page_returns_404(self):
+        response = self.client.get(reverse('todo_list'), {'q': 'task', 'page': 'x'})
+        self.assertEqual(response.status_code, 404)
+
+
+class TodoCompletionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.test_user = User.objects.create_user(
+            username='test_user',
+            password='test_password123'
+        )
+        self.client.login(username='test_user', password='test_password123')
+        self.todo = Todo.objects.create(author=self.test_user, title='test title')
+
+    def test_complete_view_resolves(self):
+        view = resolve(f'/todos/{self.todo.pk}/complete/')
+        self.assertEqual(view.func.__name__, TodoCompleteView.as_view().__name__)
+
+    def test_complete_moves_todo_to_completed_list(self):
+        response = self.client.post(reverse('todo_complete', kwargs={'pk': self.todo.pk}))
+        self.assertRedirects(response, reverse('todo_list'), fetch_redirect_response=False)
+        self.todo.refresh_from_db()
+        self.assertTrue(self.todo.completed)
+        self.assertIsNotNone(self.todo.completed_at)
+
+        response = self.client.get(reverse('todo_list'))
+        self.assertEqual(list(response.context['todo_list']), [])
+        response = self.client.get(reverse('todo_completed_list'))
+        self.assertEqual(list(response.context['todo_list']), [self.todo])
+        self.assertTemplateUsed(response, 'todo_completed_list.html')
+
+    def test_completed_list_is_paginated_by_cursor(self):
+        for i in range(TodoCompletedListView.page_size + 4):
+            Todo.objects.create(author=self.test_user, title=f'title{i}')
+        # Completed together, so only the id orders them
+        Todo.objects.update(completed=True, completed_at=timezone.now())
+
+        response = self.client.get(reverse('todo_completed_list'))
+        first_page = response.context['todo_list']
+        self.assertEqual(len(first_page), TodoCompletedListView.page_size)
+        self.assertContains(response, f'?cursor={response.context["next_cursor"]}')
+
+        response = self.client.get(reverse('todo_completed_list'), {'cursor': response.context['next_cursor']})
+        second_page = response.context['todo_list']
+        self.assertEqual(len(second_page), 5)
+        self.assertIsNone(response.context['next_cursor'])
+        self.assertEqual(
+            [todo.id for todo in [*first_page, *second_page]],
+            sorted(Todo.objects.values_list('id', flat=True), reverse=True),
+        )
+
+        response = self.client.get(reverse('todo_completed_list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_complete_requires_post(self):
+        response = self.client.get(reverse('todo_complete', kwargs={'pk': self.todo.pk}))
+        self.assertEqual(response.status_code, 405)
+
+    def test_cannot_complete_other_users_todo(self):
+        other_user = User.objects.create_user(username='other_user', password='test_password321')
+        todo = Todo.objects.create(author=other_user, title='not yours')
+        response = self.client.post(reverse('todo_complete', kwargs={'pk': todo.pk}))
+        self.assertEqual(response.status_code, 403)
+        todo.refresh_from_db()
+        self.assertFalse(todo.completed)
+
+    def test_completed_todos_are_excluded_from_search(self):
+        self.todo.complete()
+        response = self.client.get(reverse('todo_list'), {'q': 'test'})
+        self.assertEqual(list(response.context['todo_list']), [])
+
+    def test_archive_todos_moves_only_old_completed_todos(self):
+        old = Todo.objects.create(author=self.test_user, title='old')
+        old.complete()
+        Todo.objects.filter(pk=old.pk).update(completed_at=timezone.now() - timedelta(days=60))
+        recent = Todo.objects.create(author=self.test_user, title='recent')
+        recent.complete()
+
+        call_command('archive_todos', days=30, batch_size=1, stdout=io.StringIO())
+        self.assertEqual(set(Todo.objects.values_list('title', flat=True)), {'test title', 'recent'})
+        archived = ArchivedTodo.objects.get()
+        self.assertEqual((archived.pk, archived.title, archived.author), (old.pk, 'old', self.test_user))
+
+
+class TodoStatsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.test_user = User.objects.create_user(
+            username='test_user',
+            password='test_password123'
+        )
+        self.client.login(username='test_user', password='test_password123')
+
+    def assertStatsMatchTable(self):
+        stats = TodoStats.objects.get(user=self.test_user)
+        counts = count_stats(self.test_user.pk)
+        for field in ('total', 'uncompleted', 'created_today'):
+            self.assertEqual(getattr(stats, field), counts[field], field)
+
+    def test_counters_follow_every_write_path(self):
+        todos = [Todo.objects.create(author=self.test_user, title=f'title {i}') for i in range(3)]
+        self.assertStatsMatchTable()
+        todos[0].complete()
+        self.assertStatsMatchTable()
+        todos[1].delete()
+        self.assertStatsMatchTable()
+        self.client.post(reverse('todo_batch'), json.dumps({'operations': [
+            {'op': 'create', 'title': 'batch'},
+            {'op': 'delete', 'id': str(todos[0].id)},
+        ]}), content_type='application/json')
+        self.assertStatsMatchTable()
+        self.assertEqual(TodoStats.objects.get(user=self.test_user).total, 2)
+
+    def test_deleting_todo_edited_after_its_creation_day(self):
+        todo = Todo.objects.create(author=self.test_user, title='title')
+        yesterday = timezone.now() - timedelta(days=1)
+        Todo.objects.update(date=yesterday, created_at=yesterday)
+        TodoStats.objects.update(day=timezone.localdate(yesterday))
+        self.client.post(reverse('todo_edit', kwargs={'pk': todo.pk}), {'title': 'edited', 'description': ''})
+        response = self.client.post(reverse('todo_delete', kwargs={'pk': todo.pk}))
+        self.assertEqual(response.status_code, 302)
+        self.assertStatsMatchTable()
+        self.assertEqual(TodoStats.objects.get(user=self.test_user).created_today, 0)
+
+    def test_full_saves_that_change_completed_are_counted(self):
+        todo = Todo.objects.create(author=self.test_user, title='title')
+        todo.complete()
+        # As the admin form saves it
+        todo = Todo.objects.get(pk=todo.pk)
+        todo.completed = False
+        todo.save()
+        self.assertStatsMatchTable()
+        todo.completed = True
+        todo.save()
+        self.assertStatsMatchTable()
+        # Loaded without completed
+        todo = Todo.objects.only('author', 'title').get(pk=todo.pk)
+        todo.completed = False
+        todo.save()
+        self.assertStatsMatchTable()
+        response = self.client.post(reverse('todo_delete', kwargs={'pk': todo.pk}))
+        self.assertEqual(response.status_code, 302)
+        self.assertStatsMatchTable()
+
+    def test_drifted_counters_do_not_block_deletes(self):
+        todo = Todo.objects.create(author=self.test_user, title='title')
+        TodoStats.objects.update(total=0, uncompleted=0)
+        response = self.client.post(reverse('todo_delete', kwargs={'pk': todo.pk}))
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Todo.objects.exists())
+
+    def test_stats_endpoint(self):
+        Todo.objects.create(author=self.test_user, title='open')
+        Todo.objects.create(author=self.test_user, title='done').complete()
+        # Session, user and stats
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('todo_stats'))
+        data = response.json()
+        self.assertEqual(
+            (data['total'], data['uncompleted'], data['completed'], data['created_today']), (2, 1, 1, 2)
+        )
+        self.assertIsNotNone(data['last_activity'])
+
+    def test_missing_stats_are_rebuilt_on_read(self):
+        Todo.objects.create(author=self.test_user, title='title')
+        TodoStats.objects.all().delete()
+        response = self.client.get(reverse('todo_list'))
+        self.assertContains(response, 'You have 1 uncompleted todo.')
+        self.assertStatsMatchTable()
+
+    def test_recount_todos_repairs_drift(self):
+        Todo.objects.create(author=self.test_user, title='title')
+        TodoStats.objects.update(total=10, uncompleted=10)
+        out = io.StringIO()
+        call_command('recount_todos', stdout=out)
+        self.assertIn('test_user: total 10 -> 1', out.getvalue())
+        self.assertStatsMatchTable()
+
+
+class TodoSyncTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.test_user = User.objects.create_user(
+            username='test_user',
+            password='test_password123'
+        )
+        self.client.login(username='test_user', password='test_password123')
+
+    def sync(self, cursor=None):
+        data = {} if cursor is None else {'cursor': cursor}
+        return self.client.get(reverse('todo_sync'), data).json()
+
+    def test_returns_only_changes_after_cursor(self):
+        kept = Todo.objects.create(author=self.test_user, title='kept')
+        deleted = Todo.objects.create(author=self.test_user, title='deleted')
+        first = self.sync()
+        self.assertTrue(first['reset'])
+        self.assertEqual({todo['title'] for todo in first['todos']}, {'kept', 'deleted'})
+
+        kept.complete()
+        deleted_id = deleted.id
+        deleted.delete()
+        Todo.objects.create(author=self.test_user, title='new')
+        data = self.sync(first['cursor'])
+        self.assertFalse(data['reset'])
+        self.assertEqual([todo['title'] for todo in data['todos']], ['kept', 'new'])
+        self.assertTrue(data['todos'][0]['completed'])
+        self.assertEqual(data['deleted'], [str(deleted_id)])
+        self.assertGreater(data['cursor'], first['cursor'])
+
+    def test_unchanged_cursor_reads_only_the_stats_row(self):
+        Todo.objects.create(author=self.test_user, title='title')
+        cursor = self.sync()['cursor']
+        # The session, the user and the stats row
+        with self.assertNumQueries(3):
+            data = self.sync(cursor)
+        self.assertEqual((data['todos'], data['deleted'], data['cursor']), ([], [], cursor))
+
+    def test_pages_follow_the_cursor(self):
+        todos = [Todo.objects.create(author=self.test_user, title=f'title {i}') for i in range(3)]
+        ids = [todo.id for todo in todos]
+        cursor = changes_since(self.test_user)['cursor']
+        todos[0].delete()
+        todos[2].delete()
+        todos[1].complete()
+        page = changes_since(self.test_user, cursor, limit=2)
+        self.assertTrue(page['more'])
+        self.assertEqual(page['deleted'], [ids[0], ids[2]])
+        page = changes_since(self.test_user, page['cursor'], limit=2)
+        self.assertFalse(page['more'])
+        self.assertEqual([todo['id'] for todo in page['todos']], [ids[1]])
+
+    def test_bulk_writes_are_numbered(self):
+        todo = Todo.objects.create(author=self.test_user, title='title', completed=True, completed_at=timezone.now())
+        cursor = self.sync()['cursor']
+        self.client.post(reverse('todo_batch'), json.dumps({'operations': [
+            {'op': 'create', 'title': 'batch'},
+        ]}), content_type='application/json')
+        Todo.objects.filter(pk=todo.pk).update(completed_at=timezone.now() - timedelta(days=40))
+        call_command('archive_todos', stdout=io.StringIO())
+        data = self.sync(cursor)
+        self.assertEqual([todo['title'] for todo in data['todos']], ['batch'])
+        self.assertEqual(data['deleted'], [str(todo.id)])
+
+    def test_purged_tombstones_force_a_reset(self):
+        todo = Todo.objects.create(author=self.test_user, title='title')
+        cursor = self.sync()['cursor']
+        todo.delete()
+        TodoTombstone.objects.update(deleted_at=timezone.now() - timedelta(days=40))
+        call_command('purge_tombstones', stdout=io.StringIO())
+        self.assertFalse(TodoTombstone.objects.exists())
+        data = self.sync(cursor)
+        self.assertTrue(data['reset'])
+        self.assertEqual(data['todos'], [])
+        self.assertFalse(self.sync(data['cursor'])['reset'])
+
+    def test_stale_stats_resume_after_the_newest_change(self):
+        todo = Todo.objects.create(author=self.test_user, title='title')
+        TodoStats.objects.update(change_seq=0, stale=True)
+        Todo.objects.create(author=self.test_user, title='next')
+        self.assertGreater(Todo.objects.get(title='next').change_seq, todo.change_seq)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('todo_sync'), {'cursor': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+
+# As with a cache backend shared by every process, which the user cache needs
+@override_settings(AUTH_USER_CACHE_TIMEOUT=60)
+class SessionAndAuthCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.test_user = User.objects.create_user(
+            username='test_user',
+            password='test_password123'
+        )
+        self.client.login(username='test_user', password='test_password123')
+
+    def test_password_change_ends_other_sessions(self):
+        other = Client()
+        other.login(username='test_user', password='test_password123')
+        self.assertEqual(other.get(reverse('todo_list')).status_code, 200)
+
+        self.client.post(reverse('password_change'), {
+            'old_password': 'test_password123',
+            'new_password1': 'new_password456',
+            'new_password2': 'new_password456',
+        })
+        self.assertEqual(self.client.get(reverse('todo_list')).status_code, 200)
+        self.assertRedirects(
+            other.get(reverse('todo_list')), f"{reverse('login')}?next={reverse('todo_list')}"
+        )
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_signed_cookie_sessions_need_no_queries(self):
+        self.client.login(username='test_user', password='test_password123')
+        self.client.get(reverse('todo_list'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('todo_list'))
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(AUTH_USER_CACHE_TIMEOUT=0)
+    def test_user_cache_can_be_disabled(self):
+        self.client.get(reverse('todo_list'))
+        # Session and user
+        with self.assertNumQueries(2):
+            self.client.get(reverse('todo_list'))
+
+    def test_purge_sessions_deletes_only_expired_sessions(self):
+        Session.objects.create(session_key='expired', session_data='', expire_date=timezone.now() - timedelta(days=1))
+        call_command('purge_sessions', batch_size=1, stdout=io.StringIO())
+        self.assertFalse(Session.objects.filter(session_key='expired').exists())
+        self.assertEqual(Session.objects.count(), 1)
+
+
+@task
+def failing_task():
+    raise RuntimeError('task failed')
+
+
+@task
+def slow_task(seconds):
+    time.sleep(seconds)
+
+
+@override_settings(DATABASE_REPLICAS=['replica0'])
+class ReplicaRoutingTests(TransactionTestCase):
+    # The replica alias is a stand-in served by the test database, so reads
+    # routed to it are recorded rather than made; TestCase's transaction would
+    # keep every read on the primary.
+
+    def setUp(self):
+        cache.clear()
+        self.test_user = User.objects.create_user(
+            username='test_user',
+            password='test_password123'
+        )
+        self.test_todo = Todo.objects.create(author=self.test_user, title='title', description='description')
+        self.client.login(username='test_user', password='test_password123')
+        patcher = mock.patch('todo_project.routers.choice', return_value='default')
+        self.choice = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_list_and_detail_pages_read_from_replica(self):
+        for url in (
+            reverse('todo_list'),
+            reverse('todo_completed_list'),
+            reverse('todo_detail', kwargs={'pk': self.test_todo.pk}),
+        ):
+            self.choice.reset_mock()
+            self.assertEqual(self.client.get(url).status_code, 200)
+            self.choice.assert_called_with(['replica0'])
+
+    def test_other_pages_read_from_primary(self):
+        self.client.get(reverse('todo_new'))
+        self.client.get(reverse('todo_edit', kwargs={'pk': self.test_todo.pk}))
+        self.client.post(reverse('todo_new'), {'title': 'new title', 'description': ''})
+        self.choice.assert_not_called()
+
+    def test_write_pins_client_to_primary(self):
+        response = self.client.post(reverse('todo_new'), {'title': 'new title', 'description': ''})
+        self.assertEqual(response.cookies['pin_primary']['max-age'], settings.DATABASE_REPLICA_PIN_SECONDS)
+
+        response = self.client.get(reverse('todo_list'))
+        self.assertContains(response, 'new title')
+        self.choice.assert_not_called()
+
+        self.client.cookies.pop('pin_primary')
+        self.client.get(reverse('todo_detail', kwargs={'pk': self.test_todo.pk}))
+        self.choice.assert_called_with(['replica0'])
+
+    def test_failed_write_does_not_pin(self):
+        response = self.client.post(reverse('todo_new'), {'title': '', 'description': ''}, HTTP_HX_REQUEST='true')
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('pin_primary', response.cookies)
+
+    def test_router(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Todo), 'default')
+        self.assertEqual(router.db_for_write(Todo), 'default')
+        self.assertFalse(router.allow_migrate('replica0', 'todos'))
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Todo), 'default')
+            self.choice.assert_called_with(['replica0'])
+            self.choice.reset_mock()
+            self.assertEqual(router.db_for_read(Session), 'default')
+            with transaction.atomic():
+                router.db_for_read(Todo)
+            self.choice.assert_not_called()
+
+
+@override_settings(DATABASE_REPLICAS=['replica0'])
+class LaggingReplicaTests(TransactionTestCase):
+    # replica0 is a second SQLite database that never receives writes, as a
+    # replica lagging far behind the primary
+    databases = {'default', 'replica0'}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.replica_dir = tempfile.mkdtemp()
+        connections.databases['replica0'] = {
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(cls.replica_dir, 'replica0.sqlite3'),
+        }
+        call_command('migrate', database='replica0', verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica0'].close()
+        delattr(connections._connections, 'replica0')
+        del connections.databases['replica0']
+        shutil.rmtree(cls.replica_dir)
+
+    def setUp(self):
+        cache.clear()
+        self.test_user = User.objects.create_user(username='test_user', password='test_password123')
+        User.objects.using('replica0').bulk_create([self.test_user])
+        self.laptop, self.phone = Client(), Client()
+        self.laptop.force_login(self.test_user)
+        self.phone.force_login(self.test_user)
+
+    def test_stale_replica_list_is_not_cached_for_pinned_client(self):
+        self.laptop.post(reverse('todo_new'), {'title': 'new title', 'description': ''})
+        self.assertIn('pin_primary', self.laptop.cookies)
+
+        response = self.phone.get(reverse('todo_list'))
+        self.assertNotContains(response, 'new title')
+        self.assertFalse(response.has_header('ETag'))
+
+        response = self.laptop.get(reverse('todo_list'))
+        self.assertContains(response, 'new title')
+        response = self.laptop.get(reverse('todo_list'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+@override_settings(TODO_SHARDS=['default', 'shard1'], TODO_SHARD_CACHE_TIMEOUT=0)
+class ShardingTests(TransactionTestCase):
+    # shard1 is a second SQLite database, created and migrated for this class
+    databases = {'default', 'shard1'}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.shard_dir = tempfile.mkdtemp()
+        connections.databases['shard1'] = {
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(cls.shard_dir, 'shard1.sqlite3'),
+        }
+        call_command('migrate', database='shard1', verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['shard1'].close()
+        delattr(connections._connections, 'shard1')
+        del connections.databases['shard1']
+        shutil.rmtree(cls.shard_dir)
+
+    def setUp(self):
+        cache.clear()
+        # Users in id order, until there is one whose ring shard is each shard
+        self.users = {}
+        while len(self.users) < 2:
+            user = User.objects.create_user(username=f'user{User.objects.count()}', password='test_password123')
+            self.users.setdefault(home_shard(user.pk), user)
+        self.sharded_user = self.users['shard1']
+        self.client.login(username=self.sharded_user.username, password='test_password123')
+
+    def test_hash_ring_moves_about_one_shard_of_keys(self):
+        before, after = HashRing(['a', 'b']), HashRing(['a', 'b', 'c'])
+        moved = [key for key in range(3000) if before.shard(key) != after.shard(key)]
+        self.assertTrue(all(after.shard(key) == 'c' for key in moved))
+        self.assertAlmostEqual(len(moved) / 3000, 1 / 3, delta=0.1)
+
+    def test_new_users_todos_are_written_to_their_shard(self):
+        self.assertEqual(TodoShard.objects.get(user=self.sharded_user).shard, 'shard1')
+        self.client.post(reverse('todo_new'), {'title': 'sharded', 'description': ''})
+        todo = Todo.objects.using('shard1').get(author=self.sharded_user)
+        self.assertFalse(Todo.objects.using('default').exists())
+
+        self.assertContains(self.client.get(reverse('todo_list')), 'sharded')
+        self.assertContains(self.client.get(reverse('todo_detail', kwargs={'pk': todo.pk})), 'sharded')
+        self.client.post(reverse('todo_edit', kwargs={'pk': todo.pk}), {'title': 'edited', 'description': ''})
+        self.assertEqual(Todo.objects.using('shard1').get().title, 'edited')
+        self.assertEqual(count_stats(self.sharded_user.pk)['total'], 1)
+        self.client.post(reverse('todo_delete', kwargs={'pk': todo.pk}))
+        self.assertFalse(Todo.objects.using('shard1').exists())
+
+    def test_cross_user_queries_gather_from_every_shard(self):
+        for n, user in enumerate([self.users['default'], self.sharded_user] * 3):
+            Todo.objects.create(author=user, title=f'title {n}')
+        self.assertEqual(Todo.objects.using('shard1').count(), 3)
+
+        todos = Todo.objects.order_by('-date', '-id')
+        self.assertEqual([todo.title for todo in todos], [f'title {n}' for n in range(5, -1, -1)])
+        self.assertEqual([todo.title for todo in todos.all()[1:3]], ['title 4', 'title 3'])
+        self.assertEqual(todos.all().count(), 6)
+        self.assertEqual(todos.all()[4:].count(), 2)
+        self.assertEqual(Todo.objects.aggregate(last=Max('date'))['last'], todos[0].date)
+        self.assertEqual(
+            list(Todo.objects.order_by('title').values_list('title', flat=True)), [f'title {n}' for n in range(6)]
+        )
+        self.assertEqual(Todo.objects.get(title='title 1').author, self.sharded_user)
+
+        admin_user = User.objects.create_superuser(username='admin_user', email='', password='admin_password123')
+        self.client.login(username='admin_user', password='admin_password123')
+        response = self.client.get(reverse('admin:todos_todo_changelist'), {'q': f'@{self.sharded_user.username}'})
+        self.assertEqual(
+            [todo.title for todo in response.context['cl'].result_list], ['title 5', 'title 3', 'title 1']
+        )
+        self.assertEqual(admin_user.todo_set.count(), 0)
+
+    def test_rebalance_moves_todos_between_shards(self):
+        # Placed on the primary, as users from before sharding are
+        TodoShard.objects.filter(user=self.sharded_user).delete()
+        todo = Todo.objects.create(author=self.sharded_user, title='moving')
+        ArchivedTodo.objects.create(
+            id=uuid.uuid4(), author=self.sharded_user, title='archived', date=todo.date, completed_at=todo.date,
+        )
+        self.assertEqual(Todo.objects.using('default').count(), 1)
+
+        out = io.StringIO()
+        call_command('rebalance_shards', settle=0, stdout=out)
+        self.assertIn(f'{self.sharded_user.username}: default -> shard1', out.getvalue())
+        self.assertEqual(TodoShard.objects.get(user=self.sharded_user).shard, 'shard1')
+        self.assertFalse(Todo.objects.using('default').exists())
+        self.assertFalse(ArchivedTodo.objects.using('default').exists())
+        moved = Todo.objects.using('shard1').get()
+        self.assertEqual((moved.pk, moved.date), (todo.pk, todo.date))
+        self.assertTrue(ArchivedTodo.objects.using('shard1').exists())
+        self.assertContains(self.client.get(reverse('todo_list')), 'moving')
+
+    def test_move_catches_up_with_writes_made_while_copying(self):
+        todo = Todo.objects.create(author=self.sharded_user, title='before')
+
+        def write_during_move(seconds):
+            if not Todo.objects.using('shard1').filter(title='after').exists():
+                Todo.objects.using('shard1').filter(pk=todo.pk).update(title='after')
+
+        with mock.patch('todos.sharding.time.sleep', side_effect=write_during_move):
+            self.assertTrue(move_author(self.sharded_user.pk, 'default'))
+        self.assertEqual(Todo.objects.using('default').get().title, 'after')
+        self.assertFalse(Todo.objects.using('shard1').exists())
+
+    def test_writes_are_refused_while_moving(self):
+        place_author(self.sharded_user.pk, 'shard1', moving=True)
+        response = self.client.post(reverse('todo_new'), {'title': 'title', 'description': ''})
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self.client.get(reverse('todo_list')).status_code, 200)
+
+    def test_deleting_a_user_deletes_their_sharded_todos(self):
+        Todo.objects.create(author=self.sharded_user, title='title')
+        self.sharded_user.delete()
+        self.assertFalse(Todo.objects.using('shard1').exists())
+
+
+class RealtimeEventsTests(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        get_broker.cache_clear()
+        self.test_user = User.objects.create_user(
+            username='test_user',
+            password='test_password123'
+        )
+        self.other_user = User.objects.create_user(
+            username='other_user',
+            password='test_password123'
+        )
+        self.client.login(username='test_user', password='test_password123')
+        self.cookie = f'{settings.SESSION_COOKIE_NAME}={self.client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+    def scope(self, scope_type='http', logged_in=True):
+        headers = [(b'host', b'127.0.0.1')]
+        if logged_in:
+            headers.append((b'cookie', self.cookie.encode()))
+        return {'type': scope_type, 'path': '/todos/events/', 'method': 'GET', 'headers': headers}
+
+    def stream(self, scope, until=lambda messages: True, write=None):
+        """Runs the ASGI application on scope, calling write once the stream is
+        open, and returns the messages it sends until until(messages) holds.
+        """
+        async def main():
+            inbox, messages = asyncio.Queue(), []
+            if scope['type'] == 'websocket':
+                inbox.put_nowait({'type': 'websocket.connect'})
+
+            async def send(message):
+                messages.append(message)
+                if write and message.get('status', 200) == 200 and message['type'] in (
+                    'http.response.start', 'websocket.accept'
+                ):
+                    await sync_to_async(write)()
+                if until(messages):
+                    inbox.put_nowait({'type': 'http.disconnect' if scope['type'] == 'http' else 'websocket.disconnect'})
+
+            await asyncio.wait_for(application(scope, inbox.get, send), 5)
+            return messages
+        return async_to_sync(main)()
+
+    def test_event_stream_pushes_the_users_changes(self):
+        def write():
+            Todo.objects.create(author=self.other_user, title='not yours')
+            Todo.objects.create(author=self.test_user, title='yours')
+
+        messages = self.stream(self.scope(), lambda messages: b'event:' in messages[-1].get('body', b''), write)
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), messages[0]['headers'])
+        body = b''.join(message.get('body', b'') for message in messages)
+        self.assertIn(b'event: created', body)
+        self.assertIn(b'"yours"', body)
+        self.assertNotIn(b'not yours', body)
+        self.assertEqual(get_broker().subscriptions, {})
+
+    def test_websocket_pushes_json_messages(self):
+        todo = Todo.objects.create(author=self.test_user, title='title')
+        todo_id = str(todo.id)
+        messages = self.stream(
+            self.scope('websocket'), lambda messages: messages[-1]['type'] == 'websocket.send', todo.delete
+        )
+        self.assertEqual(messages[0], {'type': 'websocket.accept'})
+        event = json.loads(messages[-1]['text'])
+        self.assertEqual((event['type'], event['id']), ('deleted', todo_id))
+
+    def test_anonymous_streams_are_refused(self):
+        self.assertEqual(self.stream(self.scope(logged_in=False))[0]['status'], 403)
+        self.assertEqual(self.stream(self.scope('websocket', logged_in=False))[0]['code'], 4403)
+
+    @override_settings(TODO_EVENTS_MAX_CONNECTIONS=2, TODO_EVENTS_QUEUE_SIZE=2)
+    def test_connections_are_capped_and_slow_streams_resync(self):
+        async def main():
+            broker = get_broker()
+            subscriptions = [broker.subscribe(self.test_user.pk) for _ in range(2)]
+            with self.assertRaises(TooManyConnections):
+                broker.subscribe(self.test_user.pk)
+            for n in range(3):
+                broker.publish(self.test_user.pk, {'type': 'created', 'id': n})
+            await asyncio.sleep(0)
+            events = [await subscription.get() for subscription in subscriptions]
+            for subscription in subscriptions:
+                broker.unsubscribe(subscription)
+            return events, broker.subscriptions
+
+        events, remaining = async_to_sync(main)()
+        self.assertEqual(events, [RESYNC, RESYNC])
+        self.assertEqual(remaining, {})
+
+
+class JobQueueTests(TestCase):
+
+    def setUp(self):
+        self.test_user = User.objects.create_user(username='test_user', password='test_password123')
+
+    def run_worker(self):
+        out = io.StringIO()
+        call_command('run_worker', pool='inline', burst=True, poll_interval=0, stdout=out)
+        return out.getvalue()
+
+    def test_worker_runs_queued_jobs(self):
+        Todo.objects.create(author=self.test_user, title='title')
+        TodoStats.objects.all().delete()
+        job = enqueue(recount_user_stats, self.test_user.pk)
+        self.assertIn('1 done', self.run_worker())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.DONE, 1))
+        self.assertEqual(TodoStats.objects.get(user=self.test_user).total, 1)
+
+    def test_failed_job_is_retried_with_backoff_then_fails(self):
+        job = enqueue(failing_task, max_attempts=2)
+        self.run_worker()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertGreater(job.run_at, timezone.now())
+
+        Job.objects.update(run_at=timezone.now())
+        self.run_worker()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIn('RuntimeError: task failed', job.last_error)
+
+    def test_worker_schedules_periodic_tasks(self):
+        self.run_worker()
+        jobs = Job.objects.filter(status=Job.QUEUED).order_by('task')
+        self.assertEqual(list(jobs.values_list('task', flat=True)), sorted(settings.JOB_SCHEDULE))
+        self.assertTrue(all(job.run_at > timezone.now() for job in jobs))
+        # One run queued at a time
+        self.run_worker()
+        self.assertEqual(Job.objects.count(), len(settings.JOB_SCHEDULE))
+
+        Job.objects.update(run_at=timezone.now())
+        # The tasks' commands print their own reports
+        with mock.patch('sys.stdout', new_callable=io.StringIO):
+            self.assertIn(f'{len(settings.JOB_SCHEDULE)} done', self.run_worker())
+        # Once a run has finished, the next is queued
+        self.run_worker()
+        self.assertEqual(Job.objects.filter(status=Job.QUEUED).count(), len(settings.JOB_SCHEDULE))
+
+    def test_delayed_job_waits(self):
+        enqueue(recount_user_stats, self.test_user.pk, delay=60)
+        self.assertIn('no jobs run', self.run_worker())
+
+    def test_only_registered_tasks_can_be_queued(self):
+        with self.assertRaises(ValueError):
+            enqueue(count_stats, self.test_user.pk)
+
+    def test_a_job_is_claimed_once(self):
+        enqueue(recount_user_stats, self.test_user.pk)
+        self.assertEqual(len(claim('worker-1', 10)), 1)
+        self.assertEqual(claim('worker-2', 10), [])
+
+    def test_stale_jobs_are_requeued(self):
+        job = enqueue(recount_user_stats, self.test_user.pk)
+        claim('worker-1', 1)
+        Job.objects.update(locked_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(requeue_stale(3600), 1)
+        self.assertEqual(claim('worker-2', 1), [job])
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('stopped responding', job.last_error)
+
+    def test_stale_job_fails_after_max_attempts(self):
+        job = enqueue(recount_user_stats, self.test_user.pk, max_attempts=2)
+        for _ in range(2):
+            Job.objects.update(run_at=timezone.now())
+            claim('worker-1', 1)
+            Job.objects.update(locked_at=timezone.now() - timedelta(hours=2))
+            self.assertEqual(requeue_stale(3600), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(claim('worker-2', 1), [])
+
+
+class JobHeartbeatTests(TransactionTestCase):
+
+    def test_running_job_is_not_requeued(self):
+        job = enqueue(slow_task, 0.5)
+        claim('worker-1', 1)
+        # Claimed longer ago than the stale timeout below
+        Job.objects.update(locked_at=timezone.now() - timedelta(seconds=5))
+        worker = threading.Thread(target=execute, args=(job.pk, 0.05))
+        worker.start()
+        time.sleep(0.3)
+        self.assertEqual(requeue_stale(1), 0)
+        worker.join()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.DONE, 1))
+
+
+class StaticAssetTests(TestCase):
+
+    def setUp(self):
+        self.static_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_dir)
+        self.addCleanup(_critical_css_cache.clear)
+        _critical_css_cache.clear()
+
+    def write(self, path, contents):
+        os.makedirs(os.path.dirname(os.path.join(self.static_dir, path)), exist_ok=True)
+        with open(os.path.join(self.static_dir, path), 'w') as f:
+            f.write(contents)
+
+    def test_critical_css_keeps_rules_the_markup_can_match(self):
+        classes, elements = used_markup('<nav class="navbar {% if x %}active{% endif %}"><a class="btn">')
+        self.assertEqual(classes, {'navbar', 'active', 'btn'})
+        css = (
+            'body{margin:0}.navbar{display:flex}.modal{display:none}'
+            'a.btn,.card .btn{color:red}table{width:100%}'
+            '@media (min-width:576px){.navbar{padding:0}.modal{margin:0}}@font-face{font-family:x}'
+        )
+        self.assertEqual(
+            critical_css(css, classes, elements),
+            'body{margin:0}.navbar{display:flex}a.btn{color:red}@media (min-width:576px){.navbar{padding:0}}'
+        )
+
+    def test_build_assets_writes_bundles_and_critical_css(self):
+        self.write('css/base.css', 'body { padding-top: 4.5rem; }')
+        self.write('vendor/bootstrap-4.4.1.min.css', '.nav{display:flex}.modal{display:none}\n'
+                                                      '/*# sourceMappingURL=bootstrap.min.css.map */')
+        for name in ('jquery-3.4.1.slim', 'popper-1.16.0', 'bootstrap-4.4.1'):
+            self.write(f'vendor/{name}.min.js', f'/* {name} */')
+        call_command('build_assets', static_dir=self.static_dir, offline=True, stdout=io.StringIO())
+
+        with open(os.path.join(self.static_dir, 'css/bundle.css')) as f:
+            bundle = f.read()
+        self.assertIn('.modal{display:none}', bundle)
+        self.assertIn('padding-top', bundle)
+        self.assertNotIn('sourceMappingURL', bundle)
+        with open(os.path.join(self.static_dir, 'css/critical.css')) as f:
+            critical = f.read()
+        self.assertIn('.nav{display:flex}', critical)
+        self.assertNotIn('.modal', critical)
+
+    def test_build_assets_offline_needs_vendored_files(self):
+        with self.assertRaises(CommandError):
+            call_command('build_assets', static_dir=self.static_dir, offline=True, stdout=io.StringIO())
+
+    def test_pages_use_cdn_until_assets_are_built(self):
+        with override_settings(
+            STATICFILES_DIRS=[self.static_dir],
+            STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+        ):
+            response = self.client.get(reverse('home'))
+            self.assertContains(response, 'stackpath.bootstrapcdn.com')
+            # A running process picks up a later build
+            self.write('css/critical.css', '.navbar{display:flex}')
+            response = self.client.get(reverse('home'))
+        self.assertNotContains(response, 'bootstrapcdn')
+
+    def test_built_assets_are_inlined_and_bundled(self):
+        self.write('css/critical.css', '.navbar{display:flex}')
+        with override_settings(
+            STATICFILES_DIRS=[self.static_dir],
+            STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+        ):
+            response = self.client.get(reverse('home'))
+        self.assertContains(response, '<style>.navbar{display:flex}</style>', html=False)
+        self.assertContains(response, '/static/css/bundle.css')
+        self.assertContains(response, '/static/js/bundle.js')
+        self.assertNotContains(response, 'bootstrapcdn')
+
+    def test_hashed_static_files_are_served_immutable(self):
+        with open(os.path.join(settings.STATIC_ROOT, 'staticfiles.json')) as f:
+            path = json.load(f)['paths']['admin/css/base.css']
+        response = self.client.get(settings.STATIC_URL + path, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+
+class RequestProfilingMiddlewareTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.test_user = User.objects.create_user(
+            username='test_user',
+            password='test_password123'
+        )
+        self.client.login(username='test_user', password='test_password123')
+
+    def test_no_server_timing_when_disabled(self):
+        response = self.client.get(reverse('todo_list'))
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(REQUEST_PROFILING=True, REQUEST_PROFILING_MEMORY=True)
+    def test_profiled_request_reports_timings(self):
+        with self.assertLogs('todo_project.profiling', 'INFO') as logs:
+            response = self.client.get(reverse('todo_list'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('tpl;dur=', response['Server-Timing'])
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['path'], '/todos/')
+        self.assertEqual(record['status'], 200)
+        # Session, user, page and stats
+        self.assertEqual(record['queries'], 4)
+        self.assertGreater(record['template_ms'], 0)
+        self.assertIn('peak_alloc_kb', record)
+        self.assertEqual(record['repeated_queries'], {})
+
+    @override_settings(REQUEST_PROFILING=True, REQUEST_PROFILING_MEMORY=True)
+    def test_peak_allocation_is_per_request_without_reset_peak(self):
+        import tracemalloc
+
+        from todo_project.middleware import RequestProfilingMiddleware
+
+        size = 0
+
+        def get_response(request):
+            bytearray(size)
+            return HttpResponse()
+
+        def peak_kb():
+            with self.assertLogs('todo_project.profiling', 'INFO') as logs:
+                middleware(RequestFactory().get('/'))
+            return json.loads(logs.records[0].getMessage())['peak_alloc_kb']
+
+        self.addCleanup(tracemalloc.stop)
+        # As on Python 3.8
+        with mock.patch('todo_project.middleware._reset_peak', tracemalloc.clear_traces):
+            middleware = RequestProfilingMiddleware(get_response)
+            size = 2 ** 20
+            self.assertGreaterEqual(peak_kb(), 1024)
+            # The next request does not inherit the peak of the last one
+            size = 0
+            self.assertLess(peak_kb(), 512)
+
+    @override_settings(REQUEST_PROFILING=True, REQUEST_PROFILING_REPEAT_THRESHOLD=3)
+    def test_repeated_queries_are_flagged(self):
+        from todo_project.middleware import RequestProfilingMiddleware
+
+        def get_response(request):
+            Todo.objects.count()
+            for _ in range(3):
+                User.objects.filter(username='test_user').exists()
+            return HttpResponse()
+
+        middleware = RequestProfilingMiddleware(get_response)
+        with self.assertLogs('todo_project.profiling', 'INFO') as logs:
+            middleware(RequestFactory().get('/'))
+        warnings = [json.loads(r.getMessage()) for r in logs.records if r.levelname == 'WARNING']
+        self.assertEqual(len(warnings), 1)
+        self.assertEqual(warnings[0]['count'], 3)
+        self.assertIn('auth_user', warnings[0]['repeated_query'])
+
+
+class BenchmarkTests(TestCase):
+
+    def test_seed_creates_users_and_todos(self):
+        users = seed(users=2, todos_per_user=3)
+        self.assertEqual([user.username for user in users], ['bench0', 'bench1'])
+        self.assertEqual(Todo.objects.filter(author=users[1]).count(), 3)
+        self.assertTrue(users[0].check_password(BENCH_PASSWORD))
+
+    def test_drive_client_reports_every_page(self):
+        cache.clear()
+        users = seed(users=2, todos_per_user=3)
+        results = drive_client(users, requests=4)
+        self.assertEqual(list(results), ['list', 'detail', 'create', 'edit', 'delete'])
+        for result in results.values():
+            self.assertEqual(result['requests'], 4)
+            self.assertEqual(result['errors'], 0)
+        # Session, user and Todo
+        self.assertEqual(results['detail']['queries'], 3)
+        self.assertEqual(Todo.objects.count(), 6)
+
+    def test_drive_client_needs_a_todo_to_delete_per_request(self):
+        users = seed(users=2, todos_per_user=2)
+        with self.assertRaisesMessage(ValueError, '5 requests need every user to have 3 todos.'):
+            drive_client(users, requests=5)
+        with self.assertRaises(ValueError):
+            drive_client([], requests=1)
+        Todo.objects.filter(author=users[1]).delete()
+        with self.assertRaises(ValueError):
+            drive_client(users, requests=1)
+        self.assertEqual(Todo.objects.count(), 2)
+
+    def test_compare_flags_regressions_beyond_threshold(self):
+        baseline = {'client': {'list': {'rps': 100, 'p50_ms': 10, 'p95_ms': 20, 'p99_ms': 30, 'queries': 4}}}
+        current = {'client': {'list': {'rps': 95, 'p50_ms': 10.5, 'p95_ms': 30, 'p99_ms': 30, 'queries': 5}}}
+        rows, regressions = compare(baseline, current, threshold=10)
+        self.assertEqual(len(rows), 5)
+        self.assertEqual([row[2] for row in regressions], ['p95_ms', 'queries'])
+
+
+class WarmUpTests(TestCase):
+
+    def test_warm_up_compiles_every_project_template(self):
+        from django.template import engines
+
+        loader = engines['django'].engine.template_loaders[0]
+        loader.reset()
+        self.assertGreater(warm_up(), 0)
+        for root, _, files in os.walk(os.path.join(settings.BASE_DIR, 'templates')):
+            for name in files:
+                path = os.path.relpath(os.path.join(root, name), os.path.join(settings.BASE_DIR, 'templates'))
+                self.assertIn(path.replace(os.sep, '/'), loader.get_template_cache)
+        self.assertIn('bootstrap4/uni_form.html', loader.get_template_cache)
+
+
+def run_settings():
+    """Runs the settings file afresh, as a process with the current environment would."""
+    return runpy.run_path(os.path.join(settings.BASE_DIR, 'todo_project', 'settings.py'))
+
+
+class GunicornConfigTests(SimpleTestCase):
+
+    def server(self, workers):
+        return mock.Mock(num_workers=workers)
+
+    def test_several_workers_over_process_local_state_run_one(self):
+        server = self.server(2)
+        gunicorn_conf.on_starting(server)
+        self.assertEqual(server.num_workers, 1)
+        self.assertIn('CACHE_BACKEND=locmem', server.log.warning.call_args[0][2])
+
+    def test_several_workers_default_to_a_shared_cache(self):
+        def cache_backend(**environ):
+            with mock.patch.dict(os.environ, environ):
+                return run_settings()['CACHE_BACKEND']
+
+        self.assertEqual(cache_backend(WEB_CONCURRENCY='3'), 'file')
+        self.assertEqual(cache_backend(WEB_CONCURRENCY='1'), 'locmem')
+
+    @override_settings(
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'todo_cache'}},
+        TODO_EVENTS_BROKER='todos.events.PostgresBroker',
+    )
+    def test_several_workers_start_with_shared_state(self):
+        self.assertEqual(gunicorn_conf.process_local_settings(), [])
+        server = self.server(4)
+        gunicorn_conf.on_starting(server)
+        self.assertEqual(server.num_workers, 4)
+        server.log.warning.assert_not_called()
+
+    def test_only_sync_workers_keep_primed_connections(self):
+        for worker_class, keep in [('sync', True), ('gthread', False), ('uvicorn.workers.UvicornWorker', False)]:
+            worker = mock.Mock(cfg=mock.Mock(worker_class_str=worker_class))
+            with mock.patch('todo_project.warmup.prime_databases') as prime_databases:
+                gunicorn_conf.post_worker_init(worker)
+            prime_databases.assert_called_once_with(keep=keep)
+
+    def test_events_go_through_postgres_by_default_on_postgres(self):
+        def broker(database_url):
+            with mock.patch.dict(os.environ, {'DATABASE_URL': database_url}):
+                return run_settings()['TODO_EVENTS_BROKER']
+
+        self.assertEqual(broker('postgres://user@localhost/todos'), 'todos.events.PostgresBroker')
+        self.assertEqual(broker('sqlite:////tmp/todos.sqlite3'), 'todos.events.LocalBroker')
+
+    def test_procfile_serves_the_asgi_application(self):
+        with open(os.path.join(settings.BASE_DIR, 'Procfile')) as f:
+            processes = dict(line.split(': ', 1) for line in f.read().splitlines() if line)
+        self.assertIn('todo_project.asgi', processes['web'])
+        self.assertIn('uvicorn.workers.UvicornWorker', processes['web'])
+        self.assertIn('python:todo_project.gunicorn_conf', processes['web'])
+
+
+@mock.patch('psycopg2.connect', side_effect=lambda **params: mock.Mock(
+    closed=0, isolation_level=None, info=mock.Mock(transaction_status=TRANSACTION_STATUS_IDLE),
+))
+class ConnectionPoolTests(SimpleTestCase):
+
+    def wrapper(self):
+        settings_dict = {**connection.settings_dict, 'POOL_SIZE': 1, 'POOL_TIMEOUT': 5, 'OPTIONS': {}}
+        self.addCleanup(lambda: [_pools.pop(key) for key in list(_pools) if key[1] == 'pool_test'])
+        return PostgresDatabaseWrapper(settings_dict, 'pool_test')
+
+    def test_released_connection_is_reused(self, connect):
+        wrapper = self.wrapper()
+        wrapper.connection = wrapper.get_new_connection({})
+        first = wrapper.connection
+        wrapper._close()
+        self.assertIs(wrapper.get_new_connection({}), first)
+        self.assertEqual(connect.call_count, 1)
+
+    def test_exhausted_pool_waits_for_a_release(self, connect):
+        connection_pool = BlockingConnectionPool(1, timeout=5)
+        held = connection_pool.getconn()
+        threading.Timer(0.1, connection_pool.putconn, [held]).start()
+        self.assertIs(connection_pool.getconn(), held)
+
+    def test_exhausted_pool_times_out(self, connect):
+        connection_pool = BlockingConnectionPool(1, timeout=0.05)
+        connection_pool.getconn()
+        with self.assertRaisesMessage(PoolError, 'exhausted'):
+            connection_pool.getconn()
+        # A failed connect frees its slot
+        connection_pool = BlockingConnectionPool(1, timeout=0.05)
+        connect.side_effect = OperationalError
+        with self.assertRaises(OperationalError):
+            connection_pool.getconn()
+        connect.side_effect = None
+        connection_pool.getconn()
+
+    def test_forked_process_gets_its_own_pool(self, connect):
+        wrapper = self.wrapper()
+        parent = wrapper._get_pool({})
+        self.assertIs(wrapper._get_pool({}), parent)
+        with mock.patch('os.getpid', return_value=os.getpid() + 1):
+            child = wrapper._get_pool({})
+        self.assertIsNot(child, parent)
+        # The parent's connections stay checked out; the child opens its own
+        parent.getconn()
+        child.getconn()
+        self.assertEqual(connect.call_count, 2)
@@ -1,12 +1,20 @@
 from django.urls import path
 
-from .views import (TodoCreateView, TodoDeleteView, TodoDetailView,
-                    TodoListView, TodoUpdateView)
+from .views import (TodoBatchView, TodoCompletedListView, TodoCompleteView,
+                    TodoCreateView, TodoDeleteView, TodoDetailView,
+                    TodoExportView, TodoListView, TodoStatsView, TodoSyncView,
+                    TodoUpdateView)
 
 urlpatterns = [
     path('', TodoListView.as_view(), name='todo_list'),
     path('<uuid:pk>/', TodoDetailView.as_view(), name='todo_detail'),
     path('<uuid:pk>/edit/', TodoUpdateView.as_view(), name='todo_edit'),
     path('<uuid:pk>/delete/', TodoDeleteView.as_view(), name='todo_delete'),
+    path('<uuid:pk>/complete/', TodoCompleteView.as_view(), name='todo_complete'),
+    path('completed/', TodoCompletedListView.as_view(), name='todo_completed_list'),
     path('new/', TodoCreateView.as_view(), name='todo_new'),
+    path('batch/', TodoBatchView.as_view(), name='todo_batch'),
+    path('stats/', TodoStatsView.as_view(), name='todo_stats'),
+    path('sync/', TodoSyncView.as_view(), name='todo_sync'),
+    path('export/', TodoExportView.as_view(), name='todo_export'),
 ]
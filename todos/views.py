@@ -1,11 +1,35 @@
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.urls import reverse_lazy
+from django.core.cache import cache
+from django.http import (Http404, HttpResponse, JsonResponse,
+                         StreamingHttpResponse)
+from django.middleware.csrf import get_token
+from django.shortcuts import redirect
+from django.template.loader import render_to_string
+from django.urls import reverse, reverse_lazy
 from django.utils import timezone
-from django.views.generic import CreateView, DetailView, ListView, TemplateView
+from django.utils.decorators import method_decorator
+from django.utils.safestring import mark_safe
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.views.generic import (CreateView, DetailView, ListView,
+                                  TemplateView, View)
+from django.views.generic.detail import SingleObjectMixin
 from django.views.generic.edit import DeleteView, UpdateView
 
+from .batch import apply_operations
+from .cache import get_list_version, list_cache_key
+from .export import FORMATS, gzip_stream, stream_todos
 from .models import Todo
+from .pagination import paginate
+from .search import search_todos
+from .stats import get_stats
+from .sync import changes_since
 
 
 class HomePageView(TemplateView):
@@ -20,62 +44,344 @@ class SignUpView(CreateView):
     template_name = 'signup.html'
 
 
+# Stands in for the CSRF token in cached list HTML. The token changes on every
+# login, so it is filled in per response rather than cached with the cards.
+CSRF_PLACEHOLDER = 'csrf-token-placeholder'
+
+# Stands in for a Todo's pk when reversing card links, then is split out
+URL_PLACEHOLDER = uuid.UUID(int=0)
+
+
+def card_urls():
+    """Returns the prefix and suffix around the pk of each per-card link, so a
+    list renders its links by concatenation with one reverse per link type.
+    """
+    urls = {}
+    for name in ('complete', 'edit', 'delete'):
+        prefix, suffix = reverse(f'todo_{name}', kwargs={'pk': URL_PLACEHOLDER}).split(str(URL_PLACEHOLDER))
+        urls[name] = {'prefix': prefix, 'suffix': suffix}
+    return urls
+
+
+def reads_from_replica(request):
+    """Whether the request reads the user's Todos from a replica, which may
+    not have their latest writes yet even though the list version has moved on.
+    """
+    return Todo.objects.for_author(request.user).db in settings.DATABASE_REPLICAS
+
+
+def todo_list_etag(request, *args, **kwargs):
+    # A replica's list might lag the version, so it gets no validator a
+    # client pinned to the primary could later revalidate against
+    if not request.user.is_authenticated or reads_from_replica(request):
+        return None
+    key = list_cache_key(request.user.pk, get_list_version(request.user.pk), request.GET.urlencode())
+    # The page's forms carry a token from the client's CSRF cookie, so a new
+    # cookie, as after logging in again, must not revalidate the old page.
+    # get_token() first picks the cookie a first visit is about to be sent.
+    get_token(request)
+    csrf = hashlib.md5(request.META['CSRF_COOKIE'].encode()).hexdigest()
+    return f'{key}:{csrf}'
+
+
+@method_decorator(cache_control(private=True, no_cache=True), name='dispatch')
+@method_decorator(condition(etag_func=todo_list_etag), name='dispatch')
 class TodoListView(LoginRequiredMixin, ListView):
-    """Renders a user's Todo list in most recent order."""
+    """Renders a user's uncompleted Todos in most recent order, one cursor page at
+    a time, or the ranked results of a full-text search when ?q= is given.
+
+    The rendered list is cached per user and query string under the user's
+    list version, which Todo save and delete signals bump. A list read from a
+    replica is served from that cache but never stored in it.
+    """
     model = Todo
     context_object_name = 'todo_list'
     template_name = 'todo_list.html'
+    items_template_name = 'todo_list_items.html'
+    page_size = 20
+    replica_reads = True
 
     def get_queryset(self):
-        return Todo.objects.filter(author=self.request.user).order_by('-date')
+        return Todo.objects.for_author(self.request.user).filter(completed=False)
 
+    def get_context_data(self, **kwargs):
+        key = list_cache_key(
+            self.request.user.pk, get_list_version(self.request.user.pk), self.request.GET.urlencode()
+        )
+        todo_list_html = cache.get(key)
+        if todo_list_html is None:
+            todo_list_html = render_to_string(
+                self.items_template_name,
+                {**self.get_items_context_data(), 'csrf_token': CSRF_PLACEHOLDER},
+                request=self.request,
+            )
+            if not reads_from_replica(self.request):
+                cache.set(key, todo_list_html, settings.TODO_LIST_CACHE_TIMEOUT)
+        return {
+            'todo_list_html': mark_safe(todo_list_html.replace(CSRF_PLACEHOLDER, get_token(self.request))),
+            'query': self.request.GET.get('q', ''),
+            'view': self,
+        }
 
-class TodoDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
-    """Renders a single Todo."""
+    def get_items_context_data(self):
+        context = {'inline_cards': settings.TODO_LIST_INLINE_CARDS}
+        if context['inline_cards']:
+            context['card_urls'] = card_urls()
+
+        query = self.request.GET.get('q', '').strip()
+        if query:
+            try:
+                page = int(self.request.GET.get('page', 1))
+            except ValueError:
+                raise Http404('Invalid page.')
+            if page < 1:
+                raise Http404('Invalid page.')
+            todo_list, has_next = search_todos(self.request.user, query, page, self.page_size)
+            context.update({
+                'todo_list': todo_list,
+                'query': query,
+                'page': page,
+                'next_page': page + 1 if has_next else None,
+            })
+            return context
+
+        todo_list, next_cursor = paginate(self.object_list, self.request.GET.get('cursor'), self.page_size)
+        context.update({
+            'todo_list': todo_list,
+            # Read from the stats row rather than counting the list
+            'todo_count': get_stats(self.request.user.pk).uncompleted,
+            'next_cursor': next_cursor,
+        })
+        return context
+
+
+class TodoCompletedListView(LoginRequiredMixin, ListView):
+    """Renders a user's completed Todos, most recently completed first, one
+    cursor page at a time.
+    """
+    context_object_name = 'todo_list'
+    template_name = 'todo_completed_list.html'
+    page_size = 20
+    replica_reads = True
+
+    def get_queryset(self):
+        return Todo.objects.for_author(self.request.user).filter(completed=True)
+
+    def get_context_data(self, **kwargs):
+        todo_list, next_cursor = paginate(
+            self.object_list, self.request.GET.get('cursor'), self.page_size, 'completed_at'
+        )
+        return super().get_context_data(object_list=todo_list, next_cursor=next_cursor, **kwargs)
+
+
+class OwnedTodoMixin(UserPassesTestMixin):
+    """Fetches a Todo scoped to the requesting author once and reuses it for the request.
+
+    The ownership check is part of the query, so a Todo that does not exist
+    and one that belongs to another user are both denied with a 403.
+    """
     model = Todo
-    template_name = 'todo_detail.html'
+
+    def get_queryset(self):
+        return Todo.objects.for_author(self.request.user)
+
+    def get_object(self, queryset=None):
+        if queryset is not None:
+            return super().get_object(queryset)
+        if not hasattr(self, '_owned_todo'):
+            try:
+                self._owned_todo = super().get_object()
+            except Http404:
+                self._owned_todo = None
+        return self._owned_todo
 
     def test_func(self):
-        return self.get_object().author == self.request.user
+        return self.get_object() is not None
+
+
+class FragmentResponseMixin:
+    """Answers a mutation with only the changed Todo when the request asks for it,
+    so a page can patch one card in place instead of reloading the list.
+
+    HTMX requests (HX-Request: true) get the rendered card snippet and requests
+    accepting application/json get the Todo as JSON. Invalid forms answer 400
+    with the errors. Other requests redirect as before.
+    """
+    fragment_template_name = 'todo_card_snippet.html'
+    fragment_status = 200
+
+    def fragment_format(self):
+        if self.request.headers.get('HX-Request') == 'true':
+            return 'html'
+        if 'application/json' in self.request.headers.get('Accept', ''):
+            return 'json'
+        return None
 
+    def fragment_response(self, todo, status=200):
+        if self.fragment_format() == 'json':
+            return JsonResponse({
+                'id': todo.id,
+                'title': todo.title,
+                'description': todo.description,
+                'date': todo.date,
+                'completed': todo.completed,
+                'completed_at': todo.completed_at,
+                'url': todo.get_absolute_url(),
+            }, status=status)
+        html = render_to_string(self.fragment_template_name, {'todo': todo}, request=self.request)
+        return HttpResponse(html, status=status)
 
-class TodoUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        if self.fragment_format():
+            return self.fragment_response(self.object, status=self.fragment_status)
+        return response
+
+    def form_invalid(self, form):
+        fragment_format = self.fragment_format()
+        if fragment_format == 'json':
+            return JsonResponse({'errors': form.errors}, status=400)
+        if fragment_format == 'html':
+            return HttpResponse(form.errors.as_ul(), status=400)
+        return super().form_invalid(form)
+
+
+class TodoDetailView(LoginRequiredMixin, OwnedTodoMixin, DetailView):
+    """Renders a single Todo."""
+    template_name = 'todo_detail.html'
+    replica_reads = True
+
+
+class TodoUpdateView(LoginRequiredMixin, OwnedTodoMixin, FragmentResponseMixin, UpdateView):
     """Renders a Todo edit form on GET and updates a Todo on POST."""
-    model = Todo
     fields = ('title', 'description')
     template_name = 'todo_edit.html'
 
     # success_url determined by Todo's get_absolute_url automatically
 
     def form_valid(self, form):
-        # Update date timestamp
-        todo = form.save(commit=False)
-        todo.date = timezone.now()
-        todo.save()
+        # Update date timestamp; saved along with the form in a single UPDATE
+        form.instance.date = timezone.now()
         return super().form_valid(form)
 
-    def test_func(self):
-        return self.get_object().author == self.request.user
+
+class TodoCompleteView(LoginRequiredMixin, OwnedTodoMixin, FragmentResponseMixin, SingleObjectMixin, View):
+    """Marks a Todo completed on POST, keeping it out of the active list."""
+    http_method_names = ['post']
+
+    def post(self, request, *args, **kwargs):
+        todo = self.get_object()
+        todo.complete()
+        if self.fragment_format():
+            return self.fragment_response(todo)
+        return redirect('todo_list')
 
 
-class TodoDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
+class TodoDeleteView(LoginRequiredMixin, OwnedTodoMixin, FragmentResponseMixin, DeleteView):
     """Renders a confirmation page on GET and deletes a Todo on POST."""
-    model = Todo
     template_name = 'todo_delete.html'
     success_url = reverse_lazy('todo_list')
 
-    def test_func(self):
-        return self.get_object().author == self.request.user
+    def delete(self, request, *args, **kwargs):
+        if self.fragment_format():
+            self.get_object().delete()
+            return HttpResponse(status=204)
+        return super().delete(request, *args, **kwargs)
 
 
-class TodoCreateView(LoginRequiredMixin, CreateView):
+class TodoCreateView(LoginRequiredMixin, FragmentResponseMixin, CreateView):
     """Renders a Todo creation form on GET and inserts a new Todo on POST."""
     model = Todo
     template_name = 'todo_new.html'
     fields = ('title', 'description')
+    fragment_status = 201
 
     # success_url determined by Todo's get_absolute_url automatically
 
     def form_valid(self, form):
         form.instance.author = self.request.user
         return super().form_valid(form)
+
+
+class TodoBatchView(LoginRequiredMixin, View):
+    """Applies a JSON batch of create, update and delete operations on POST.
+
+    Expects {"operations": [{"op": "create", "title": ...}, {"op": "update",
+    "id": ..., "title": ...}, {"op": "delete", "id": ...}]} and responds with
+    {"results": [...]}, one result per operation in order.
+    """
+    http_method_names = ['post']
+    raise_exception = True
+    max_operations = 1000
+
+    def post(self, request, *args, **kwargs):
+        try:
+            operations = json.loads(request.body)['operations']
+        except (ValueError, TypeError, KeyError):
+            return JsonResponse({'error': 'Expected a JSON object with an "operations" list.'}, status=400)
+        if not isinstance(operations, list):
+            return JsonResponse({'error': 'Expected a JSON object with an "operations" list.'}, status=400)
+        if len(operations) > self.max_operations:
+            return JsonResponse({'error': f'At most {self.max_operations} operations per batch.'}, status=400)
+        return JsonResponse({'results': apply_operations(request.user, operations)})
+
+
+class TodoStatsView(LoginRequiredMixin, View):
+    """Returns a user's Todo counts and last activity as JSON, read from one stats row."""
+    http_method_names = ['get']
+    raise_exception = True
+
+    def get(self, request, *args, **kwargs):
+        stats = get_stats(request.user.pk)
+        return JsonResponse({
+            'total': stats.total,
+            'uncompleted': stats.uncompleted,
+            'completed': stats.total - stats.uncompleted,
+            'created_today': stats.created_today,
+            'last_activity': stats.last_activity,
+        })
+
+
+class TodoSyncView(LoginRequiredMixin, View):
+    """Returns the changes to a user's Todos since ?cursor= as JSON; see todos.sync.
+
+    Without a cursor, or with one too old to follow, responds with every Todo
+    and "reset": true.
+    """
+    http_method_names = ['get']
+    raise_exception = True
+    page_size = 500
+
+    def get(self, request, *args, **kwargs):
+        cursor = request.GET.get('cursor')
+        if cursor is not None:
+            try:
+                cursor = int(cursor)
+            except ValueError:
+                cursor = -1
+            if cursor < 0:
+                return JsonResponse({'error': 'The cursor must be a number from a previous response.'}, status=400)
+        return JsonResponse(changes_since(request.user, cursor, self.page_size))
+
+
+class TodoExportView(LoginRequiredMixin, View):
+    """Streams all of a user's Todos as NDJSON or CSV, gzip-compressed on request.
+
+    Takes ?format=ndjson|csv and ?gzip=1.
+    """
+    http_method_names = ['get']
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.GET.get('format', 'ndjson')
+        if export_format not in FORMATS:
+            raise Http404('Unsupported export format.')
+
+        chunks = stream_todos(Todo.objects.for_author(request.user), export_format)
+        filename = f'todos.{export_format}'
+        if request.GET.get('gzip'):
+            response = StreamingHttpResponse(gzip_stream(chunks), content_type='application/gzip')
+            filename += '.gz'
+        else:
+            response = StreamingHttpResponse(chunks, content_type=FORMATS[export_format])
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response